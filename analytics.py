@@ -0,0 +1,135 @@
+import atexit
+import json
+import os
+import queue
+import random
+import threading
+import time
+import zlib
+
+# Usage events are queued in memory and written out in batches by a background thread, so
+# recording one costs a queue put. When the queue is full events are dropped, never waited on.
+ANALYTICS_PATH = os.environ.get("ANALYTICS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "analytics.jsonl"))
+SAMPLE_RATE = float(os.environ.get("ANALYTICS_SAMPLE_RATE", 1.0))  # Share of sessions that are tracked
+QUEUE_SIZE = 10000
+BATCH_SIZE = 500
+FLUSH_INTERVAL = 5.0  # seconds
+
+class FileSink:
+    # Appends each batch of events to a JSON-lines file. Any callable taking a list of
+    # event dicts can be used as a sink instead.
+
+    def __init__(self, path=ANALYTICS_PATH):
+        self.path = path
+
+    def __call__(self, events):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a") as f:
+            f.writelines(json.dumps(event, separators=(",", ":"), default=str) + "\n" for event in events)
+
+class Tracker:
+    # Queues events and hands them to `sink` in batches of up to `batch_size`, every
+    # `flush_interval` seconds or as soon as a full batch is waiting.
+
+    def __init__(self, sink=None, sample_rate=SAMPLE_RATE, maxsize=QUEUE_SIZE, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.sink = sink or FileSink()
+        self.sample_rate = sample_rate
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize)
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._worker = None
+        self.queued = 0
+        self.dropped = 0
+        self.sampled_out = 0
+        self.written = 0
+        self.failed = 0
+
+    def sampled(self, session=None):
+        # Sessions are sampled as a whole, so a tracked session has all of its events
+        if self.sample_rate >= 1:
+            return True
+        if session is None:
+            return random.random() < self.sample_rate
+        return zlib.crc32(str(session).encode()) / 2**32 < self.sample_rate
+
+    def track(self, event, session=None, **properties):
+        if not self.sampled(session):
+            self.sampled_out += 1
+            return False
+        try:
+            self._queue.put_nowait({'event': event, 'session': session, 'timestamp': time.time(), **properties})
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.queued += 1
+        self._ensure_worker()
+        if self._queue.qsize() >= self.batch_size:
+            self._wake.set()
+        return True
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="analytics-flush", daemon=True)
+                self._worker.start()
+
+    def _next_batch(self):
+        batch = []
+        try:
+            while len(batch) < self.batch_size:
+                batch.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    def _write(self, batch):
+        try:
+            with self._write_lock:
+                self.sink(batch)
+            self.written += len(batch)
+        except Exception:
+            # A broken sink must not take the app down; the batch is lost
+            self.failed += len(batch)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        # Write out whatever is queued right now, from the calling thread
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            self._write(batch)
+
+    def stats(self):
+        return {
+            'queued': self.queued,
+            'dropped': self.dropped,
+            'sampled_out': self.sampled_out,
+            'written': self.written,
+            'failed': self.failed,
+            'pending': self._queue.qsize(),
+        }
+
+def changed_inputs(previous, current):
+    # The inputs whose value differs from the previous rerun
+    return {name: value for name, value in current.items() if name not in previous or previous[name] != value}
+
+_tracker = None
+
+def get_tracker():
+    # One tracker per process; whatever is still queued is written out at exit
+    global _tracker
+    if _tracker is None:
+        _tracker = Tracker()
+        atexit.register(_tracker.flush)
+    return _tracker
@@ -0,0 +1,378 @@
+import argparse
+import inspect
+import itertools
+import json
+import math
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+
+from core import (
+    DEFAULT_INTEREST_RATE, LOAN_TERM_YEARS, DEFAULT_HOUSE_PRICE,
+    calculate_rent_to_own, calculate_equity_breakdown, calculate_equity_over_time,
+    calculate_comparison_values, adjust_comparison_values,
+)
+from batch import DEFAULTS, OUTPUT_COLUMNS, score_arrays
+from cache import MONEY, RATE, RATIO, new_cache, metrics_text, shared_backend
+from cache_backend import make_key, source_version
+from optimizer import SEARCH_INPUTS, optimize
+from rates import RateProvider
+
+# A JSON API over the same calculations as the app, for other services:
+#
+#   GET  /rent?house_price=400000          monthly rent and its breakdown
+#   GET  /equity?house_price=400000&years=7  the monthly equity schedule
+#   GET  /compare?house_price=400000       rent-to-own vs a traditional mortgage vs renting
+#   GET  /optimize?house_price=400000      the years and down payment with the lowest true cost
+#   POST /batch                            many properties, streamed back as JSON lines
+#   GET  /metrics                          cache and request counters for Prometheus
+#
+# Inputs are the ones batch.py takes (see batch.DEFAULTS) plus house_price, as query parameters
+# or a JSON object in the body. Without a mortgage_rate the last cached rate is used.
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8502
+RESPONSE_CACHE_SIZE = 10000
+BATCH_CHUNK_SIZE = 1000  # Rows scored and streamed together
+MAX_BODY_BYTES = 64 * 1024 * 1024
+
+INPUTS = {'house_price': DEFAULT_HOUSE_PRICE, **DEFAULTS}
+
+# Inputs are rounded like the app's cache keys, so requests that only differ in float noise share a response
+PRECISION = {
+    'house_price': MONEY, 'insurance_cost': MONEY, 'down_payment_ratio': RATIO, 'price_to_rent_ratio': RATIO,
+    'mortgage_rate': RATE, 'appreciation_rate': RATE, 'closing_costs_rate': RATE, 'property_tax_rate': RATE,
+    'yearly_rent_increase': RATE, 'investment_return_rate': RATE, 'marginal_tax_rate': RATE, 'pmi_rate': RATE,
+}
+
+# Inputs that can't be negative (rates are fractions, e.g. 0.065) and the ones that must be more than 0
+NON_NEGATIVE = {name for name, precision in PRECISION.items() if precision == RATE} | {'insurance_cost', 'down_payment_ratio'}
+POSITIVE = {'house_price', 'price_to_rent_ratio'}
+
+class RequestError(ValueError):
+    # Bad input, answered with a 400
+    pass
+
+def _parse_value(name, value):
+    default = INPUTS[name]
+    if isinstance(default, bool):
+        if isinstance(value, str):
+            if value.lower() not in ("1", "0", "true", "false", "yes", "no"):
+                raise RequestError(f"'{name}' must be true or false, got '{value}'")
+            return value.lower() in ("1", "true", "yes")
+        return bool(value)
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise RequestError(f"'{name}' must be a number, got '{value}'") from None
+    if not np.isfinite(number):
+        raise RequestError(f"'{name}' must be a finite number")
+    if name == 'years':
+        if number != int(number) or not 1 <= number <= LOAN_TERM_YEARS:
+            raise RequestError(f"'years' must be a whole number from 1 to {LOAN_TERM_YEARS}, got '{value}'")
+        return int(number)
+    number = round(number, PRECISION[name]) if name in PRECISION else number
+    if name in POSITIVE and number <= 0:
+        raise RequestError(f"'{name}' must be more than 0, got '{value}'")
+    if name in NON_NEGATIVE and number < 0:
+        raise RequestError(f"'{name}' can't be negative, got '{value}'")
+    if name == 'down_payment_ratio' and number > 1:
+        raise RequestError(f"'down_payment_ratio' can't be more than 1, got '{value}'")
+    return number
+
+def parse_inputs(raw, mortgage_rate):
+    # Every input with defaults filled in. `mortgage_rate` is used when the request doesn't set one.
+    unknown = set(raw) - set(INPUTS)
+    if unknown:
+        raise RequestError(f"Unknown input(s): {', '.join(sorted(unknown))}")
+    inputs = {**INPUTS, 'mortgage_rate': round(mortgage_rate, RATE)}
+    for name, value in raw.items():
+        if value is not None:
+            inputs[name] = _parse_value(name, value)
+    return inputs
+
+def _json_ready(value):
+    # Non-finite numbers (e.g. from degenerate inputs) become null, since JSON has no NaN or Infinity
+    if isinstance(value, np.ndarray):
+        return _json_ready(value.tolist())
+    if isinstance(value, np.generic):
+        return _json_ready(value.item())
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if isinstance(value, (list, tuple)):
+        return [_json_ready(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _json_ready(item) for key, item in value.items()}
+    return value
+
+def _dumps(value):
+    return json.dumps(_json_ready(value), separators=(",", ":"), allow_nan=False)
+
+def _loan_amount(inputs):
+    # Same loan amount update_calculator uses for the equity schedule
+    return inputs['house_price'] * (1 + inputs['closing_costs_rate'])
+
+def rent(inputs):
+    house_price, monthly_rent, breakdown, _, _ = calculate_rent_to_own(
+        inputs['house_price'],
+        inputs['closing_costs_rate'],
+        inputs['property_tax_rate'],
+        inputs['appreciation_rate'],
+        inputs['insurance_cost'],
+        DEFAULT_INTEREST_RATE,
+        inputs['include_closing_costs']
+    )
+    return {'house_price': house_price, 'monthly_rent': monthly_rent, 'breakdown': breakdown}
+
+def equity(inputs):
+    principal_over_time, appreciation_over_time = calculate_equity_over_time(inputs['house_price'], _loan_amount(inputs), DEFAULT_INTEREST_RATE, LOAN_TERM_YEARS, inputs['appreciation_rate'], inputs['years'])
+    return {
+        'years': inputs['years'],
+        'total_equity': principal_over_time[-1] + appreciation_over_time[-1],
+        'principal_over_time': principal_over_time,
+        'appreciation_over_time': appreciation_over_time,
+    }
+
+def compare(inputs):
+    monthly_rent = rent(inputs)['monthly_rent']
+    total_equity = sum(calculate_equity_breakdown(inputs['house_price'], _loan_amount(inputs), DEFAULT_INTEREST_RATE, LOAN_TERM_YEARS, inputs['appreciation_rate'], inputs['years']))
+    comparison_values = calculate_comparison_values(
+        inputs['house_price'],
+        inputs['property_tax_rate'],
+        inputs['appreciation_rate'],
+        inputs['years'],
+        monthly_rent,
+        total_equity,
+        inputs['down_payment_ratio'],
+        inputs['price_to_rent_ratio'],
+        inputs['investment_return_rate'],
+        inputs['marginal_tax_rate'],
+        inputs['mortgage_rate'],
+        inputs['pmi_rate'],
+        inputs['insurance_cost'],
+        inputs['yearly_rent_increase']
+    )
+    comparison_values = adjust_comparison_values(comparison_values, inputs['include_opportunity_cost'], inputs['include_tax_deductions'])
+    return {'years': inputs['years'], 'monthly_rent': monthly_rent, 'total_equity': total_equity, **comparison_values}
+
+def optimal(inputs):
+    # The years and down payment ratio are searched over, so any given in the request are ignored
+    return optimize(**{name: value for name, value in inputs.items() if name not in SEARCH_INPUTS})
+
+ENDPOINTS = {'/rent': rent, '/equity': equity, '/compare': compare, '/optimize': optimal}
+
+def score_rows(rows, mortgage_rate, chunk_size=BATCH_CHUNK_SIZE):
+    # Yields the scores of each row, a chunk at a time. Rows are dicts of inputs; an 'id' is passed through.
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        parsed = []
+        for i, row in enumerate(chunk, start):
+            if not isinstance(row, dict):
+                raise RequestError(f"Row {i} must be a JSON object")
+            inputs = {name: value for name, value in row.items() if name != 'id'}
+            try:
+                parsed.append(parse_inputs(inputs, mortgage_rate))
+            except RequestError as e:
+                raise RequestError(f"Row {i}: {e}") from None
+        columns = {name: np.array([inputs[name] for inputs in parsed]) for name in INPUTS}
+        scores = score_arrays(columns.pop('house_price'), **columns)
+        for i, row in enumerate(chunk):
+            result = {name: float(scores[name][i]) for name in OUTPUT_COLUMNS}
+            if 'id' in row:
+                result = {'id': row['id'], **result}
+            yield result
+
+class CalculatorServer(ThreadingHTTPServer):
+    # Serves each request on its own thread. Responses are cached in a bounded LRU cache
+    # keyed on the endpoint and the normalized inputs, and in the `shared` store (a
+    # cache_backend.CacheBackend) if there is one, for the other servers using it.
+    daemon_threads = True
+
+    def __init__(self, address, rate_provider, offline=False, cache_size=RESPONSE_CACHE_SIZE, quiet=True, shared=None):
+        super().__init__(address, Handler)
+        self.rate_provider = rate_provider
+        self.offline = offline
+        self.responses = new_cache("api_responses", cache_size)
+        self.shared = shared
+        # Servers running different code never share responses
+        self.namespace = "api:" + source_version(*(inspect.getsourcefile(f) for f in (make_server, calculate_comparison_values, score_arrays, optimize)))
+        self.quiet = quiet
+        self._lock = threading.Lock()
+        self.requests = {}
+        self.errors = 0
+
+    def mortgage_rate(self):
+        # Offline, the rate is only ever read from the rate cache (or the default), never fetched
+        return self.rate_provider.current() if self.offline else self.rate_provider.get()
+
+    def response(self, key, compute):
+        # The response body for `key`: cached in this process, else in the shared store, else computed
+        body = self.responses.get(key)
+        if body is None:
+            shared_key = make_key(self.namespace, key) if self.shared is not None else None
+            body = self.shared.get(shared_key) if shared_key else None
+            if body is None:
+                body = compute()
+                if shared_key:
+                    self.shared.set(shared_key, body)
+            self.responses.set(key, body)
+        return body
+
+    def count(self, path, error=False):
+        with self._lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+            self.errors += error
+
+    def metrics(self):
+        lines = ["# TYPE rent_to_own_api_requests_total counter"]
+        with self._lock:
+            lines += [f'rent_to_own_api_requests_total{{path="{path}"}} {count}' for path, count in sorted(self.requests.items())]
+            lines += ["# TYPE rent_to_own_api_errors_total counter", f"rent_to_own_api_errors_total {self.errors}"]
+        return metrics_text() + "\n".join(lines) + "\n"
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep connections open between requests
+    # Send the headers and body of a response in one packet instead of waiting on delayed ACKs
+    wbufsize = 64 * 1024
+    disable_nagle_algorithm = True
+    server_version = "RentToOwnAPI/1.0"
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def _send(self, status, body, content_type="application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status, message):
+        self.server.count(self.path_only, error=True)
+        self._send(status, json.dumps({'error': message}).encode())
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            raise RequestError(f"Request body is larger than {MAX_BODY_BYTES:,} bytes")
+        return self.rfile.read(length) if length else b""
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        self.path_only = url.path
+        if url.path == "/metrics":
+            self.server.count(url.path)
+            return self._send(200, self.server.metrics().encode(), "text/plain; version=0.0.4")
+        if url.path == "/health":
+            self.server.count(url.path)
+            return self._send(200, b'{"status":"ok"}')
+        self._handle(url.path, dict(parse_qsl(url.query)))
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        self.path_only = url.path
+        try:
+            body = self._read_body()
+            if url.path == "/batch":
+                return self._batch(body)
+            raw = dict(parse_qsl(url.query))
+            if body:
+                payload = json.loads(body)
+                if not isinstance(payload, dict):
+                    raise RequestError("The request body must be a JSON object")
+                raw.update(payload)
+        except (RequestError, ValueError) as e:
+            return self._send_error(400, str(e))
+        except Exception as e:
+            # Only reached before a batch response has started; see _batch
+            self.log_error("Error answering %s: %r", url.path, e)
+            return self._send_error(500, f"Couldn't compute {url.path}: {e}")
+        self._handle(url.path, raw)
+
+    def _handle(self, path, raw):
+        endpoint = ENDPOINTS.get(path)
+        if endpoint is None:
+            return self._send_error(404, f"No endpoint at {path}")
+        try:
+            inputs = parse_inputs(raw, self.server.mortgage_rate())
+        except RequestError as e:
+            return self._send_error(400, str(e))
+
+        key = (path, tuple(inputs.values()))
+        try:
+            body = self.server.response(key, lambda: _dumps(endpoint(inputs)).encode())
+        except Exception as e:
+            self.log_error("Error answering %s: %r", path, e)
+            return self._send_error(500, f"Couldn't compute {path}: {e}")
+        self.server.count(path)
+        self._send(200, body)
+
+    def _batch(self, body):
+        # The body is {"rows": [...]} or one JSON object per line. Scores are streamed back as
+        # JSON lines with chunked encoding, so large batches never sit in memory as one response.
+        if self.headers.get("Content-Type", "").startswith("application/x-ndjson"):
+            rows = [json.loads(line) for line in body.splitlines() if line.strip()]
+        else:
+            payload = json.loads(body or b"{}")
+            rows = payload.get('rows') if isinstance(payload, dict) else None
+            if not isinstance(rows, list):
+                raise RequestError("The request body must be {\"rows\": [...]} or JSON lines")
+        scores = score_rows(rows, self.server.mortgage_rate())
+        # Scoring the first row checks its whole chunk before answering, so bad input there still gets a 400
+        first = next(scores, None)
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        lines = []
+        try:
+            for result in itertools.chain([first] if first is not None else [], scores):
+                lines.append(_dumps(result))
+                if len(lines) == BATCH_CHUNK_SIZE:
+                    self._write_chunk(lines)
+                    lines = []
+        except Exception as e:
+            # Too late for a status code; the error is the last line
+            if not isinstance(e, RequestError):
+                self.log_error("Error answering /batch: %r", e)
+            lines.append(json.dumps({'error': str(e)}))
+        self._write_chunk(lines)
+        self.wfile.write(b"0\r\n\r\n")
+        self.server.count("/batch")
+
+    def _write_chunk(self, lines):
+        if lines:
+            data = ("\n".join(lines) + "\n").encode()
+            self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+def make_server(host=DEFAULT_HOST, port=DEFAULT_PORT, offline=False, mortgage_rate=None, cache_size=RESPONSE_CACHE_SIZE, quiet=True):
+    # `mortgage_rate` is the fallback for when no rate has been cached yet. Set SHARED_CACHE_PATH
+    # to share the rate and responses with other servers (see cache.shared_backend).
+    shared = shared_backend()
+    return CalculatorServer((host, port), RateProvider(default=mortgage_rate, store=shared), offline=offline, cache_size=cache_size, quiet=quiet, shared=shared)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the rent-to-own calculations as a JSON API.")
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"Address to listen on (default: {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port to listen on (default: {DEFAULT_PORT})")
+    parser.add_argument("--offline", action="store_true", help="Never fetch the mortgage rate; use the cached rate or --mortgage-rate")
+    parser.add_argument("--mortgage-rate", type=float, help="Mortgage rate used when requests don't set one and nothing is cached")
+    parser.add_argument("--cache-size", type=int, default=RESPONSE_CACHE_SIZE, help=f"Responses kept in the cache (default: {RESPONSE_CACHE_SIZE})")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    args = parser.parse_args(argv)
+
+    server = make_server(args.host, args.port, args.offline, args.mortgage_rate, args.cache_size, quiet=not args.verbose)
+    print(f"Serving on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+import argparse
+import csv
+import os
+
+import numpy as np
+
+from core import DEFAULT_HOUSE_PRICE, MAX_YEARS
+from batch import OUTPUT_COLUMNS, add_input_arguments, score_arrays
+from simulation import win_probabilities
+
+# How each option would have fared for a home bought in any month of the last ~50 years, from
+# local FRED downloads of the 30-year mortgage rate and a home price index (quarterly ones like
+# USSTHPI, which goes back to 1975, are interpolated to months), e.g.
+#   https://fred.stlouisfed.org/graph/fredgraph.csv?id=MORTGAGE30US
+#   https://fred.stlouisfed.org/graph/fredgraph.csv?id=USSTHPI
+# The CSVs are parsed once into binary copies under .cache/history, which are memory-mapped after that.
+HISTORY_DIR = os.environ.get("HISTORY_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "history"))
+RATE_HISTORY_PATH = os.environ.get("RATE_HISTORY_PATH", os.path.join(HISTORY_DIR, "MORTGAGE30US.csv"))
+HPI_HISTORY_PATH = os.environ.get("HPI_HISTORY_PATH", os.path.join(HISTORY_DIR, "USSTHPI.csv"))
+HISTORY_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "history")
+HORIZONS = tuple(range(1, MAX_YEARS + 1))
+PERCENTILES = (10, 50, 90)
+
+SERIES_DTYPE = np.dtype([('month', 'datetime64[M]'), ('value', 'f8')])
+# Taken from the history for every start month and horizon, so they can't be set as inputs
+HISTORY_INPUTS = ('mortgage_rate', 'appreciation_rate', 'years')
+
+def read_fred_csv(path):
+    # A FRED CSV download as one value per month. Weekly and daily observations are averaged
+    # over the month; missing values ('.' or blank) are skipped.
+    months, values = [], []
+    with open(path, newline='') as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        for row in reader:
+            if len(row) < 2 or row[1].strip() in ('', '.'):
+                continue
+            months.append(row[0][:7])
+            values.append(float(row[1]))
+
+    unique, inverse = np.unique(np.array(months, dtype='datetime64[M]'), return_inverse=True)
+    series = np.empty(len(unique), dtype=SERIES_DTYPE)
+    series['month'] = unique
+    series['value'] = np.bincount(inverse, weights=values) / np.bincount(inverse)
+    return series
+
+def load_series(path, cache_dir=HISTORY_CACHE_DIR):
+    # The monthly series in a FRED CSV, memory-mapped from a binary copy that is rebuilt
+    # whenever the CSV is newer than it
+    cache_path = os.path.join(cache_dir, os.path.basename(path) + ".npy")
+    try:
+        if os.path.getmtime(cache_path) >= os.path.getmtime(path):
+            return np.load(cache_path, mmap_mode='r')
+    except OSError:
+        pass
+
+    series = read_fred_csv(path)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Write to a temporary file first so readers never see a half-written copy
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, series)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        return series
+    return np.load(cache_path, mmap_mode='r')
+
+def _monthly(series, months):
+    # Values at `months`, interpolated between observations (e.g. for a quarterly index)
+    observed = series['month'].astype(np.int64)
+    return np.interp(months.astype(np.int64), observed, series['value'], left=np.nan, right=np.nan)
+
+def load_history(rates_path=RATE_HISTORY_PATH, hpi_path=HPI_HISTORY_PATH):
+    # Month-by-month mortgage rate (as a fraction) and home price index over the months both cover
+    rates, hpi = load_series(rates_path), load_series(hpi_path)
+    first = max(rates['month'][0], hpi['month'][0])
+    last = min(rates['month'][-1], hpi['month'][-1])
+    months = np.arange(first, last + 1)
+    return {
+        'month': months,
+        'mortgage_rate': _monthly(rates, months) / 100,
+        'hpi': _monthly(hpi, months),
+    }
+
+def backtest(history, house_price=DEFAULT_HOUSE_PRICE, horizons=HORIZONS, **inputs):
+    # Every option's true cost for a home bought in each month of `history` and kept for each of
+    # `horizons` years. The mortgage rate is the one in the month of purchase and the home
+    # appreciates as the index did over the stay; everything else comes from `inputs` (any of
+    # batch.DEFAULTS besides HISTORY_INPUTS).
+    #
+    # The appreciation over every stay is read off rolling windows over the index, and all start
+    # months and horizons are scored together in one batch.score_arrays call.
+    #
+    # Returns the start months and horizons, and (start months, horizons) arrays of every
+    # batch.OUTPUT_COLUMNS score and of the mortgage and yearly appreciation rates used.
+    # Stays that run past the end of the history are NaN.
+    for name in HISTORY_INPUTS:
+        if name in inputs:
+            raise ValueError(f"'{name}' comes from the history and can't be set for a backtest")
+    horizons = np.asarray(horizons, dtype=int)
+    hpi = np.asarray(history['hpi'], dtype=float)
+
+    # Index values 0, 12, 24, ... months after each start month, NaN past the end
+    longest = int(horizons.max()) * 12
+    windows = np.lib.stride_tricks.sliding_window_view(np.concatenate([hpi, np.full(longest, np.nan)]), longest + 1)
+    growth = windows[:len(hpi), horizons * 12] / windows[:len(hpi), :1]
+
+    with np.errstate(invalid='ignore'):
+        appreciation_rate = growth ** (1 / horizons) - 1
+    mortgage_rate = np.broadcast_to(np.asarray(history['mortgage_rate'], dtype=float)[:, np.newaxis], growth.shape)
+    years = np.broadcast_to(horizons, growth.shape)
+    valid = np.isfinite(appreciation_rate) & np.isfinite(mortgage_rate)
+
+    scores = score_arrays(
+        np.full(np.count_nonzero(valid), float(house_price)),
+        **inputs,
+        mortgage_rate=mortgage_rate[valid],
+        appreciation_rate=appreciation_rate[valid],
+        years=years[valid]
+    )
+
+    result = {'month': history['month'], 'years': horizons}
+    for name, values in {**scores, 'mortgage_rate': mortgage_rate[valid], 'appreciation_rate': appreciation_rate[valid]}.items():
+        result[name] = np.full(growth.shape, np.nan)
+        result[name][valid] = values
+    return result
+
+def summarize(result, percentiles=PERCENTILES):
+    # One row per horizon: the number of start months with a full history, the share of them in
+    # which each option was cheapest, and percentiles of how much more rent-to-own cost than the others
+    rows = []
+    for i, years in enumerate(result['years']):
+        valid = np.isfinite(result['rent_to_own_cost'][:, i])
+        row = {'years': int(years), 'starts': int(np.count_nonzero(valid))}
+        if row['starts']:
+            first_month, last_month = result['month'][valid][[0, -1]]
+            row.update(first_start=str(first_month), last_start=str(last_month))
+            costs = {name: result[f'{name}_cost'][valid, i] for name in ('rent_to_own', 'traditional', 'renting')}
+            row.update({f'{name}_cheapest': share for name, share in win_probabilities(costs).items()})
+            for delta in ('traditional_delta', 'renting_delta'):
+                for percentile, value in zip(percentiles, np.percentile(result[delta][valid, i], percentiles)):
+                    row[f'{delta}_p{percentile}'] = float(value)
+        rows.append(row)
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backtest rent-to-own against a mortgage and renting over every start month of the rate and home price history.")
+    parser.add_argument("--rates", default=RATE_HISTORY_PATH, help=f"FRED CSV of the 30-year mortgage rate in percent (default: {RATE_HISTORY_PATH})")
+    parser.add_argument("--hpi", default=HPI_HISTORY_PATH, help=f"FRED CSV of a home price index (default: {HPI_HISTORY_PATH})")
+    parser.add_argument("--house-price", type=float, default=DEFAULT_HOUSE_PRICE)
+    parser.add_argument("--output", help="Also write every start month and horizon to this CSV or Parquet file")
+    add_input_arguments(parser, exclude=HISTORY_INPUTS)
+    args = vars(parser.parse_args(argv))
+
+    rates_path, hpi_path, house_price, output_path = args.pop('rates'), args.pop('hpi'), args.pop('house_price'), args.pop('output')
+    result = backtest(load_history(rates_path, hpi_path), house_price, **args)
+
+    print(f"{'years':>5} {'starts':>7} {'rent to own':>12} {'mortgage':>9} {'renting':>8}   {'vs mortgage (P10 / P50 / P90)':>36}")
+    for row in summarize(result):
+        if not row['starts']:
+            continue
+        deltas = " / ".join(f"{'-' if row[f'traditional_delta_p{p}'] < 0 else ''}${abs(row[f'traditional_delta_p{p}']):,.0f}" for p in PERCENTILES)
+        print(f"{row['years']:>5} {row['starts']:>7} {row['rent_to_own_cheapest']:>12.0%} {row['traditional_cheapest']:>9.0%} {row['renting_cheapest']:>8.0%}   {deltas:>36}")
+
+    if output_path:
+        import pandas as pd
+        from batch import write_table
+
+        starts, horizons = np.meshgrid(np.arange(len(result['month'])), np.arange(len(result['years'])), indexing='ij')
+        columns = {'start': result['month'][starts.ravel()].astype(str), 'years': result['years'][horizons.ravel()]}
+        for name in ('mortgage_rate', 'appreciation_rate', *OUTPUT_COLUMNS):
+            columns[name] = result[name].ravel()
+        frame = pd.DataFrame(columns).dropna(subset=['rent_to_own_cost'])
+        write_table(frame, output_path)
+        print(f"Wrote {len(frame):,} backtested stays into {output_path}")
+
+if __name__ == "__main__":
+    main()
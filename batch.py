@@ -0,0 +1,234 @@
+import argparse
+
+import numpy as np
+
+from core import (
+    DEFAULT_INTEREST_RATE, INSURANCE_FIXED, LOAN_TERM_YEARS, DEFAULT_YEARS, DOWN_PAYMENT_RATIO,
+    DEFAULT_MORTGAGE_RATE, DEFAULT_APPRECIATION_RATE, DEFAULT_CLOSING_COSTS_RATE, DEFAULT_PROPERTY_TAX_RATE,
+    DEFAULT_YEARLY_RENT_INCREASE, DEFAULT_INVESTMENT_RETURN_RATE, DEFAULT_PRICE_TO_RENT_RATIO,
+    DEFAULT_MARGINAL_TAX_RATE, DEFAULT_PMI_RATE,
+    calculate_rent_to_own, calculate_equity_breakdown, calculate_comparison_values, adjust_comparison_values,
+)
+
+# Every input the app takes, with the value used when a row doesn't override it.
+# Rates are fractions (0.035 for 3.5%), the same as in core.py.
+DEFAULTS = {
+    'mortgage_rate': DEFAULT_MORTGAGE_RATE,
+    'appreciation_rate': DEFAULT_APPRECIATION_RATE,
+    'closing_costs_rate': DEFAULT_CLOSING_COSTS_RATE,
+    'property_tax_rate': DEFAULT_PROPERTY_TAX_RATE,
+    'yearly_rent_increase': DEFAULT_YEARLY_RENT_INCREASE,
+    'investment_return_rate': DEFAULT_INVESTMENT_RETURN_RATE,
+    'price_to_rent_ratio': DEFAULT_PRICE_TO_RENT_RATIO,
+    'marginal_tax_rate': DEFAULT_MARGINAL_TAX_RATE,
+    'pmi_rate': DEFAULT_PMI_RATE,
+    'insurance_cost': INSURANCE_FIXED,
+    'years': DEFAULT_YEARS,
+    'down_payment_ratio': DOWN_PAYMENT_RATIO,
+    'include_closing_costs': True,
+    'include_opportunity_cost': True,
+    'include_tax_deductions': True,
+}
+
+OUTPUT_COLUMNS = [
+    'monthly_rent', 'traditional_payment', 'rental_payment',
+    'rent_to_own_equity', 'traditional_equity', 'renting_equity',
+    'rent_to_own_cost', 'traditional_cost', 'renting_cost',
+    'traditional_delta', 'renting_delta',
+]
+
+DEFAULT_CHUNK_SIZE = 20000
+
+def _column(frame, name, default):
+    # Per-row override if the column exists, with blanks falling back to the default
+    if name not in frame:
+        return np.asarray(default)
+    values = frame[name].to_numpy(dtype=float, na_value=np.nan)
+    return np.where(np.isnan(values), float(default), values)
+
+def score_arrays(house_price, **overrides):
+    # Score many properties at once. Every argument is a scalar or an array with one value per row.
+    # This needs only NumPy; pandas is imported by the table helpers below when they are used.
+    # The *_delta scores (here and wherever else they appear, e.g. in breakeven.py) are rent-to-own's
+    # true cost minus the other option's, the same sign as the deltas on the metric tiles:
+    # positive means rent-to-own costs more.
+    params = {**DEFAULTS, **overrides}
+    house_price = np.asarray(house_price, dtype=float)
+    years = np.asarray(params['years']).astype(int)
+    include_closing_costs = np.asarray(params['include_closing_costs'], dtype=bool)
+
+    _, monthly_rent, _, _, _ = calculate_rent_to_own(
+        house_price,
+        params['closing_costs_rate'],
+        params['property_tax_rate'],
+        params['appreciation_rate'],
+        params['insurance_cost'],
+        DEFAULT_INTEREST_RATE,
+        include_closing_costs
+    )
+
+    # Same loan amount update_calculator uses for the equity schedule
+    loan_amount = house_price * (1 + np.asarray(params['closing_costs_rate']))
+    total_principal, renter_share_appreciation = calculate_equity_breakdown(house_price, loan_amount, DEFAULT_INTEREST_RATE, LOAN_TERM_YEARS, params['appreciation_rate'], years)
+    total_equity = total_principal + renter_share_appreciation
+
+    comparison_values = calculate_comparison_values(
+        house_price,
+        params['property_tax_rate'],
+        params['appreciation_rate'],
+        years,
+        monthly_rent,
+        total_equity,
+        params['down_payment_ratio'],
+        params['price_to_rent_ratio'],
+        params['investment_return_rate'],
+        params['marginal_tax_rate'],
+        params['mortgage_rate'],
+        params['pmi_rate'],
+        params['insurance_cost'],
+        params['yearly_rent_increase']
+    )
+    comparison_values = adjust_comparison_values(comparison_values, params['include_opportunity_cost'], params['include_tax_deductions'])
+
+    shape = house_price.shape
+    scores = {
+        'monthly_rent': monthly_rent,
+        'traditional_payment': comparison_values['traditional_payment'],
+        'rental_payment': comparison_values['rental_payment'],
+        'rent_to_own_equity': total_equity,
+        'traditional_equity': comparison_values['traditional_equity'],
+        'renting_equity': 0.0,
+        'rent_to_own_cost': comparison_values['rent_to_own_cost'],
+        'traditional_cost': comparison_values['traditional_cost'],
+        'renting_cost': comparison_values['renting_cost'],
+        'traditional_delta': comparison_values['rent_to_own_cost'] - comparison_values['traditional_cost'],
+        'renting_delta': comparison_values['rent_to_own_cost'] - comparison_values['renting_cost'],
+    }
+    return {name: np.broadcast_to(value, shape) for name, value in scores.items()}
+
+def score_frame(frame, chunk_size=DEFAULT_CHUNK_SIZE, **defaults):
+    # Score every row of a DataFrame that has a `house_price` column plus any DEFAULTS columns as overrides.
+    # Rows are scored a chunk at a time so the monthly schedules stay small in memory.
+    import pandas as pd
+
+    defaults = {**DEFAULTS, **defaults}
+    chunks = []
+    for start in range(0, len(frame), chunk_size):
+        chunk = frame.iloc[start:start + chunk_size]
+        overrides = {name: _column(chunk, name, default) for name, default in defaults.items()}
+        scores = score_arrays(chunk['house_price'].to_numpy(dtype=float), **overrides)
+        chunks.append(pd.DataFrame(scores, index=chunk.index))
+
+    scores = pd.concat(chunks) if chunks else pd.DataFrame(columns=OUTPUT_COLUMNS, dtype=float)
+    return frame.join(scores[OUTPUT_COLUMNS], rsuffix='_score')
+
+def solve_frame(frame, target, chunk_size=DEFAULT_CHUNK_SIZE, **defaults):
+    # The inverse of score_frame: every row has a `target` column (e.g. a monthly_rent budget)
+    # and gets the house price that meets it, see solver.solve_house_price. An optional
+    # `down_payment` column holds a down payment in dollars (blank for none) instead of a ratio.
+    import pandas as pd
+    from solver import solve_house_price
+
+    defaults = {**DEFAULTS, **defaults}
+    chunks = []
+    for start in range(0, len(frame), chunk_size):
+        chunk = frame.iloc[start:start + chunk_size]
+        overrides = {name: _column(chunk, name, default) for name, default in defaults.items()}
+        down_payment = _column(chunk, 'down_payment', 0.0) if 'down_payment' in chunk else None
+        solved = solve_house_price(chunk[target].to_numpy(dtype=float), target, down_payment=down_payment, **overrides)
+        chunks.append(pd.DataFrame({name: np.broadcast_to(value, len(chunk)) for name, value in solved.items()}, index=chunk.index))
+
+    solved = pd.concat(chunks) if chunks else pd.DataFrame(columns=['house_price', 'down_payment', 'down_payment_ratio'], dtype=float)
+    return frame.drop(columns=['down_payment'], errors='ignore').join(solved, rsuffix='_solved')
+
+def sensitivity_frame(frame, shift=None, chunk_size=DEFAULT_CHUNK_SIZE, **defaults):
+    # sensitivity.sensitivity for every row of a DataFrame laid out as for score_frame. Each row
+    # gets its base true costs plus one column per cost, input and direction with the change,
+    # e.g. rent_to_own_cost_mortgage_rate_high. Every row is scored 21 times, so fewer rows go
+    # into each chunk.
+    import pandas as pd
+    from sensitivity import COSTS, DEFAULT_SHIFT, SENSITIVITY_INPUTS, sensitivity
+
+    shift = DEFAULT_SHIFT if shift is None else shift
+    defaults = {**DEFAULTS, **defaults}
+    rows = max(1, chunk_size // (1 + 2 * len(SENSITIVITY_INPUTS)))
+    columns = list(COSTS) + [f'{cost}_{name}_{side}' for cost in COSTS for name in SENSITIVITY_INPUTS for side in ('low', 'high')]
+    chunks = []
+    for start in range(0, len(frame), rows):
+        chunk = frame.iloc[start:start + rows]
+        overrides = {name: _column(chunk, name, default) for name, default in defaults.items()}
+        result = sensitivity(chunk['house_price'].to_numpy(dtype=float), shift, **overrides)
+        changes = {cost: np.broadcast_to(result[cost], len(chunk)) for cost in COSTS}
+        for cost in COSTS:
+            for side in ('low', 'high'):
+                values = np.broadcast_to(result[f'{cost}_{side}'], (len(chunk), len(SENSITIVITY_INPUTS)))
+                for i, name in enumerate(SENSITIVITY_INPUTS):
+                    changes[f'{cost}_{name}_{side}'] = values[:, i]
+        chunks.append(pd.DataFrame(changes, index=chunk.index))
+
+    changes = pd.concat(chunks) if chunks else pd.DataFrame(columns=columns, dtype=float)
+    return frame.join(changes[columns], rsuffix='_sensitivity')
+
+def add_input_arguments(parser, exclude=(), help_text="(default: {default})"):
+    # An option per DEFAULTS input besides `exclude` (e.g. --mortgage-rate), for the command line
+    # tools. Flags and `years` take whole numbers (0 or 1 for flags); everything else, including
+    # inputs with whole-number defaults like insurance_cost, takes any number. `help_text` is
+    # formatted with the input's name and default.
+    for name, default in DEFAULTS.items():
+        if name in exclude:
+            continue
+        parser.add_argument(f"--{name.replace('_', '-')}", type=int if isinstance(default, bool) or name == 'years' else float,
+                            default=default, help=help_text.format(name=name, default=default))
+
+def read_table(path):
+    import pandas as pd
+
+    if str(path).endswith('.parquet'):
+        return pd.read_parquet(path)
+    return pd.read_csv(path)
+
+def write_table(frame, path):
+    if str(path).endswith('.parquet'):
+        frame.to_parquet(path, index=False)
+    else:
+        frame.to_csv(path, index=False)
+
+def score_file(input_path, output_path, chunk_size=DEFAULT_CHUNK_SIZE, **defaults):
+    frame = score_frame(read_table(input_path), chunk_size=chunk_size, **defaults)
+    write_table(frame, output_path)
+    return frame
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a table of properties with the rent-to-own calculator.")
+    parser.add_argument("input", help="CSV or Parquet file with a house_price column (or the --solve column) and optional per-row overrides")
+    parser.add_argument("output", help="CSV or Parquet file to write the scores to")
+    parser.add_argument("--solve", metavar="TARGET", help="Instead of scoring, find the house price that meets the TARGET column of each row, e.g. monthly_rent")
+    parser.add_argument("--sensitivity", metavar="SHIFT", type=float, help="Instead of scoring, move every advanced setting this share of its value down and up (e.g. 0.1) and write how much each true cost changes")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Rows scored together at a time")
+    add_input_arguments(parser, help_text="Default {name} for rows that don't set it (default: {default})")
+    args = vars(parser.parse_args(argv))
+
+    input_path, output_path, chunk_size, target, shift = args.pop('input'), args.pop('output'), args.pop('chunk_size'), args.pop('solve'), args.pop('sensitivity')
+    if target and shift:
+        parser.error("--solve and --sensitivity can't be used together")
+    if shift:
+        from sensitivity import COSTS, SENSITIVITY_INPUTS
+
+        frame = sensitivity_frame(read_table(input_path), shift, chunk_size=chunk_size, **args)
+        write_table(frame, output_path)
+        print(f"Wrote the sensitivity of {len(frame):,} properties into {output_path}")
+        # The portfolio's total true cost change for each input, biggest swing first
+        print(f"{'input':<24} " + " ".join(f"{cost.replace('_cost', '') + ' ' + side:>20}" for cost in COSTS for side in ('low', 'high')))
+        totals = {name: [frame[f'{cost}_{name}_{side}'].sum() for cost in COSTS for side in ('low', 'high')] for name in SENSITIVITY_INPUTS}
+        for name, values in sorted(totals.items(), key=lambda item: -max(abs(value) for value in item[1])):
+            print(f"{name:<24} " + " ".join(f"{('-' if value < 0 else '+') + f'${abs(value):,.0f}':>20}" for value in values))
+    elif target:
+        frame = solve_frame(read_table(input_path), target, chunk_size=chunk_size, **args)
+        write_table(frame, output_path)
+        print(f"Solved {len(frame):,} {target} targets into {output_path}")
+    else:
+        frame = score_file(input_path, output_path, chunk_size=chunk_size, **args)
+        print(f"Scored {len(frame):,} properties into {output_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+# Load test of one Streamlit server process running the calculator.
+#
+#     python benchmarks/loadtest.py --sessions 200 --actions 10
+#     python benchmarks/loadtest.py --sessions 200 --waves 3 --output load.json
+#
+# Starts `streamlit run calculator.py` with the FRED call stubbed out and connects simulated
+# browsers to it over Streamlit's websocket, the way the frontend does. Each session opens the
+# page, then changes the house price, toggles closing costs, moves either years slider or changes
+# the cost comparison popover, pausing in between like a person would. Changing a widget inside a
+# fragment only reruns that fragment, as in the browser.
+#
+# Reports the p50/p95/p99 rerun latency (from sending a change to the end of the rerun it caused)
+# for every kind of interaction, the reruns per second, and the server's resident memory over time.
+# With --waves, a new set of sessions connects once the previous one has disconnected; memory that
+# keeps growing from wave to wave points at a leak rather than at sessions that are still alive.
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+import numpy as np
+
+from run import ROOT, metadata, stub_rate_cache
+from core import MAX_YEARS
+
+SESSIONS = 200
+ACTIONS = 10  # Interactions per session after opening the page
+THINK_TIME = 1.0  # Mean seconds between two interactions of a session
+PERCENTILES = (50, 95, 99)
+SAMPLE_INTERVAL = 1.0
+SERVER_START_TIMEOUT = 60
+
+# The label each widget starts with, how often it's changed relative to the others, and its new
+# value given the current one
+INTERACTIONS = {
+    'house_price': ("Enter the price", 2, lambda rng, value: float(rng.integers(150, 900) * 1000)),
+    'closing_costs': ("Automatically add", 1, lambda rng, value: not value),
+    'top_slider': ("Select the number of years", 3, lambda rng, value: [float(rng.integers(1, MAX_YEARS + 1))]),
+    'bottom_slider': ("Adjust the number of years", 2, lambda rng, value: [float(rng.integers(1, MAX_YEARS + 1))]),
+    'popover': ("Include down payment opportunity cost", 1, lambda rng, value: not value),
+}
+WIDGET_TYPES = ('checkbox', 'number_input', 'slider')
+
+def widget_state(widget_id, kind, value):
+    from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+    state = WidgetState(id=widget_id)
+    if kind == 'checkbox':
+        state.bool_value = value
+    elif kind == 'slider':
+        state.double_array_value.data[:] = value
+    elif kind == 'int':
+        state.int_value = int(value)
+    else:
+        state.double_value = value
+    return state
+
+class Browser:
+    # One simulated browser tab. Like the frontend, it keeps the value of every widget on the page
+    # and sends all of them with each rerun.
+
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.widgets = {}  # label -> (widget id, fragment id)
+        self.values = {}  # widget id -> (kind, value)
+
+    def _track(self, element, fragment_id, widgets, values):
+        element_type = element.WhichOneof('type')
+        widget = getattr(element, element_type)
+        kind = 'int' if element_type == 'number_input' and widget.data_type == widget.INT else element_type
+        widgets[widget.label] = (widget.id, fragment_id)
+        if widget.set_value or widget.id not in self.values:
+            # A value set by the script (e.g. the other years slider's callback) or a new widget
+            value = widget.value if widget.set_value else widget.default
+            values[widget.id] = (kind, list(value) if element_type == 'slider' else value)
+        else:
+            values[widget.id] = self.values[widget.id]
+
+    async def rerun(self, fragment_id=""):
+        # Returns the latency of the rerun in ms and the exceptions the script showed
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        message = BackMsg()
+        message.rerun_script.query_string = ""
+        message.rerun_script.page_script_hash = ""
+        message.rerun_script.fragment_id = fragment_id
+        for widget_id, (kind, value) in self.values.items():
+            message.rerun_script.widget_states.widgets.append(widget_state(widget_id, kind, value))
+
+        start = time.perf_counter()
+        await self.websocket.send(message.SerializeToString())
+        widgets, values, exceptions = {}, {}, []
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(await self.websocket.recv())
+            forward_type = forward.WhichOneof('type')
+            if forward_type == 'script_finished':
+                if forward.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    exceptions.append("The script failed to compile")
+                break
+            if forward_type != 'delta' or forward.delta.WhichOneof('type') != 'new_element':
+                continue
+            element = forward.delta.new_element
+            if element.WhichOneof('type') == 'exception':
+                exceptions.append(element.exception.message)
+            elif element.WhichOneof('type') in WIDGET_TYPES:
+                self._track(element, forward.delta.fragment_id, widgets, values)
+        latency = (time.perf_counter() - start) * 1000
+
+        # A fragment rerun only sends the widgets inside the fragment
+        if fragment_id:
+            self.widgets.update(widgets)
+            self.values.update(values)
+        else:
+            self.widgets, self.values = widgets, values
+        return latency, exceptions
+
+    async def change(self, label, new_value, rng):
+        # Change the widget whose label starts with `label` and wait for the rerun
+        matches = [key for key in self.widgets if key.startswith(label)]
+        if not matches:
+            return None, [f"No widget labelled '{label}...' on the page"]
+        widget_id, fragment_id = self.widgets[matches[-1]]
+        kind, value = self.values[widget_id]
+        self.values[widget_id] = (kind, new_value(rng, value))
+        return await self.rerun(fragment_id)
+
+async def run_session(url, rng, actions, think_time, record):
+    import websockets
+
+    async with websockets.connect(url, subprotocols=["streamlit"], max_size=None) as websocket:
+        browser = Browser(websocket)
+        record('page_load', *await browser.rerun())
+        names = list(INTERACTIONS)
+        weights = np.array([INTERACTIONS[name][1] for name in names], dtype=float)
+        for _ in range(actions):
+            await asyncio.sleep(rng.exponential(think_time) if think_time else 0)
+            name = names[rng.choice(len(names), p=weights / weights.sum())]
+            label, _, new_value = INTERACTIONS[name]
+            record(name, *await browser.change(label, new_value, rng))
+
+def resident_memory(pid):
+    # Resident set size of process `pid` in MB, read from /proc (so only on Linux)
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+async def sample_memory(pid, samples, reruns, start, interval):
+    while True:
+        samples.append({'elapsed_s': time.perf_counter() - start, 'rss_mb': resident_memory(pid), 'reruns': len(reruns)})
+        await asyncio.sleep(interval)
+
+async def run_waves(url, pid, args):
+    reruns, errors, samples, waves = [], [], [], []
+    start = time.perf_counter()
+    sampler = asyncio.create_task(sample_memory(pid, samples, reruns, start, args.sample_interval))
+
+    for wave in range(args.waves):
+        wave_start, first_rerun = time.perf_counter(), len(reruns)
+
+        def record(name, latency, exceptions):
+            if latency is not None:
+                reruns.append({'wave': wave, 'interaction': name, 'latency_ms': latency})
+            errors.extend(f"{name}: {exception}" for exception in exceptions)
+
+        async def session(i):
+            # Sessions connect evenly over the ramp-up
+            await asyncio.sleep(i * args.ramp_up / args.sessions)
+            rng = np.random.default_rng([args.seed, wave, i])
+            await run_session(url, rng, args.actions, args.think_time, record)
+
+        outcomes = await asyncio.gather(*(session(i) for i in range(args.sessions)), return_exceptions=True)
+        errors.extend(f"session: {outcome!r}" for outcome in outcomes if isinstance(outcome, BaseException))
+        duration = time.perf_counter() - wave_start
+        peak = max((s['rss_mb'] or 0 for s in samples if s['elapsed_s'] >= wave_start - start), default=0)
+
+        # Give the server time to drop the disconnected sessions before measuring what's left
+        await asyncio.sleep(args.settle)
+        waves.append({
+            'wave': wave + 1,
+            'duration_s': duration,
+            'reruns': len(reruns) - first_rerun,
+            'reruns_per_s': (len(reruns) - first_rerun) / duration,
+            'peak_rss_mb': peak or None,
+            'settled_rss_mb': resident_memory(pid),
+        })
+
+    sampler.cancel()
+    return reruns, errors, samples, waves
+
+def summarize(reruns, percentiles=PERCENTILES):
+    # Latency percentiles of every interaction and of all reruns together
+    latencies = {'all': [r['latency_ms'] for r in reruns]}
+    for r in reruns:
+        latencies.setdefault(r['interaction'], []).append(r['latency_ms'])
+    summary = {}
+    for name, values in latencies.items():
+        if not values:
+            continue
+        summary[name] = {'count': len(values), 'mean_ms': float(np.mean(values)), 'max_ms': float(np.max(values))}
+        for percentile, value in zip(percentiles, np.percentile(values, percentiles)):
+            summary[name][f'p{percentile}_ms'] = float(value)
+    return summary
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+def start_server(port, cache_dir):
+    env = {
+        **os.environ,
+        'RATE_CACHE_PATH': stub_rate_cache(cache_dir),
+        # Drop sessions as soon as they disconnect, so memory left after a wave isn't theirs
+        'STREAMLIT_SERVER_DISCONNECTED_SESSION_TTL': '0',
+    }
+    log_path = os.path.join(cache_dir, "server.log")
+    with open(log_path, "w") as log:
+        server = subprocess.Popen(
+            [sys.executable, "-m", "streamlit", "run", os.path.join(ROOT, "calculator.py"),
+             "--server.headless", "true", "--server.port", str(port),
+             "--server.fileWatcherType", "none", "--browser.gatherUsageStats", "false"],
+            cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT
+        )
+
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline and server.poll() is None:
+        try:
+            with urllib.request.urlopen(f"http://localhost:{port}/_stcore/health", timeout=1):
+                return server
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    with open(log_path) as log:
+        raise RuntimeError(f"The Streamlit server didn't start:\n{log.read()[-2000:]}")
+
+def report(summary, waves, samples, errors):
+    print(f"{'interaction':16s} {'reruns':>7} " + " ".join(f"{f'p{p}':>9}" for p in PERCENTILES) + f" {'max':>9}")
+    for name, s in summary.items():
+        print(f"{name:16s} {s['count']:7d} " + " ".join(f"{s[f'p{p}_ms']:7.0f}ms" for p in PERCENTILES) + f" {s['max_ms']:7.0f}ms")
+
+    print()
+    for wave in waves:
+        memory = f"peak {wave['peak_rss_mb']:.0f} MB, {wave['settled_rss_mb']:.0f} MB after the sessions left" if wave['settled_rss_mb'] else "memory not available"
+        print(f"Wave {wave['wave']}: {wave['reruns']} reruns in {wave['duration_s']:.1f}s ({wave['reruns_per_s']:.1f}/s), {memory}")
+
+    if samples and samples[0]['rss_mb'] is not None:
+        print(f"\n{'time':>7} {'reruns':>7} {'rss':>9}")
+        for sample in samples[::max(1, len(samples) // 20)]:
+            print(f"{sample['elapsed_s']:6.0f}s {sample['reruns']:7d} {sample['rss_mb']:6.0f} MB")
+        settled = [wave['settled_rss_mb'] for wave in waves]
+        print(f"\nResident memory grew by {settled[-1] - samples[0]['rss_mb']:.0f} MB from the start", end="")
+        print(f", {settled[-1] - settled[0]:+.0f} MB from the first wave to the last" if len(waves) > 1 else "")
+
+    if errors:
+        print(f"\n{len(errors)} error(s), e.g.:")
+        for error in errors[:5]:
+            print(f"  {error}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test a single Streamlit server running the calculator with many simulated sessions.")
+    parser.add_argument("--sessions", type=int, default=SESSIONS, help=f"Concurrent sessions per wave (default: {SESSIONS})")
+    parser.add_argument("--actions", type=int, default=ACTIONS, help=f"Interactions per session after opening the page (default: {ACTIONS})")
+    parser.add_argument("--think-time", type=float, default=THINK_TIME, help=f"Mean seconds between a session's interactions, 0 to send them back to back (default: {THINK_TIME})")
+    parser.add_argument("--ramp-up", type=float, default=10.0, help="Seconds over which the sessions of a wave connect (default: 10)")
+    parser.add_argument("--waves", type=int, default=1, help="Times a new set of sessions connects, one after the other (default: 1)")
+    parser.add_argument("--settle", type=float, default=5.0, help="Seconds to wait after a wave before measuring the memory left (default: 5)")
+    parser.add_argument("--sample-interval", type=float, default=SAMPLE_INTERVAL, help=f"Seconds between memory samples (default: {SAMPLE_INTERVAL})")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--url", help="Load test an already running server (e.g. http://localhost:8501) instead of starting one")
+    parser.add_argument("--pid", type=int, help="Process id of the server given with --url, to track its memory")
+    parser.add_argument("--output", help="Write the results and memory samples to this JSON file")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        server = None
+        if args.url:
+            base_url, pid = args.url.rstrip("/"), args.pid
+        else:
+            port = free_port()
+            server = start_server(port, cache_dir)
+            base_url, pid = f"http://localhost:{port}", server.pid
+        try:
+            url = base_url.replace("http", "ws", 1) + "/_stcore/stream"
+            reruns, errors, samples, waves = asyncio.run(run_waves(url, pid, args))
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+
+    summary = summarize(reruns)
+    report(summary, waves, samples, errors)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({'meta': metadata(), 'args': vars(args), 'latency': summary, 'waves': waves,
+                       'memory': samples, 'errors': errors}, f, indent=2)
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
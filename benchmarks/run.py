@@ -0,0 +1,211 @@
+# Benchmarks for the calculation and rendering hot paths.
+#
+#     python benchmarks/run.py --output before.json
+#     python benchmarks/run.py --output after.json --compare before.json --threshold 0.2
+#
+# Each benchmark is timed with timeit and reported as the median (and min) time per call in
+# milliseconds. With --compare, any benchmark whose median got slower than the baseline by more
+# than --threshold (a fraction) is flagged and the script exits with status 1.
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+
+import core
+
+HORIZONS = (1, 7, 30)
+BATCH_SIZES = (1000, 10000, 100000)
+APP_RERUNS = 10
+
+def scenario(years, house_price=core.DEFAULT_HOUSE_PRICE):
+    # Everything the charts and comparison need for one scenario
+    loan_amount = house_price * (1 + core.DEFAULT_CLOSING_COSTS_RATE)
+    _, monthly_rent, breakdown, _, _ = core.calculate_rent_to_own(house_price, core.DEFAULT_CLOSING_COSTS_RATE, core.DEFAULT_PROPERTY_TAX_RATE, core.DEFAULT_APPRECIATION_RATE, core.INSURANCE_FIXED, core.DEFAULT_INTEREST_RATE)
+    principal_over_time, appreciation_over_time = core.calculate_equity_over_time(house_price, loan_amount, core.DEFAULT_INTEREST_RATE, core.LOAN_TERM_YEARS, core.DEFAULT_APPRECIATION_RATE, years)
+    total_equity = principal_over_time[-1] + appreciation_over_time[-1]
+    initial_rental_payment = house_price / (core.DEFAULT_PRICE_TO_RENT_RATIO * 12)
+    cumulative_values = core.calculate_cumulative_values(house_price, monthly_rent, years, core.DEFAULT_APPRECIATION_RATE, initial_rental_payment, core.DEFAULT_YEARLY_RENT_INCREASE)
+    comparison_args = (
+        house_price, core.DEFAULT_PROPERTY_TAX_RATE, core.DEFAULT_APPRECIATION_RATE, years, monthly_rent, total_equity,
+        core.DOWN_PAYMENT_RATIO, core.DEFAULT_PRICE_TO_RENT_RATIO, core.DEFAULT_INVESTMENT_RETURN_RATE,
+        core.DEFAULT_MARGINAL_TAX_RATE, core.DEFAULT_MORTGAGE_RATE, core.DEFAULT_PMI_RATE, core.INSURANCE_FIXED,
+        core.DEFAULT_YEARLY_RENT_INCREASE,
+    )
+    return {
+        'house_price': house_price,
+        'loan_amount': loan_amount,
+        'monthly_rent': monthly_rent,
+        'breakdown': breakdown,
+        'principal_over_time': principal_over_time,
+        'appreciation_over_time': appreciation_over_time,
+        'total_equity': total_equity,
+        'initial_rental_payment': initial_rental_payment,
+        'cumulative_values': cumulative_values,
+        'comparison_args': comparison_args,
+    }
+
+def function_benchmarks():
+    import batch
+    import charts
+
+    benchmarks = {}
+    rent_to_own_args = (core.DEFAULT_HOUSE_PRICE, core.DEFAULT_CLOSING_COSTS_RATE, core.DEFAULT_PROPERTY_TAX_RATE, core.DEFAULT_APPRECIATION_RATE, core.INSURANCE_FIXED, core.DEFAULT_INTEREST_RATE)
+    benchmarks['calculate_rent_to_own'] = lambda: core.calculate_rent_to_own(*rent_to_own_args)
+    benchmarks['create_rent_breakdown_chart'] = (lambda s: lambda: charts.create_rent_breakdown_chart(s['breakdown'], s['monthly_rent']))(scenario(1))
+
+    for years in HORIZONS:
+        s = scenario(years)
+        months = years * 12
+        benchmarks[f'calculate_monthly_breakdown[rent_to_own,month={months}]'] = (lambda s, m: lambda: core.calculate_monthly_breakdown(s['loan_amount'], core.DEFAULT_INTEREST_RATE, core.LOAN_TERM_YEARS, m, is_rent_to_own=True))(s, months)
+        benchmarks[f'calculate_monthly_breakdown[mortgage,month={months}]'] = (lambda s, m: lambda: core.calculate_monthly_breakdown(s['loan_amount'], core.DEFAULT_MORTGAGE_RATE, core.LOAN_TERM_YEARS, m))(s, months)
+        benchmarks[f'calculate_equity_over_time[years={years}]'] = (lambda s, y: lambda: core.calculate_equity_over_time(s['house_price'], s['loan_amount'], core.DEFAULT_INTEREST_RATE, core.LOAN_TERM_YEARS, core.DEFAULT_APPRECIATION_RATE, y))(s, years)
+        benchmarks[f'calculate_cumulative_values[years={years}]'] = (lambda s, y: lambda: core.calculate_cumulative_values(s['house_price'], s['monthly_rent'], y, core.DEFAULT_APPRECIATION_RATE, s['initial_rental_payment'], core.DEFAULT_YEARLY_RENT_INCREASE))(s, years)
+        benchmarks[f'calculate_comparison_values[years={years}]'] = (lambda s: lambda: core.calculate_comparison_values(*s['comparison_args']))(s)
+        benchmarks[f'create_equity_area_chart[years={years}]'] = (lambda s, y: lambda: charts.create_equity_area_chart(s['principal_over_time'], s['appreciation_over_time'], y))(s, years)
+        benchmarks[f'create_comparison_line_chart[years={years}]'] = (lambda s, y: lambda: charts.create_comparison_line_chart(*s['cumulative_values'], y))(s, years)
+        benchmarks[f'create_comparison_bar_chart[years={years}]'] = (lambda s: lambda: charts.create_comparison_bar_chart(*s['cumulative_values'], s['total_equity']))(s)
+
+    # Every horizon up to the longest the sliders offer, switched in the browser
+    s = scenario(core.MAX_YEARS)
+    total_equity_over_time = s['principal_over_time'] + s['appreciation_over_time']
+    rent_to_own_spent, _, traditional_rent_spent = s['cumulative_values']
+    benchmarks[f'create_equity_area_chart_by_year[years={core.MAX_YEARS}]'] = lambda: charts.create_equity_area_chart_by_year(s['principal_over_time'], s['appreciation_over_time'], core.DEFAULT_YEARS)
+    benchmarks[f'create_comparison_bar_chart_by_year[years={core.MAX_YEARS}]'] = lambda: charts.create_comparison_bar_chart_by_year(rent_to_own_spent, traditional_rent_spent, total_equity_over_time, core.DEFAULT_YEARS)
+
+    rng = np.random.default_rng(0)
+    for size in BATCH_SIZES:
+        house_prices = rng.uniform(100000, 1000000, size)
+        for years in (1, 7):
+            benchmarks[f'batch.score_arrays[rows={size},years={years}]'] = (lambda h, y: lambda: batch.score_arrays(h, years=y))(house_prices, years)
+
+    import breakeven
+    grid_args = ('appreciation_rate', breakeven.DEFAULT_GRID['appreciation_rate'], 'mortgage_rate', breakeven.DEFAULT_GRID['mortgage_rate'])
+    benchmarks['breakeven.breakeven_grid[100x100,years=30]'] = lambda: breakeven.breakeven_grid(*grid_args)
+
+    return benchmarks
+
+def time_function(func, repeat=5, min_time=0.2):
+    timer = timeit.Timer(func)
+    # Enough calls per measurement to take at least min_time
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_time / 0.2))
+    times = [t / number * 1000 for t in timer.repeat(repeat=repeat, number=number)]
+    return {'median_ms': float(np.median(times)), 'min_ms': float(min(times)), 'calls': number * repeat}
+
+def stub_rate_cache(cache_dir):
+    # A fresh mortgage rate cache file in `cache_dir`. Pointing the rate provider at it with
+    # RATE_CACHE_PATH stubs out the FRED call, as the rate never needs to refresh.
+    cache_path = os.path.join(cache_dir, "mortgage_rate.json")
+    with open(cache_path, "w") as f:
+        json.dump({'rate': core.DEFAULT_MORTGAGE_RATE, 'fetched_at': time.time()}, f)
+    return cache_path
+
+def time_app_reruns(reruns=APP_RERUNS):
+    # Full script reruns through Streamlit's AppTest, with the FRED call stubbed out
+    with tempfile.TemporaryDirectory() as cache_dir:
+        os.environ["RATE_CACHE_PATH"] = stub_rate_cache(cache_dir)
+
+        from streamlit.testing.v1 import AppTest
+
+        at = AppTest.from_file(os.path.join(ROOT, "calculator.py"), default_timeout=60)
+        start = time.perf_counter()
+        at.run()
+        first_run = (time.perf_counter() - start) * 1000
+        if at.exception:
+            raise RuntimeError(f"App raised during the benchmark: {at.exception}")
+
+        results = {'app.first_run': {'median_ms': first_run, 'min_ms': first_run, 'calls': 1}}
+        def widget(widgets, label):
+            return next(w for w in widgets if w.label.startswith(label))
+
+        interactions = {
+            'app.rerun[years]': lambda i: at.slider(key="top_slider").set_value(i % 7 + 1),
+            'app.rerun[house_price]': lambda i: widget(at.number_input, "Enter the price").set_value(300000.0 + 5000 * i),
+            'app.rerun[closing_costs_toggle]': lambda i: widget(at.toggle, "Automatically add").set_value(i % 2 == 0),
+        }
+        for name, interact in interactions.items():
+            times = []
+            for i in range(reruns):
+                interact(i)
+                start = time.perf_counter()
+                at.run()
+                times.append((time.perf_counter() - start) * 1000)
+            results[name] = {'median_ms': float(np.median(times)), 'min_ms': float(min(times)), 'calls': reruns}
+        return results
+
+def metadata():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+    }
+
+def compare(results, baseline, threshold):
+    # Returns the names of benchmarks that regressed by more than `threshold`
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before, after = baseline[name]['median_ms'], result['median_ms']
+        change = (after - before) / before if before else 0.0
+        flag = "REGRESSION" if change > threshold else ""
+        print(f"{name:60s} {before:10.3f} -> {after:10.3f} ms  {change:+7.1%}  {flag}")
+        if change > threshold:
+            regressions.append(name)
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the calculator's calculation and rendering hot paths.")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Baseline JSON file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Slowdown (as a fraction) that counts as a regression (default: 0.2)")
+    parser.add_argument("--only", help="Only run benchmarks whose name matches this glob pattern")
+    parser.add_argument("--skip-app", action="store_true", help="Skip the full-rerun benchmarks through AppTest")
+    parser.add_argument("--repeat", type=int, default=5, help="Measurements per benchmark (default: 5)")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name, func in function_benchmarks().items():
+        if args.only and not fnmatch.fnmatch(name, args.only):
+            continue
+        results[name] = time_function(func, repeat=args.repeat)
+        print(f"{name:60s} {results[name]['median_ms']:10.3f} ms")
+
+    if not args.skip_app and (not args.only or fnmatch.fnmatch("app.rerun", args.only)):
+        for name, result in time_app_reruns().items():
+            results[name] = result
+            print(f"{name:60s} {result['median_ms']:10.3f} ms")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({'meta': metadata(), 'results': results}, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        print()
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+import numpy as np
+
+from core import DEFAULT_INTEREST_RATE, DEFAULT_HOUSE_PRICE, LOAN_TERM_YEARS, _scalar, calculate_rent_to_own, calculate_cost_schedule
+from batch import DEFAULTS
+
+BREAKEVEN_YEARS = LOAN_TERM_YEARS
+GRID_CHUNK_SIZE = 2000  # Scenarios evaluated together; with 30 years that's 720k values per schedule array
+
+# The grid shown in the app: every appreciation rate the sidebar allows against typical mortgage rates
+DEFAULT_GRID = {
+    'appreciation_rate': np.linspace(0.0, 0.10, 100),
+    'mortgage_rate': np.linspace(0.02, 0.12, 100),
+}
+
+def cost_schedule(house_price, years=BREAKEVEN_YEARS, **inputs):
+    # Monthly running true costs for a scenario given with the same inputs as batch.score_arrays
+    params = {**DEFAULTS, **inputs}
+    house_price = np.asarray(house_price, dtype=float)
+    _, monthly_rent, _, _, _ = calculate_rent_to_own(
+        house_price,
+        params['closing_costs_rate'],
+        params['property_tax_rate'],
+        params['appreciation_rate'],
+        params['insurance_cost'],
+        DEFAULT_INTEREST_RATE,
+        np.asarray(params['include_closing_costs'], dtype=bool)
+    )
+    loan_amount = house_price * (1 + np.asarray(params['closing_costs_rate']))
+    return calculate_cost_schedule(
+        house_price,
+        loan_amount,
+        params['property_tax_rate'],
+        params['appreciation_rate'],
+        years,
+        monthly_rent,
+        params['down_payment_ratio'],
+        params['price_to_rent_ratio'],
+        params['investment_return_rate'],
+        params['marginal_tax_rate'],
+        params['mortgage_rate'],
+        params['pmi_rate'],
+        params['insurance_cost'],
+        params['yearly_rent_increase'],
+        params['include_opportunity_cost'],
+        params['include_tax_deductions']
+    )
+
+def breakeven_month(costs, other_cost):
+    # The month (1-based) at which the cheaper of rent-to-own and `other_cost` first changes, i.e.
+    # one overtakes the other in true cost. NaN if the same option stays cheaper the whole time.
+    cheaper = costs['rent_to_own_cost'] <= costs[other_cost]
+    changed = cheaper != cheaper[..., :1]
+    return np.where(changed.any(axis=-1), np.argmax(changed, axis=-1) + 1.0, np.nan)
+
+def _summarize(costs):
+    summary = {}
+    for other in ('renting', 'traditional'):
+        # Signed as in batch.score_arrays
+        delta = costs['rent_to_own_cost'] - costs[f'{other}_cost']
+        month = breakeven_month(costs, f'{other}_cost')
+        # The delta at the break-even month says which option it favors; NaN when there's none
+        at_month = np.take_along_axis(delta, np.nan_to_num(month, nan=1).astype(int)[..., np.newaxis] - 1, axis=-1)[..., 0]
+        summary[f'{other}_breakeven'] = month
+        summary[f'{other}_breakeven_delta'] = np.where(np.isnan(month), np.nan, at_month)
+        summary[f'{other}_delta'] = delta[..., -1]
+    return summary
+
+def breakeven(house_price, years=BREAKEVEN_YEARS, **inputs):
+    # Break-even months against renting and the traditional mortgage within `years`, how much
+    # more rent-to-own costs than each in that month and how much more at the end of it
+    return {key: _scalar(value) for key, value in _summarize(cost_schedule(house_price, years, **inputs)).items()}
+
+def breakeven_grid(x_name, x_values, y_name, y_values, house_price=DEFAULT_HOUSE_PRICE, years=BREAKEVEN_YEARS, chunk_size=GRID_CHUNK_SIZE, **inputs):
+    # breakeven() over every combination of two inputs (e.g. appreciation_rate and mortgage_rate).
+    # The grid is evaluated a chunk of scenarios at a time, each chunk as one batch of arrays.
+    # Returns the input names and values of both axes and the number of years, plus the
+    # breakeven() values as (len(y_values), len(x_values)) arrays.
+    if not np.size(x_values) or not np.size(y_values):
+        raise ValueError(f"Both axes need at least one value, got {np.size(x_values)} {x_name} and {np.size(y_values)} {y_name} values")
+    x_grid, y_grid = np.meshgrid(np.asarray(x_values, dtype=float), np.asarray(y_values, dtype=float))
+    axes = {x_name: x_grid.ravel(), y_name: y_grid.ravel()}
+    inputs = {'house_price': house_price, **inputs}
+
+    chunks = []
+    for start in range(0, x_grid.size, chunk_size):
+        chunk_inputs = {**inputs, **{name: values[start:start + chunk_size] for name, values in axes.items()}}
+        chunks.append(_summarize(cost_schedule(years=years, **chunk_inputs)))
+
+    grid = {key: np.concatenate([chunk[key] for chunk in chunks]).reshape(x_grid.shape) for key in chunks[0]}
+    return {'x_name': x_name, 'x': np.asarray(x_values), 'y_name': y_name, 'y': np.asarray(y_values), 'years': years, **grid}
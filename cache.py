@@ -0,0 +1,193 @@
+import functools
+import inspect
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from cache_backend import SQLiteBackend, decode, encode, make_key, source_version
+
+# Decimal places kept in cache keys. Inputs are rounded to what the UI can show,
+# so values that only differ in float noise share one entry.
+MONEY = 2  # cents
+RATE = 5   # rates are fractions; 0.001% is the finest step any input uses
+RATIO = 8  # e.g. down_payment / house_price
+
+DEFAULT_MAXSIZE = 1024
+
+# Set SHARED_CACHE_PATH to an SQLite file to share results between server processes (and replicas
+# that mount the same volume) through cache_backend.SQLiteBackend
+SHARED_CACHE_PATH = os.environ.get("SHARED_CACHE_PATH")
+
+_registry = {}
+_missing = object()
+_shared = None
+_shared_lock = threading.Lock()
+
+def _sizeof(value):
+    # Rough size of a cached result in bytes
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(_sizeof(k) + _sizeof(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(_sizeof(v) for v in value)
+    return sys.getsizeof(value)
+
+def _normalize(value, decimals):
+    if decimals is None or value is None or isinstance(value, bool):
+        return value
+    return round(float(value), decimals)
+
+class LRUCache:
+    # Thread-safe LRU cache with a size bound and hit/miss/eviction/byte counters.
+
+    def __init__(self, name, maxsize=DEFAULT_MAXSIZE):
+        self.name = name
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+            return default
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def set(self, key, value):
+        size = _sizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self.bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self.bytes += size
+            while len(self._entries) > self.maxsize:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self._entries),
+            'bytes': self.bytes,
+            'maxsize': self.maxsize,
+        }
+
+def shared_backend():
+    # The store shared between processes: the one installed with set_shared_backend(), or else an
+    # SQLite file at SHARED_CACHE_PATH. None when there's neither.
+    global _shared
+    if _shared is None and SHARED_CACHE_PATH:
+        with _shared_lock:
+            if _shared is None:
+                _shared = SQLiteBackend(SHARED_CACHE_PATH)
+    return _shared
+
+def set_shared_backend(backend):
+    # Any cache_backend.CacheBackend, or None to stop sharing
+    global _shared
+    _shared = backend
+
+def load_shared(backend, key):
+    # The value stored under `key`, or _missing
+    payload = backend.get(key)
+    if payload is None:
+        return _missing
+    try:
+        return decode(payload)
+    except Exception:
+        # Unreadable, e.g. written by a different version of a library
+        return _missing
+
+def new_cache(name, maxsize=DEFAULT_MAXSIZE):
+    # A named LRUCache whose counters show up in cache_stats() and metrics_text()
+    cache = LRUCache(name, maxsize)
+    _registry[name] = cache
+    return cache
+
+def cached(maxsize=DEFAULT_MAXSIZE, precision=None, name=None, shared=False):
+    # Memoize a pure function in a bounded LRU cache.
+    #
+    # `precision` maps argument names to the number of decimals they are rounded to before
+    # lookup. The function is called with the rounded values too, so a result only depends on
+    # its key. Calls with unhashable arguments (e.g. arrays in batch mode) skip the cache.
+    # Results are shared between callers and must not be mutated.
+    #
+    # With `shared`, misses are looked up in shared_backend() before calling the function, and
+    # new results are stored there for the other processes. That only pays off for functions
+    # that take much longer than a lookup (tens of microseconds for SQLite).
+    precision = precision or {}
+
+    def decorate(func):
+        signature = inspect.signature(func)
+        cache = new_cache(name or func.__name__, maxsize)
+        namespace = f"{cache.name}:{source_version(inspect.getsourcefile(func))}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            try:
+                arguments = {arg: _normalize(value, precision.get(arg)) for arg, value in bound.arguments.items()}
+                key = tuple(arguments.values())
+                hash(key)
+            except TypeError:
+                return func(*args, **kwargs)
+
+            result = cache.get(key, _missing)
+            if result is _missing:
+                backend = shared_backend() if shared else None
+                if backend is not None:
+                    shared_key = make_key(namespace, key)
+                    result = load_shared(backend, shared_key)
+                if result is _missing:
+                    result = func(**arguments)
+                    if backend is not None:
+                        backend.set(shared_key, encode(result))
+                cache.set(key, result)
+            return result
+
+        wrapper.cache = cache
+        return wrapper
+    return decorate
+
+def cache_stats():
+    # Counters for every cache created with @cached, keyed by cache name, and for the shared store
+    stats = {name: cache.stats() for name, cache in _registry.items()}
+    if _shared is not None:
+        stats['shared'] = _shared.stats()
+    return stats
+
+def metrics_text(prefix="rent_to_own_cache"):
+    # The counters in Prometheus' text exposition format
+    lines = []
+    for stat, kind in (('hits', 'counter'), ('misses', 'counter'), ('evictions', 'counter'), ('entries', 'gauge'), ('bytes', 'gauge')):
+        metric = f"{prefix}_{stat}_total" if kind == 'counter' else f"{prefix}_{stat}"
+        lines.append(f"# TYPE {metric} {kind}")
+        for name, stats in cache_stats().items():
+            lines.append(f'{metric}{{cache="{name}"}} {stats[stat]}')
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,189 @@
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+
+# Stores shared by every server process and replica, behind the in-process LRU caches in cache.py.
+# Values are kept as compact binary payloads under keys built from what computed them and its
+# normalized inputs. They expire after a TTL, and the store is kept under a size limit by dropping
+# the entries that were used least recently.
+#
+# A store only has to implement CacheBackend, which works on string keys and bytes, so a network
+# store (e.g. Redis or memcached) can take the place of the SQLite file later. Payloads are
+# pickles: only point the app at a store that nothing but its own servers can write to.
+DEFAULT_TTL = 24 * 3600  # seconds
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+MAX_PAYLOAD_BYTES = 1024 * 1024  # Bigger values are only cached in-process
+COMPRESS_OVER = 1024  # Payloads bigger than this many bytes are compressed
+PRUNE_EVERY = 100  # Writes between two checks of the size limit
+PRUNE_TO = 0.9  # Share of the size limit left after pruning, so it isn't pruned on every write
+TOUCH_AFTER = 60  # Seconds before a read marks an entry as recently used again
+BUSY_TIMEOUT = 1.0  # Seconds to wait on another process holding the write lock
+
+_versions = {}
+
+def encode(value):
+    payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    if len(payload) > COMPRESS_OVER:
+        return b"z" + zlib.compress(payload)
+    return b"p" + payload
+
+def decode(payload):
+    body = payload[1:]
+    return pickle.loads(zlib.decompress(body) if payload[:1] == b"z" else body)
+
+def source_version(*paths):
+    # A short hash of the source files that compute a value. It goes into shared keys so that
+    # replicas running different code (e.g. during a deploy) never read each other's results.
+    if paths not in _versions:
+        digest = hashlib.blake2b(digest_size=4)
+        for path in paths:
+            with open(path, "rb") as f:
+                digest.update(f.read())
+        _versions[paths] = digest.hexdigest()
+    return _versions[paths]
+
+def make_key(namespace, key):
+    # `key` is a tuple of normalized inputs, whose repr is the same in every process
+    return f"{namespace}:{hashlib.blake2b(repr(key).encode(), digest_size=16).hexdigest()}"
+
+class CacheBackend:
+    # What cache.py needs from a shared store. A missing or expired key reads as None. Stores are
+    # used from many threads at once, and a store that fails (unreachable, locked, full) must
+    # behave as if it were empty rather than raise, so the page never breaks because of it.
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, payload, ttl=None):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def stats(self):
+        # The same counters as cache.LRUCache.stats(), so they show up in metrics_text()
+        raise NotImplementedError
+
+class SQLiteBackend(CacheBackend):
+    # A store in one SQLite file, shared by every process that can see it (e.g. the workers of one
+    # machine, or replicas mounting the same volume). Each thread has its own connection, and the
+    # file is in WAL mode so reads never wait on a write.
+
+    def __init__(self, path, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.errors = 0
+        self._writes = 0
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            # A cache can lose its last writes in a power cut; it doesn't need an fsync per write
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, payload BLOB, size INTEGER, expires_at REAL, accessed_at REAL)"
+            )
+            self._local.connection = connection
+        return connection
+
+    def _count(self, counter, n=1):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + n)
+
+    def get(self, key):
+        now = time.time()
+        try:
+            connection = self._connection()
+            row = connection.execute("SELECT payload, expires_at, accessed_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None or row[1] <= now:
+                self._count('misses')
+                return None
+            if now - row[2] > TOUCH_AFTER:
+                connection.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+        except (sqlite3.Error, OSError):
+            self._count('errors')
+            return None
+        self._count('hits')
+        return row[0]
+
+    def set(self, key, payload, ttl=None):
+        if len(payload) > MAX_PAYLOAD_BYTES:
+            return
+        now = time.time()
+        try:
+            self._connection().execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                (key, payload, len(payload), now + (self.ttl if ttl is None else ttl), now)
+            )
+        except (sqlite3.Error, OSError):
+            self._count('errors')
+            return
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % PRUNE_EVERY == 0
+        if prune:
+            self.prune()
+
+    def prune(self):
+        # Drop expired entries, then the least recently used ones while over the size limit
+        try:
+            connection = self._connection()
+            evicted = connection.execute("DELETE FROM entries WHERE expires_at <= ?", (time.time(),)).rowcount
+            total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total > self.max_bytes:
+                excess, keys = total - self.max_bytes * PRUNE_TO, []
+                for key, size in connection.execute("SELECT key, size FROM entries ORDER BY accessed_at"):
+                    if excess <= 0:
+                        break
+                    keys.append((key,))
+                    excess -= size
+                connection.executemany("DELETE FROM entries WHERE key = ?", keys)
+                evicted += len(keys)
+        except (sqlite3.Error, OSError):
+            self._count('errors')
+            return
+        self._count('evictions', evicted)
+
+    def delete(self, key):
+        try:
+            self._connection().execute("DELETE FROM entries WHERE key = ?", (key,))
+        except (sqlite3.Error, OSError):
+            self._count('errors')
+
+    def clear(self):
+        try:
+            self._connection().execute("DELETE FROM entries")
+        except (sqlite3.Error, OSError):
+            self._count('errors')
+
+    def stats(self):
+        try:
+            entries, size = self._connection().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        except (sqlite3.Error, OSError):
+            entries, size = 0, 0
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'errors': self.errors,
+            'entries': entries,
+            'bytes': size,
+            'max_bytes': self.max_bytes,
+        }
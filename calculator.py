@@ -1,97 +1,74 @@
-import streamlit as st
-import plotly.graph_objects as go
-import pandas as pd
-from streamlit_extras.add_vertical_space import add_vertical_space
-from streamlit_extras.row import row
-import numpy_financial as npf
-import requests
-import streamlit_analytics2 as streamlit_analytics
-
-# Define constants at the top of the file
-DEFAULT_INTEREST_RATE = 0.0225
-DOWN_PAYMENT_RATIO = 0.0
-INSURANCE_FIXED = 150
-MANAGEMENT_FEE_RATE = 0.08
-LOAN_TERM_YEARS = 30
-DEFAULT_YEARS = 4
-
-@st.cache_data(ttl=3600)  # Cache for 1 hour
-def get_current_mortgage_rate():
-    url = "https://api.stlouisfed.org/fred/series/observations?series_id=MORTGAGE30US&api_key=2ff2780e16de4ae8c876b130dc9981fe&file_type=json&limit=1&sort_order=desc"
-    response = requests.get(url)
-    data = response.json()
-    return float(data['observations'][0]['value']) / 100
-
-@st.cache_data(ttl=604800)  # Cache for 1 week
-def calculate_rent_to_own(house_price, closing_costs_rate, property_tax_rate, appreciation_rate, insurance_cost, interest_rate, include_closing_costs=True):
-    # First, calculate total purchase price (i.e., loan amount).
-    # If 'include_closing_costs' is True, add those to the purchase price.
-    effective_closing_costs_rate = closing_costs_rate if include_closing_costs else 0.0
-    closing_costs = house_price * effective_closing_costs_rate
-    total_purchase_price = house_price + closing_costs
-
-    # 1) Take 2.25% of the total purchase price for the interest (annual). Convert to monthly.
-    monthly_interest = (total_purchase_price * DEFAULT_INTEREST_RATE) / 12
-
-    # 2) Add insurance cost (monthly).
-    monthly_insurance = insurance_cost
-
-    # 3) Add property tax (monthly).
-    monthly_property_tax = (house_price * property_tax_rate) / 12
-
-    # 4) We want principal to be 44% of the total monthly payment.
-    #    Let x = monthly_payment. Then principal is 0.44 * x, and the rest is interest + insurance + property tax.
-    #    So x = (monthly_interest + monthly_insurance + monthly_property_tax) + 0.44 * x
-    #    => x - 0.44x = monthly_interest + monthly_insurance + monthly_property_tax
-    #    => 0.56x = monthly_interest + monthly_insurance + monthly_property_tax
-    #    => x = (monthly_interest + monthly_insurance + monthly_property_tax) / 0.56
-    monthly_payment = (
-        monthly_interest + monthly_insurance + monthly_property_tax
-    ) / 0.56
-    monthly_principal = 0.44 * monthly_payment
-
-    # Prepare a breakdown for clarity.
-    breakdown = {
-        "Principal": monthly_principal,
-        "Interest": monthly_interest,
-        "Insurance": monthly_insurance,
-        "Property Tax": monthly_property_tax,
-    }
+import importlib
+import math
+import uuid
+from contextlib import contextmanager
 
-    # We'll still return interest_rate, LOAN_TERM_YEARS for compatibility in the code that calls this function,
-    # but note that we are overriding the interest calculation with a fixed 2.25% here.
-    return house_price, monthly_payment, breakdown, interest_rate, LOAN_TERM_YEARS
-
-def calculate_monthly_breakdown(loan_amount, interest_rate, loan_term_years, month, is_rent_to_own=False):
-    if is_rent_to_own:
-        # Use the same logic as the rent-to-own calculation, but per month:
-        # 1) Calculate monthly interest using DEFAULT_INTEREST_RATE.
-        monthly_interest = (loan_amount * DEFAULT_INTEREST_RATE) / 12
-        
-        # 2) Ensure principal is 44% of the total monthly payment:
-        #    Let monthly_payment = x.
-        #    monthly_interest occupies 56% of x (since principal is 44%).
-        #    x = monthly_interest / 0.56
-        monthly_payment = monthly_interest / 0.56
-        monthly_principal = 0.44 * monthly_payment
-
-        return monthly_principal, monthly_interest
-
-    else:
-        # Traditional mortgage calculation (unchanged)
-        monthly_rate = interest_rate / 12
-        num_payments = loan_term_years * 12
-        monthly_payment = -npf.pmt(monthly_rate, num_payments, loan_amount)
-
-        # Calculate remaining balance after (month - 1) payments
-        remaining_balance = npf.fv(monthly_rate, month - 1, monthly_payment, -loan_amount)
+import streamlit as st
 
-        # Interest is balance × monthly_rate
-        interest = remaining_balance * monthly_rate
-        # Anything left after interest becomes principal
-        principal = monthly_payment - interest
+import core
+from core import (
+    DEFAULT_INTEREST_RATE, INSURANCE_FIXED, LOAN_TERM_YEARS, DEFAULT_YEARS, MAX_YEARS,
+    DEFAULT_HOUSE_PRICE, DEFAULT_APPRECIATION_RATE, DEFAULT_CLOSING_COSTS_RATE, DEFAULT_PROPERTY_TAX_RATE,
+    DEFAULT_YEARLY_RENT_INCREASE, DEFAULT_INVESTMENT_RETURN_RATE, DEFAULT_PRICE_TO_RENT_RATIO,
+    DEFAULT_MARGINAL_TAX_RATE, DEFAULT_PMI_RATE,
+    calculate_equity_over_time, calculate_cumulative_values, adjust_comparison_values,
+)
+from rates import RateProvider
+from cache import MONEY, RATE, RATIO, cached, shared_backend
+from simulation import (
+    DEFAULT_PATHS, DEFAULT_APPRECIATION_VOLATILITY, DEFAULT_RENT_INCREASE_VOLATILITY,
+    simulate_paths, simulate_equity, percentile_bands, simulate_costs, win_probabilities,
+)
+from pipeline import Pipeline
+from solver import solve_house_price
+from breakeven import DEFAULT_GRID, BREAKEVEN_YEARS, breakeven, breakeven_grid
+from sensitivity import COSTS, DEFAULT_SHIFT, sensitivity
+from optimizer import OPTIONS, optimize
+from export import ledger_csv
+from warmup import WarmStart, warm_pipeline
+from tracing import TRACE_PANEL, start_trace
+from analytics import changed_inputs, get_tracker
+from charts import (
+    create_rent_breakdown_chart, create_equity_area_chart, create_comparison_line_chart, create_comparison_bar_chart,
+    create_equity_area_chart_by_year, create_comparison_bar_chart_by_year, create_breakeven_heatmap,
+    create_tornado_chart, create_cost_surface_chart,
+)
+
+@st.cache_resource
+def get_rate_provider():
+    # One provider per server process, shared by every session (and with the other processes
+    # through the shared cache, if one is configured)
+    return RateProvider(store=shared_backend())
+
+@st.cache_resource
+def import_libraries():
+    # Each session runs the script on a thread of its own, and the first sessions of a fresh
+    # server importing the same library at once can see it half-initialized. The libraries the
+    # page imports on first use are imported here instead, once, before any session uses them.
+    for name in ("pandas", "plotly.graph_objects", "streamlit_extras.add_vertical_space", "streamlit_extras.row"):
+        importlib.import_module(name)
 
-        return principal, interest
+def get_current_mortgage_rate():
+    # Returns immediately with the last known rate; fresh values arrive via a background refresh
+    return get_rate_provider().get()
+
+# The financial math lives in core.py so it can be imported without running the app.
+# Results are kept in bounded LRU caches keyed on inputs rounded to what the UI shows. The
+# comparison values are also shared between server processes when SHARED_CACHE_PATH is set; the
+# other two take about as long to compute as to look up.
+calculate_rent_to_own = cached(maxsize=512, precision={
+    'house_price': MONEY, 'closing_costs_rate': RATE, 'property_tax_rate': RATE,
+    'appreciation_rate': RATE, 'insurance_cost': MONEY, 'interest_rate': RATE,
+})(core.calculate_rent_to_own)
+calculate_equity_breakdown = cached(maxsize=512, precision={
+    'house_price': MONEY, 'loan_amount': MONEY, 'interest_rate': RATE, 'appreciation_rate': RATE,
+})(core.calculate_equity_breakdown)
+calculate_comparison_values = cached(maxsize=1024, shared=True, precision={
+    'house_price': MONEY, 'property_tax_rate': RATE, 'appreciation_rate': RATE, 'monthly_rent': MONEY,
+    'total_equity': MONEY, 'down_payment_ratio': RATIO, 'investment_return_rate': RATE,
+    'marginal_tax_rate': RATE, 'mortgage_rate': RATE, 'pmi_rate': RATE, 'insurance_cost': MONEY,
+    'yearly_rent_increase': RATE,
+})(core.calculate_comparison_values)
 
 def update_calculator(house_price, closing_costs_rate, property_tax_rate, appreciation_rate, years, insurance_cost, interest_rate, include_closing_costs=True):
     house_price, monthly_rent, breakdown, interest_rate, loan_term_years = calculate_rent_to_own(
@@ -107,396 +84,63 @@ def update_calculator(house_price, closing_costs_rate, property_tax_rate, apprec
     # Calculate loan amount (needed for other calculations)
     loan_amount = house_price * (1 + closing_costs_rate)
     
-    # Create pie chart
-    labels = list(breakdown.keys())
-    values = list(breakdown.values())
-    
-    # Define custom colors
-    custom_colors = ['#0068C9', '#83C5BE', '#EDF6F9', '#FFDDD2']
-
-    hover_text = [
-        "Monthly amount going towards paying off the loan principal.<br>If you decide to buy the house, this amount will be credited towards your purchase.",
-        "Monthly financing cost, calculated based on a 3.5% annual rate.<br>This represents the cost of the rent-to-own arrangement.",
-        "Monthly homeowner's insurance cost",
-        "Monthly property tax based on the home's value"
-    ]
-
-    fig = go.Figure(data=[go.Pie(
-        labels=labels, 
-        values=values, 
-        hole=.5, 
-        textinfo='label+value',
-        texttemplate='%{label}<br>$%{value:,.2f}',
-        hovertext=hover_text,
-        hoverinfo='text',
-        hoverlabel_align='left',
-        textfont=dict(size=14),
-        marker=dict(colors=custom_colors)
-    )])
-    
-    # Add total monthly rent to the center of the pie chart
-    fig.add_annotation(
-        text=f"<b>${monthly_rent:,.2f}</b>/mo",  # Updated format
-        x=0.5,
-        y=0.5,
-        font_size=24,
-        showarrow=False,
-        font=dict(color="black")
-    )
-    fig.update_layout(
-        showlegend=False,
-        autosize=True,
-        margin=dict(l=0, r=0, t=0, b=0),
-        title_text=''
-    )
-            
-    return fig, house_price, loan_amount, monthly_rent
-
-def calculate_estimated_equity(house_price, appreciation_rate, years):
-    future_value = house_price * (1 + appreciation_rate) ** years
-    return future_value - house_price
-
-@st.cache_data(ttl=604800)  # Cache for 1 week
-def calculate_equity_breakdown(house_price, loan_amount, interest_rate, loan_term_years, appreciation_rate, years):
-    # Calculate total principal paid
-    total_principal = 0
-    for month in range(1, years * 12 + 1):
-        principal, _ = calculate_monthly_breakdown(loan_amount, interest_rate, loan_term_years, month, is_rent_to_own=True)
-        total_principal += principal
-    
-    # Calculate appreciation
-    total_appreciation = calculate_estimated_equity(house_price, appreciation_rate, years)
-    renter_share_appreciation = total_appreciation * 0.5
-    
-    return total_principal, renter_share_appreciation
-
-def calculate_equity_over_time(house_price, loan_amount, interest_rate, loan_term_years, appreciation_rate, years):
-    principal_over_time = []
-    appreciation_over_time = []
-    total_principal = 0
-    for month in range(1, years * 12 + 1):
-        principal, _ = calculate_monthly_breakdown(loan_amount, interest_rate, loan_term_years, month, is_rent_to_own=True)
-        total_principal += principal
-        principal_over_time.append(total_principal)
-        
-        current_year = month / 12
-        appreciation = calculate_estimated_equity(house_price, appreciation_rate, current_year)
-        appreciation_over_time.append(appreciation * 0.5)  # 50% of appreciation
-    
-    return principal_over_time, appreciation_over_time
+    fig = create_rent_breakdown_chart(breakdown, monthly_rent)
 
-def create_equity_area_chart(principal_over_time, appreciation_over_time, years):
-    x = list(range(1, years * 12 + 1))
-    total_equity = [p + a for p, a in zip(principal_over_time, appreciation_over_time)]
-    
-    fig = go.Figure()
-    fig.add_trace(go.Scatter(
-        x=x, y=principal_over_time,
-        mode='lines',
-        # line=dict(width=0.5, color='#0068C9'),
-        stackgroup='one',
-        name='Principal',
-        hovertemplate='$%{y:,.2f}'
-    ))
-    fig.add_trace(go.Scatter(
-        x=x, y=appreciation_over_time,
-        mode='lines',
-        # line=dict(width=0.5, color='#003B72'),
-        stackgroup='one',
-        name='Appreciation',
-        hovertemplate='$%{y:,.2f}'
-    ))
-    # Add new trace for total equity
-    fig.add_trace(go.Scatter(
-        x=x, y=total_equity,
-        mode='lines',
-        line=dict(width=2, color='#E29578'),
-        name='Total Equity',
-        hovertemplate='$%{y:,.2f}'
-    ))
-    
-    # Add vertical lines for each year
-    for year in range(1, years + 1):
-        fig.add_vline(x=year * 12, line_dash="dash", line_color="gray", opacity=0.7)
-        fig.add_annotation(
-            x=year * 12,
-            y=1,
-            yref="paper",
-            text=f"{year} Year{'s' if year > 1 else ''}",
-            showarrow=False,
-            textangle=-90,
-            yshift=28,
-            font=dict(size=10)
-        )
-    
-    fig.update_layout(
-        title='Equity Build-up Over Time',
-        xaxis_title='Months',
-        yaxis_title='Equity ($)',
-        legend=dict(x=0.01, y=0.99, bgcolor='rgba(255, 255, 255, 0.8)'),
-        hovermode='x unified'
-    )
-    
-    return fig
-
-def calculate_cumulative_values(house_price, monthly_rent, years, appreciation_rate, initial_rental_payment, yearly_rent_increase):
-    months = years * 12
-    rent_to_own_spent = []
-    rent_to_own_saved = []
-    traditional_rent_spent = []
-    
-    for month in range(1, months + 1):
-        # Rent to Own
-        rent_to_own_spent.append(monthly_rent * month)
-        
-        # Calculate saved (equity) for rent to own
-        principal, _ = calculate_monthly_breakdown(house_price, DEFAULT_INTEREST_RATE, LOAN_TERM_YEARS, month, is_rent_to_own=True)
-        appreciation = calculate_estimated_equity(house_price, appreciation_rate, month/12) * 0.5
-        rent_to_own_saved.append(principal + appreciation)
-        
-        # Traditional Rent
-        current_year = (month - 1) // 12
-        current_rent = initial_rental_payment * (1 + yearly_rent_increase) ** current_year
-        if month == 1:
-            traditional_rent_spent.append(current_rent)
-        else:
-            traditional_rent_spent.append(traditional_rent_spent[-1] + current_rent)
-    
-    return rent_to_own_spent, rent_to_own_saved, traditional_rent_spent
-
-def create_comparison_line_chart(rent_to_own_spent, rent_to_own_saved, traditional_rent_spent, years):
-    months = list(range(1, years * 12 + 1))
-    
-    fig = go.Figure()
-    
-    fig.add_trace(go.Scatter(x=months, y=rent_to_own_spent, mode='lines', name='Rent to Own - Spent', line=dict(color='#0068C9')))
-    fig.add_trace(go.Scatter(x=months, y=rent_to_own_saved, mode='lines', name='Rent to Own - Saved', line=dict(color='#83C5BE')))
-    fig.add_trace(go.Scatter(x=months, y=traditional_rent_spent, mode='lines', name='Traditional Rent - Spent', line=dict(color='#E29578')))
-    fig.add_trace(go.Scatter(x=months, y=[0]*len(months), mode='lines', name='Traditional Rent - Saved', line=dict(color='#FFDDD2')))
-    
-    # Add vertical lines for each year
-    for year in range(1, years + 1):
-        fig.add_vline(x=year * 12, line_dash="dash", line_color="gray", opacity=0.7)
-        fig.add_annotation(
-            x=year * 12,
-            y=1,
-            yref="paper",
-            text=f"{year} Year{'s' if year > 1 else ''}",
-            showarrow=False,
-            textangle=-90,
-            yshift=28,
-            font=dict(size=10)
-        )
-    
-    fig.update_layout(
-        title='Cumulative Spent and Saved Over Time',
-        xaxis_title='Months',
-        yaxis_title='Amount ($)',
-        legend=dict(x=0.01, y=0.99, bgcolor='rgba(255, 255, 255, 0.8)'),
-        hovermode='x unified'
-    )
-    
-    return fig
-
-
-@st.cache_data(ttl=604800)  # Cache for 1 week
-def calculate_comparison_values(house_price, property_tax_rate, appreciation_rate, years, monthly_rent, total_equity, down_payment_ratio, price_to_rent_ratio, investment_return_rate, marginal_tax_rate, mortgage_rate, pmi_rate, insurance_cost, yearly_rent_increase):
-    traditional_loan = house_price * (1 - down_payment_ratio)
-    mortgage_payment = npf.pmt(mortgage_rate/12, LOAN_TERM_YEARS*12, -traditional_loan)
-    monthly_insurance = insurance_cost
-    monthly_property_tax = (house_price * property_tax_rate) / 12
-    monthly_pmi = (traditional_loan * pmi_rate) / 12 if down_payment_ratio < 0.2 else 0
-    traditional_payment = mortgage_payment + monthly_insurance + monthly_property_tax + monthly_pmi
-    traditional_principal = sum(calculate_monthly_breakdown(traditional_loan, mortgage_rate, LOAN_TERM_YEARS, month, is_rent_to_own=True)[0] for month in range(1, years*12+1))
-    traditional_appreciation = calculate_estimated_equity(house_price, appreciation_rate, years)
-    traditional_equity = traditional_principal + traditional_appreciation + house_price * down_payment_ratio
-
-    initial_rental_payment = house_price / (price_to_rent_ratio * 12)
-    rental_equity = 0
-
-    # Calculate total rent paid with yearly increases
-    total_rent = 0
-    for year in range(years):
-        yearly_rent = initial_rental_payment * 12 * (1 + yearly_rent_increase) ** year
-        total_rent += yearly_rent
-
-    down_payment = house_price * down_payment_ratio
-
-    rent_to_own_spent = monthly_rent * years * 12
-    traditional_spent = traditional_payment * years * 12 + down_payment
-    renting_spent = total_rent
-
-    traditional_opportunity_cost = down_payment * ((1 + investment_return_rate) ** years - 1)
-    rent_to_own_opportunity_cost = 0
-    renting_opportunity_cost = 0
-
-    rent_to_own_cost = rent_to_own_spent - total_equity + rent_to_own_opportunity_cost
-    traditional_cost = traditional_spent - traditional_equity + traditional_opportunity_cost
-    renting_cost = renting_spent - rental_equity + renting_opportunity_cost
-
-    # Calculate total interest paid for traditional mortgage
-    total_interest_paid = sum(calculate_monthly_breakdown(traditional_loan, mortgage_rate, LOAN_TERM_YEARS, month, is_rent_to_own=True)[1] for month in range(1, years*12+1))
-    
-    # Calculate tax savings from mortgage interest deduction
-    tax_savings = total_interest_paid * marginal_tax_rate
-    
-    # Adjust the traditional cost to include tax savings
-    traditional_cost -= tax_savings
-
-    return {
-        'mortgage_rate': mortgage_rate,
-        'traditional_payment': traditional_payment,
-        'traditional_equity': traditional_equity,
-        'rental_payment': initial_rental_payment,
-        'down_payment': down_payment,
-        'rent_to_own_spent': rent_to_own_spent,
-        'traditional_spent': traditional_spent,
-        'renting_spent': renting_spent,
-        'rent_to_own_cost': rent_to_own_cost,
-        'traditional_cost': traditional_cost,
-        'renting_cost': renting_cost,
-        'price_to_rent_ratio': price_to_rent_ratio,
-        'tax_savings': tax_savings,
-        'monthly_pmi': monthly_pmi,
-        'initial_rental_payment': initial_rental_payment,
-        'yearly_rent_increase': yearly_rent_increase,
-    }
-
-# tracks all user interactions
-with streamlit_analytics.track():
-
-    # Sidebar inputs
-    with st.sidebar:
-        st.markdown("#### Advanced Settings")
-        st.write("These settings are optional and can be adjusted to see how they impact the results.")
-        # Advanced settings in an expandable section
-        with st.expander("Advanced Settings"):
-            current_mortgage_rate = get_current_mortgage_rate()
-            mortgage_rate = st.number_input("Mortgage Rate (%)", min_value=0.0, max_value=15.0, value=current_mortgage_rate*100, step=0.1, help="The annual mortgage interest rate. Defaults to the current 30-year fixed rate from FRED.") / 100
-            appreciation_rate = st.number_input("Annual Appreciation Rate (%)", min_value=0.0, max_value=10.0, value=3.5, step=0.1) / 100
-            closing_costs_rate = st.number_input("Closing Costs & Inspections (%)", min_value=0.0, max_value=10.0, value=1.0, step=0.1, help="These costs will be added to the total purchase price of the home.") / 100
-            property_tax_rate = st.number_input("Property Tax Rate (%)", min_value=0.0, max_value=5.0, value=1.122, step=0.001) / 100
-            yearly_rent_increase = st.number_input("Yearly Rent Increase (%)", min_value=0.0, max_value=10.0, value=4.0, step=0.1, help="The percentage by which rent increases each year for traditional renting.") / 100
-            investment_return_rate = st.number_input("Investment Return Rate (%)", min_value=0.0, max_value=20.0, value=5.0, step=0.1, help="The rate of return you expect to earn in an investment account. This is used to calculate the opportunity cost of the down payment if you were to invest it instead of using it for a traditional mortgage.") / 100
-            price_to_rent_ratio = st.number_input("Price-to-Rent Ratio", min_value=1, max_value=50, value=19, step=1, help="The ratio of the price of the home to the rent of a similar home. This is used to calculate the monthly rent of an equivalent home for comparison purposes.")
-            marginal_tax_rate = st.number_input("Marginal Tax Rate (%)", min_value=0.0, max_value=50.0, value=16.0, step=0.1, help="Your marginal tax rate. This is used to calculate the tax savings from the mortgage interest deduction.") / 100
-            pmi_rate = st.number_input("PMI Rate (%)", min_value=0.0, max_value=5.0, value=1.5, step=0.1, help="Private Mortgage Insurance rate. This is typically required when the down payment is less than 20% of the home value.") / 100
-            insurance_cost = st.number_input("Monthly Home Insurance ($)", min_value=0, max_value=1000, value=INSURANCE_FIXED, step=10, help="Monthly cost of home insurance.")
-
-    # Set up the main title and description
-    st.title("Rent-to-Own Calculator")
-    st.write("This tool enables you to determine the equity you will own in your home over time, calculate monthly mortgage payments, and gives a great comparison between buying and renting a place.")
-
-    # Basic price input
-    col1, col2 = st.columns(2)
-    house_price = col1.number_input("Enter the price of the home you are considering ($)", min_value=0.0, step=5000.0, value=400000.0, format="%.0f")
-    
-    # Replace caption with toggle
-    include_closing_costs = st.toggle(
-        f"Automatically add {closing_costs_rate*100:.1f}% (${house_price * closing_costs_rate:,.0f}) closing costs",
-        value=True,
-        help="Toggle to include or exclude closing costs & inspections in the total purchase price"
-    )
-
-    add_vertical_space(1)
-
-    st.subheader("Monthly Rent Breakdown")
-    st.write("Unlike typical rent, rent to own applies a portion of your rent towards the purchase of the home. The rest is used to pay for the loan, property taxes, insurance, and maintenance.")
-
-    add_vertical_space(1)
-
-    subheader_slot = st.empty()
-    add_vertical_space(1)
-    plot_slot = st.empty()
-    plot_slot.container(height=300)
-
-    add_vertical_space(2)
-    st.divider()
-    add_vertical_space(1)
-
-    # Equity calculation section
-    st.header("How much equity can you build in your home over time?")
-    st.write("In addition to a portion of your rent going towards the purchase of the home, you will also share in 50% of the appreciation of the home as it goes up in value.")
-
-    add_vertical_space(1)
-
-    if 'years' not in st.session_state:
-        st.session_state.years = DEFAULT_YEARS
-
-    def update_bottom_slider():
-        st.session_state.bottom_slider = st.session_state.top_slider
-        st.session_state.years = st.session_state.top_slider
-
-    def update_top_slider():
-        st.session_state.top_slider = st.session_state.bottom_slider
-        st.session_state.years = st.session_state.bottom_slider
+    return fig, house_price, loan_amount, monthly_rent
 
-    # User input for years of renting
-    years = st.slider("Select the number of years you plan to rent the home.", 
-                    min_value=1, max_value=7, value=st.session_state.years, step=1, 
-                    key="top_slider", on_change=update_bottom_slider)
-    # if st.session_state.years != years:
-    #     st.rerun()
+# The page as a graph of stages, so a rerun only recomputes what depends on the inputs that changed.
+# Figures are built in the stages too, so an unchanged figure is reused as is.
+pipeline = Pipeline()
 
-    # Calculate initial values with default years
+@pipeline.stage("rent_breakdown", inputs=("house_price", "closing_costs_rate", "property_tax_rate", "insurance_cost", "include_closing_costs"))
+def build_rent_breakdown(house_price, closing_costs_rate, property_tax_rate, insurance_cost, include_closing_costs):
+    # The appreciation rate and number of years that update_calculator takes don't change the rent
     fig, house_price, loan_amount, monthly_rent = update_calculator(
-        house_price, 
-        closing_costs_rate, 
-        property_tax_rate, 
-        appreciation_rate, 
-        years, 
+        house_price,
+        closing_costs_rate,
+        property_tax_rate,
+        None,
+        None,
         insurance_cost,
         DEFAULT_INTEREST_RATE,
         include_closing_costs
     )
+    return {'figure': fig, 'house_price': house_price, 'loan_amount': loan_amount, 'monthly_rent': monthly_rent}
 
-    subheader_slot.subheader(f"Your monthly rent would be :blue[${monthly_rent:,.2f}].")
-    plot_slot.plotly_chart(fig, use_container_width=True)
-
-    # Calculate and display equity breakdown
-    principal_over_time, appreciation_over_time = calculate_equity_over_time(house_price, loan_amount, DEFAULT_INTEREST_RATE, LOAN_TERM_YEARS, appreciation_rate, years)
-    equity_fig = create_equity_area_chart(principal_over_time, appreciation_over_time, years)
-
-    total_equity = principal_over_time[-1] + appreciation_over_time[-1]
-    st.subheader(f"You would build an estimated :blue[${total_equity:,.2f}] in equity.")
-    st.write("This is assuming a 3.5% annual appreciation, which will depend on the local market.")
-
-    add_vertical_space(1)
-    st.plotly_chart(equity_fig, use_container_width=True)
-    add_vertical_space(3)
-
-
-    row1 = row([10, 1], vertical_align="center")
-
-    # Comparison of different scenarios
-    row1.markdown(f"#### In :blue[{years}] years, how does the true cost compare to renting?")
-
-    # Add toggles for including down payment opportunity cost and tax deductions
-    with row1.popover(":gear:"):
-        include_opportunity_cost = st.toggle(
-            "Include down payment opportunity cost",
-            value=True,
-            help="If enabled, calculates the potential earnings lost by using money for a down payment instead of investing it."
-        )
-        include_tax_deductions = st.toggle(
-            "Include tax deductions",
-            value=True,
-            help="If enabled, includes the tax savings from mortgage interest deductions in the calculations."
-        )
-        down_payment = st.number_input("Your down payment for a traditional mortgage ($)", min_value=0.0, max_value=house_price, value=0.0, step=1000.0, format="%.0f")
-
-    # Calculate down payment ratio
-    down_payment_ratio = down_payment / house_price
+@pipeline.stage("equity_schedule", inputs=("appreciation_rate", "years"), after=("rent_breakdown",))
+def build_equity_schedule(appreciation_rate, years, rent_breakdown):
+    principal_over_time, appreciation_over_time = calculate_equity_over_time(rent_breakdown['house_price'], rent_breakdown['loan_amount'], DEFAULT_INTEREST_RATE, LOAN_TERM_YEARS, appreciation_rate, years)
+    return {
+        'principal_over_time': principal_over_time,
+        'appreciation_over_time': appreciation_over_time,
+        'total_equity': float(principal_over_time[-1] + appreciation_over_time[-1]),
+    }
 
-    # Calculate comparison values
-    comparison_values = calculate_comparison_values(
+@pipeline.stage("simulation", inputs=("simulate_uncertainty", "appreciation_rate", "years", "appreciation_volatility", "yearly_rent_increase", "rent_increase_volatility", "simulation_paths"))
+def build_simulation(simulate_uncertainty, appreciation_rate, years, appreciation_volatility, yearly_rent_increase, rent_increase_volatility, simulation_paths):
+    if not simulate_uncertainty:
+        return None
+    # Fixed seed so the bands don't jump around between reruns
+    return simulate_paths(appreciation_rate, years, appreciation_volatility, yearly_rent_increase, rent_increase_volatility, paths=simulation_paths, seed=0)
+
+@pipeline.stage("equity_chart", inputs=("years",), after=("rent_breakdown", "equity_schedule", "simulation"))
+def build_equity_chart(years, rent_breakdown, equity_schedule, simulation):
+    equity_bands = None
+    if simulation is not None:
+        equity_bands = percentile_bands(simulate_equity(rent_breakdown['house_price'], equity_schedule['principal_over_time'], simulation))
+    return create_equity_area_chart(equity_schedule['principal_over_time'], equity_schedule['appreciation_over_time'], years, equity_bands)
+
+@pipeline.stage("comparison_values", inputs=("property_tax_rate", "appreciation_rate", "years", "down_payment", "price_to_rent_ratio", "investment_return_rate", "marginal_tax_rate", "mortgage_rate", "pmi_rate", "insurance_cost", "yearly_rent_increase"), after=("rent_breakdown", "equity_schedule"))
+def build_comparison_values(property_tax_rate, appreciation_rate, years, down_payment, price_to_rent_ratio, investment_return_rate, marginal_tax_rate, mortgage_rate, pmi_rate, insurance_cost, yearly_rent_increase, rent_breakdown, equity_schedule):
+    house_price = rent_breakdown['house_price']
+    return calculate_comparison_values(
         house_price, 
         property_tax_rate, 
         appreciation_rate, 
         years, 
-        monthly_rent, 
-        total_equity, 
-        down_payment_ratio, 
+        rent_breakdown['monthly_rent'], 
+        equity_schedule['total_equity'], 
+        down_payment / house_price, 
         price_to_rent_ratio, 
         investment_return_rate, 
         marginal_tax_rate,
@@ -506,12 +150,25 @@ with streamlit_analytics.track():
         yearly_rent_increase
     )
 
+@pipeline.stage("adjusted_comparison_values", inputs=("include_opportunity_cost", "include_tax_deductions"), after=("comparison_values",))
+def build_adjusted_comparison_values(include_opportunity_cost, include_tax_deductions, comparison_values):
     # Recalculate costs based on toggle settings
-    if not include_opportunity_cost:
-        comparison_values['traditional_cost'] -= (comparison_values['traditional_cost'] - comparison_values['traditional_spent'] + comparison_values['traditional_equity'])
+    return adjust_comparison_values(comparison_values, include_opportunity_cost, include_tax_deductions)
 
-    if not include_tax_deductions:
-        comparison_values['traditional_cost'] += comparison_values['tax_savings']
+@pipeline.stage("win_probability", inputs=("appreciation_rate", "years"), after=("rent_breakdown", "adjusted_comparison_values", "simulation"))
+def build_win_probability(appreciation_rate, years, rent_breakdown, adjusted_comparison_values, simulation):
+    if simulation is None:
+        return None
+    return win_probabilities(simulate_costs(adjusted_comparison_values, rent_breakdown['house_price'], appreciation_rate, years, simulation))
+
+@pipeline.stage("comparison_table", inputs=("years", "include_opportunity_cost", "include_tax_deductions"), after=("rent_breakdown", "equity_schedule", "adjusted_comparison_values"))
+def build_comparison_table(years, include_opportunity_cost, include_tax_deductions, rent_breakdown, equity_schedule, adjusted_comparison_values):
+    import pandas as pd
+
+    house_price = rent_breakdown['house_price']
+    monthly_rent = rent_breakdown['monthly_rent']
+    total_equity = equity_schedule['total_equity']
+    comparison_values = adjusted_comparison_values
 
     # Create full comparison data
     comparison_data = {
@@ -545,146 +202,569 @@ with streamlit_analytics.track():
     # Reset index after dropping rows
     df = df.reset_index(drop=True)
 
-    # Display total cost metrics for each scenario
-    col1, col2, col3 = st.columns(3)
-    with col1:
-        st.metric("Rent to Own Cost", 
-                f"${comparison_values['rent_to_own_cost']:,.0f}")
-    with col2:
-        delta_traditional = comparison_values['rent_to_own_cost'] - comparison_values['traditional_cost']
-        st.metric("Traditional Mortgage Cost", 
-                f"${comparison_values['traditional_cost']:,.0f}", 
-                delta=f"{'-' if delta_traditional > 0 else ''}${abs(delta_traditional):,.0f}",
-                delta_color="inverse")
-    with col3:
-        delta_renting = comparison_values['rent_to_own_cost'] - comparison_values['renting_cost']
-        st.metric("Traditional Renting Cost", 
-                f"${comparison_values['renting_cost']:,.0f}", 
-                delta=f"{'-' if delta_renting > 0 else ''}${abs(delta_renting):,.0f}",
-                delta_color="inverse")
-
-    # Define column configuration for better display
-    column_config = {
-        "Metric": st.column_config.TextColumn("Metric", width="medium"),
-        "Rent to Own": st.column_config.NumberColumn("Rent to Own", width="small"),
-        "Traditional Mortgage": st.column_config.NumberColumn("Mortgage", width="small"),
-        "Renting": st.column_config.NumberColumn("Renting", width="small")
-    }
-
-    # Display detailed comparison table in an expandable section
-    with st.expander("🔍 See the full comparison table"):
-        st.dataframe(
-            df.style.set_properties(**{'text-align': 'right'}, subset=df.columns[1:]),
-            column_config=column_config,
-            hide_index=True,
-            use_container_width=True
-        )
+    return df
 
-        # Add glossary of terms
-        st.markdown("""
-        ##### Glossary of Terms
-        - **Initial purchase price**: The original cost of the home.
-        - **Down payment**: The initial upfront payment made when purchasing a home.
-        - **Interest rate**: The annual cost of borrowing the money, expressed as a percentage.
-        - **Appreciation share**: The percentage of the home's increase in value that you benefit from.
-        - **Monthly payment**: The amount paid each month for housing costs.
-        - **Total equity**: The total value of your ownership stake in the property.
-        - **Total spent**: The total amount of money paid over the selected time period.
-        - **Down payment opportunity cost**: The potential earnings lost by using money for a down payment instead of investing it.
-        - **Tax savings (mortgage interest)**: The amount saved on taxes due to the mortgage interest deduction.
-        - **Total true cost**: The net cost after considering all expenses, equity gained, and opportunity costs.
-        """)
-
-    # Add caption explaining assumptions
-    st.caption(f"This looks at all the money you'll be spending on a house minus your gained equity and appreciation. We're assuming a mortgage rate of {comparison_values['mortgage_rate']:.2%}, an average appreciation rate of {appreciation_rate:.1%}, a {property_tax_rate:.2%} annual property tax rate, a {down_payment_ratio:.1%} down payment with {pmi_rate:.1%} PMI (if applicable), a price-to-rent ratio of {price_to_rent_ratio}, a marginal tax rate of {marginal_tax_rate:.1%}, and a yearly rent increase of {yearly_rent_increase:.1%}.")
-
-    # In the main part of your Streamlit app, after calculating the comparison values:
+@pipeline.stage("comparison_charts", inputs=("appreciation_rate", "years", "price_to_rent_ratio", "yearly_rent_increase"), after=("rent_breakdown", "equity_schedule"))
+def build_comparison_charts(appreciation_rate, years, price_to_rent_ratio, yearly_rent_increase, rent_breakdown, equity_schedule):
+    # Only the rent side of the comparison is needed here, so the down payment and the
+    # popover toggles don't cause these charts to be rebuilt.
+    house_price = rent_breakdown['house_price']
+    initial_rental_payment = house_price / (price_to_rent_ratio * 12)
     rent_to_own_spent, rent_to_own_saved, traditional_rent_spent = calculate_cumulative_values(
         house_price, 
-        monthly_rent, 
+        rent_breakdown['monthly_rent'], 
         years, 
         appreciation_rate, 
-        comparison_values['initial_rental_payment'],
-        comparison_values['yearly_rent_increase']
+        initial_rental_payment,
+        yearly_rent_increase
     )
 
     comparison_line_chart = create_comparison_line_chart(rent_to_own_spent, rent_to_own_saved, traditional_rent_spent, years)
+    comparison_bar_chart = create_comparison_bar_chart(rent_to_own_spent, rent_to_own_saved, traditional_rent_spent, equity_schedule['total_equity'])
+    return {'line_chart': comparison_line_chart, 'bar_chart': comparison_bar_chart}
+
+# With years switched in the browser, the charts are built once over MAX_YEARS and `years` only
+# picks the step their sliders start at
+@pipeline.stage("all_years_equity_schedule", inputs=("appreciation_rate",), after=("rent_breakdown",))
+def build_all_years_equity_schedule(appreciation_rate, rent_breakdown):
+    return build_equity_schedule(appreciation_rate, MAX_YEARS, rent_breakdown)
+
+@pipeline.stage("all_years_simulation", inputs=("simulate_uncertainty", "appreciation_rate", "appreciation_volatility", "yearly_rent_increase", "rent_increase_volatility", "simulation_paths"))
+def build_all_years_simulation(simulate_uncertainty, appreciation_rate, appreciation_volatility, yearly_rent_increase, rent_increase_volatility, simulation_paths):
+    return build_simulation(simulate_uncertainty, appreciation_rate, MAX_YEARS, appreciation_volatility, yearly_rent_increase, rent_increase_volatility, simulation_paths)
+
+@pipeline.stage("all_years_equity_chart", inputs=("years",), after=("rent_breakdown", "all_years_equity_schedule", "all_years_simulation"))
+def build_all_years_equity_chart(years, rent_breakdown, all_years_equity_schedule, all_years_simulation):
+    equity_bands = None
+    if all_years_simulation is not None:
+        equity_bands = percentile_bands(simulate_equity(rent_breakdown['house_price'], all_years_equity_schedule['principal_over_time'], all_years_simulation))
+    return create_equity_area_chart_by_year(all_years_equity_schedule['principal_over_time'], all_years_equity_schedule['appreciation_over_time'], years, equity_bands)
+
+@pipeline.stage("all_years_comparison_bar_chart", inputs=("appreciation_rate", "years", "price_to_rent_ratio", "yearly_rent_increase"), after=("rent_breakdown", "all_years_equity_schedule"))
+def build_all_years_comparison_bar_chart(appreciation_rate, years, price_to_rent_ratio, yearly_rent_increase, rent_breakdown, all_years_equity_schedule):
+    house_price = rent_breakdown['house_price']
+    initial_rental_payment = house_price / (price_to_rent_ratio * 12)
+    rent_to_own_spent, _, traditional_rent_spent = calculate_cumulative_values(
+        house_price,
+        rent_breakdown['monthly_rent'],
+        MAX_YEARS,
+        appreciation_rate,
+        initial_rental_payment,
+        yearly_rent_increase
+    )
+    total_equity_over_time = all_years_equity_schedule['principal_over_time'] + all_years_equity_schedule['appreciation_over_time']
+    return create_comparison_bar_chart_by_year(rent_to_own_spent, traditional_rent_spent, total_equity_over_time, years)
+
+# Everything the break-even analysis depends on besides the two rates the heatmap sweeps
+BREAKEVEN_INPUTS = (
+    "house_price", "closing_costs_rate", "property_tax_rate", "insurance_cost", "include_closing_costs", "down_payment",
+    "price_to_rent_ratio", "investment_return_rate", "marginal_tax_rate", "pmi_rate", "yearly_rent_increase",
+    "include_opportunity_cost", "include_tax_deductions",
+)
+
+@pipeline.stage("breakeven", inputs=BREAKEVEN_INPUTS + ("appreciation_rate", "mortgage_rate"))
+def build_breakeven(house_price, down_payment, **inputs):
+    return breakeven(house_price, down_payment_ratio=down_payment / house_price, **inputs)
+
+@pipeline.stage("breakeven_grid", inputs=BREAKEVEN_INPUTS)
+def build_breakeven_grid(house_price, down_payment, **inputs):
+    # Every combination of 100 appreciation rates and 100 mortgage rates, in a few batches
+    return breakeven_grid(
+        'appreciation_rate', DEFAULT_GRID['appreciation_rate'],
+        'mortgage_rate', DEFAULT_GRID['mortgage_rate'],
+        house_price=house_price, down_payment_ratio=down_payment / house_price, **inputs
+    )
+
+@pipeline.stage("ledger_csv", inputs=BREAKEVEN_INPUTS + ("appreciation_rate", "mortgage_rate", "years"))
+def build_ledger_csv(house_price, down_payment, **inputs):
+    # The month-by-month ledger behind the charts and the comparison, for the download button
+    return ledger_csv(house_price, down_payment_ratio=down_payment / house_price, **inputs)
+
+@pipeline.stage("breakeven_heatmap", inputs=("breakeven_against",), after=("breakeven_grid",))
+def build_breakeven_heatmap(breakeven_against, breakeven_grid):
+    return create_breakeven_heatmap(breakeven_grid, breakeven_against)
+
+@pipeline.stage("sensitivity", inputs=BREAKEVEN_INPUTS + ("appreciation_rate", "mortgage_rate", "years", "sensitivity_shift"))
+def build_sensitivity(house_price, down_payment, sensitivity_shift, **inputs):
+    # Every advanced setting moved down and up, all scored in one batch
+    return sensitivity(house_price, sensitivity_shift, down_payment_ratio=down_payment / house_price, **inputs)
+
+@pipeline.stage("tornado_chart", inputs=("years", "sensitivity_cost"), after=("sensitivity",))
+def build_tornado_chart(years, sensitivity_cost, sensitivity):
+    return create_tornado_chart(sensitivity, years, sensitivity_cost)
+
+# The optimizer searches the years and down payment itself
+@pipeline.stage("optimum", inputs=tuple(name for name in BREAKEVEN_INPUTS if name != "down_payment") + ("appreciation_rate", "mortgage_rate"))
+def build_optimum(house_price, **inputs):
+    return optimize(house_price, **inputs)
+
+@pipeline.stage("cost_surface_chart", inputs=("optimize_per_year",), after=("optimum",))
+def build_cost_surface_chart(optimize_per_year, optimum):
+    return create_cost_surface_chart(optimum, optimize_per_year)
+
+# What a new session shows before anyone touches an input, i.e. everything on the first paint
+FIRST_PAINT_STAGES = (
+    "rent_breakdown", "equity_chart", "adjusted_comparison_values", "win_probability", "comparison_table",
+    "comparison_charts", "breakeven", "ledger_csv",
+)
+
+def default_values(mortgage_rate):
+    # The inputs as the widgets first return them, percentages converted back the same way
+    return dict(
+        house_price=DEFAULT_HOUSE_PRICE,
+        closing_costs_rate=DEFAULT_CLOSING_COSTS_RATE*100 / 100,
+        property_tax_rate=DEFAULT_PROPERTY_TAX_RATE*100 / 100,
+        insurance_cost=INSURANCE_FIXED,
+        include_closing_costs=True,
+        appreciation_rate=DEFAULT_APPRECIATION_RATE*100 / 100,
+        simulate_uncertainty=False,
+        appreciation_volatility=None,
+        rent_increase_volatility=None,
+        simulation_paths=None,
+        yearly_rent_increase=DEFAULT_YEARLY_RENT_INCREASE*100 / 100,
+        price_to_rent_ratio=DEFAULT_PRICE_TO_RENT_RATIO,
+        investment_return_rate=DEFAULT_INVESTMENT_RETURN_RATE*100 / 100,
+        marginal_tax_rate=DEFAULT_MARGINAL_TAX_RATE*100 / 100,
+        mortgage_rate=mortgage_rate*100 / 100,
+        pmi_rate=DEFAULT_PMI_RATE*100 / 100,
+        years_in_charts=False,
+        years=DEFAULT_YEARS,
+        down_payment=0.0,
+        include_opportunity_cost=True,
+        include_tax_deductions=True,
+    )
 
-    # This is the chart Adam suggested, but I think it's a bit tough to parse
-    # st.plotly_chart(comparison_line_chart, use_container_width=True)
-
-    def create_comparison_bar_chart(rent_to_own_spent, rent_to_own_saved, traditional_rent_spent, total_equity):
-        categories = ['Rent to Own', 'Traditional Renting']
-        true_costs = [rent_to_own_spent[-1] - total_equity, traditional_rent_spent[-1]]
-        total_equity_values = [total_equity, 0]  # Traditional renting has 0 equity
-        
-        fig = go.Figure(data=[
-            go.Bar(name='True Cost', x=categories, y=true_costs, marker_color='#0068C9',
-                text=[f'True Cost:<br>${cost:,.0f}' for cost in true_costs], textposition='inside'),
-            go.Bar(name='Total Equity', x=categories, y=total_equity_values, marker_color='#83C5BE',
-                text=[f'Total Equity:<br>${equity:,.0f}' for equity in total_equity_values], textposition='inside')
-        ])
-        
-        fig.update_layout(
-            title='True Cost vs Total Equity Comparison',
-            xaxis_title='Housing Option',
-            yaxis_title='Amount ($)',
-            barmode='stack',
-            legend=dict(
-                x=1.02,
-                y=1,
-                xanchor='left',
-                yanchor='top',
-                bgcolor='rgba(255, 255, 255, 0.8)'
-            ),
-            hovermode='x unified',
-            margin=dict(r=150, t=100, b=100)
+@st.cache_resource
+def get_warm_start():
+    # Computes the default page once per server process, see warmup.py
+    return WarmStart(get_rate_provider(), lambda mortgage_rate: warm_pipeline(pipeline, default_values(mortgage_rate), FIRST_PAINT_STAGES))
+
+def describe_breakeven(summary, other, other_label):
+    # One sentence on when (and whether) rent-to-own and the other option swap places, from a
+    # breakeven.breakeven() summary. Which one becomes cheaper is read off the break-even month
+    # itself; they can swap back later, so the delta at the end doesn't say.
+    month = summary[f'{other}_breakeven']
+    if math.isnan(month):
+        return f"Rent to own stays {'cheaper' if summary[f'{other}_delta'] <= 0 else 'more expensive'} than {other_label} for all {BREAKEVEN_YEARS} years."
+    years, months = divmod(int(month), 12)
+    parts = []
+    if years:
+        parts.append(f"{years} year{'s' if years != 1 else ''}")
+    if months:
+        parts.append(f"{months} month{'s' if months != 1 else ''}")
+    if summary[f'{other}_breakeven_delta'] <= 0:
+        return f"Rent to own becomes cheaper than {other_label} after {' and '.join(parts)}."
+    return f"{other_label[0].upper()}{other_label[1:]} becomes cheaper than rent to own after {' and '.join(parts)}."
+
+def current_session_id():
+    return st.session_state.setdefault('session_id', uuid.uuid4().hex[:12])
+
+@contextmanager
+def rerun_scope(section):
+    # Tracing and analytics for one rerun: of the whole page, or of a single section when only its
+    # fragment reruns. Sections drawn during a full rerun share the page's scope.
+    active = st.session_state.get('active_rerun')
+    if active is not None:
+        yield active['trace']
+        return
+
+    # Opt-in timing of this rerun, see tracing.py
+    st.session_state.trace_reruns = st.session_state.get('trace_reruns', 0) + 1
+    trace = start_trace(session=current_session_id(), rerun=st.session_state.trace_reruns, section=section)
+    st.session_state.active_rerun = {'trace': trace, 'inputs': {}}
+    try:
+        yield trace
+        inputs = st.session_state.active_rerun['inputs']
+    finally:
+        del st.session_state['active_rerun']
+
+    # Record what the user changed. This only queues the event; it's written out in the background.
+    previous_inputs = st.session_state.get('analytics_inputs')
+    if previous_inputs is None:
+        get_tracker().track("page_view", session=current_session_id())
+    else:
+        changed = changed_inputs(previous_inputs, inputs)
+        if changed:
+            get_tracker().track("inputs_changed", session=current_session_id(), inputs=changed)
+    st.session_state.analytics_inputs = {**(previous_inputs or {}), **inputs}
+
+    record = trace.finish()
+    if record is not None and TRACE_PANEL:
+        with st.expander("Rerun timings"):
+            st.write(f"Rerun {record['rerun']} ({record['section']}) took {record['total_ms']:,.1f} ms")
+            st.dataframe(record['spans'], hide_index=True, use_container_width=True)
+            st.json({'stages': record['stages'], 'process_caches': record['process_caches']}, expanded=False)
+
+def finish_section(trace, run):
+    # The pipeline stages cover update_calculator, the equity schedule, calculate_comparison_values and the DataFrame
+    trace.add_pipeline(run)
+    st.session_state.active_rerun['inputs'].update(run.values)
+
+def run_pipeline(**values):
+    # A pass over the pipeline with the page-wide inputs from the last full rerun plus the section's own.
+    # Stage results are memoized per session, see the pipeline above. A new session starts from
+    # the default page computed at startup, so it only computes what it changed.
+    if 'pipeline_memo' not in st.session_state:
+        st.session_state.pipeline_memo = get_warm_start().seed()
+    return pipeline.run(st.session_state.pipeline_memo, **st.session_state.page_inputs, **values)
+
+def update_bottom_slider():
+    st.session_state.bottom_slider = st.session_state.top_slider
+    st.session_state.years = st.session_state.top_slider
+
+def update_top_slider():
+    st.session_state.top_slider = st.session_state.bottom_slider
+    st.session_state.years = st.session_state.bottom_slider
+
+# The page is split into fragments so that a widget only reruns the sections that depend on it:
+#   render_page: the sidebar, price and closing costs; reruns everything
+#   years_section: both years sliders, the equity chart and the bar chart
+#   comparison_section: the :gear: popover, the cost metrics, the table and the break-even analysis
+# Inputs owned by an outer section reach the inner ones through st.session_state.page_inputs
+# and st.session_state.years.
+
+def render_page():
+    # UI-only dependencies are imported here so that importing this module doesn't pull them in
+    import_libraries()
+    from streamlit_extras.add_vertical_space import add_vertical_space
+
+    with rerun_scope("page") as trace:
+        # Sidebar inputs
+        with st.sidebar:
+            st.markdown("#### Advanced Settings")
+            st.write("These settings are optional and can be adjusted to see how they impact the results.")
+            # Advanced settings in an expandable section
+            with st.expander("Advanced Settings"):
+                with trace.span("rate_fetch", cached=not get_rate_provider().is_stale):
+                    current_mortgage_rate = get_current_mortgage_rate()
+                mortgage_rate = st.number_input("Mortgage Rate (%)", min_value=0.0, max_value=15.0, value=current_mortgage_rate*100, step=0.1, help="The annual mortgage interest rate. Defaults to the current 30-year fixed rate from FRED.") / 100
+                appreciation_rate = st.number_input("Annual Appreciation Rate (%)", min_value=0.0, max_value=10.0, value=DEFAULT_APPRECIATION_RATE*100, step=0.1) / 100
+                closing_costs_rate = st.number_input("Closing Costs & Inspections (%)", min_value=0.0, max_value=10.0, value=DEFAULT_CLOSING_COSTS_RATE*100, step=0.1, help="These costs will be added to the total purchase price of the home.") / 100
+                property_tax_rate = st.number_input("Property Tax Rate (%)", min_value=0.0, max_value=5.0, value=DEFAULT_PROPERTY_TAX_RATE*100, step=0.001) / 100
+                yearly_rent_increase = st.number_input("Yearly Rent Increase (%)", min_value=0.0, max_value=10.0, value=DEFAULT_YEARLY_RENT_INCREASE*100, step=0.1, help="The percentage by which rent increases each year for traditional renting.") / 100
+                investment_return_rate = st.number_input("Investment Return Rate (%)", min_value=0.0, max_value=20.0, value=DEFAULT_INVESTMENT_RETURN_RATE*100, step=0.1, help="The rate of return you expect to earn in an investment account. This is used to calculate the opportunity cost of the down payment if you were to invest it instead of using it for a traditional mortgage.") / 100
+                price_to_rent_ratio = st.number_input("Price-to-Rent Ratio", min_value=1, max_value=50, value=DEFAULT_PRICE_TO_RENT_RATIO, step=1, help="The ratio of the price of the home to the rent of a similar home. This is used to calculate the monthly rent of an equivalent home for comparison purposes.")
+                marginal_tax_rate = st.number_input("Marginal Tax Rate (%)", min_value=0.0, max_value=50.0, value=DEFAULT_MARGINAL_TAX_RATE*100, step=0.1, help="Your marginal tax rate. This is used to calculate the tax savings from the mortgage interest deduction.") / 100
+                pmi_rate = st.number_input("PMI Rate (%)", min_value=0.0, max_value=5.0, value=DEFAULT_PMI_RATE*100, step=0.1, help="Private Mortgage Insurance rate. This is typically required when the down payment is less than 20% of the home value.") / 100
+                insurance_cost = st.number_input("Monthly Home Insurance ($)", min_value=0, max_value=1000, value=INSURANCE_FIXED, step=10, help="Monthly cost of home insurance.")
+
+            st.markdown("#### Market Uncertainty")
+            simulate_uncertainty = st.toggle("Simulate market uncertainty", value=False, help="Instead of a single fixed appreciation rate, simulate thousands of possible markets and show the range of outcomes.")
+            appreciation_volatility = rent_increase_volatility = simulation_paths = None
+            if simulate_uncertainty:
+                appreciation_volatility = st.number_input("Appreciation Volatility (%)", min_value=0.0, max_value=20.0, value=DEFAULT_APPRECIATION_VOLATILITY*100, step=0.5, help="How much the yearly appreciation rate can swing around its average (one standard deviation).") / 100
+                rent_increase_volatility = st.number_input("Rent Increase Volatility (%)", min_value=0.0, max_value=10.0, value=DEFAULT_RENT_INCREASE_VOLATILITY*100, step=0.5, help="How much the yearly rent increase can swing around its average (one standard deviation).") / 100
+                simulation_paths = st.number_input("Simulated Markets", min_value=1000, max_value=50000, value=DEFAULT_PATHS, step=1000)
+
+            st.markdown("#### Display")
+            years_in_charts = st.toggle("Switch years inside the charts", value=False, help="Sends the equity and cost charts for every number of years at once, each with its own years slider, so changing the years in a chart doesn't wait on the server. Useful on slow connections. The cost metrics and table follow the slider above the equity chart.")
+
+        # Set up the main title and description
+        st.title("Rent-to-Own Calculator")
+        st.write("This tool enables you to determine the equity you will own in your home over time, calculate monthly mortgage payments, and gives a great comparison between buying and renting a place.")
+
+        # Basic price input
+        col1, col2 = st.columns(2)
+        house_price = col1.number_input("Enter the price of the home you are considering ($)", min_value=0.0, step=5000.0, value=DEFAULT_HOUSE_PRICE, format="%.0f")
+    
+        # Replace caption with toggle
+        include_closing_costs = st.toggle(
+            f"Automatically add {closing_costs_rate*100:.1f}% (${house_price * closing_costs_rate:,.0f}) closing costs",
+            value=True,
+            help="Toggle to include or exclude closing costs & inspections in the total purchase price"
         )
-        
-        # Update text position and font
-        fig.update_traces(textfont_size=12, textangle=0, cliponaxis=False, textfont_color='white')
-        
-        # Add total amount annotation on top of each bar
-        for i, category in enumerate(categories):
-            total_amount = true_costs[i] + total_equity_values[i]
-            fig.add_annotation(
-                x=category,
-                y=total_amount,
-                text=f'Total Spent: ${total_amount:,.0f}',
-                showarrow=False,
-                yshift=10,
-                font=dict(size=14, color="black"),
-            )
-        
-        return fig
 
+        # Work back from a monthly budget to the most the home can cost
+        monthly_budget = col2.number_input("What can I afford? Enter a monthly budget ($)", min_value=0.0, value=None, step=100.0, format="%.0f", help="Finds the highest home price whose rent-to-own rent fits this budget, using the settings in the sidebar.")
+        if monthly_budget:
+            affordable_price = solve_house_price(monthly_budget, 'monthly_rent', closing_costs_rate=closing_costs_rate, property_tax_rate=property_tax_rate, insurance_cost=insurance_cost, include_closing_costs=include_closing_costs)['house_price']
+            if not math.isnan(affordable_price):
+                col2.caption(f"Homes up to **${affordable_price:,.0f}** fit a ${monthly_budget:,.0f}/month budget.")
+            else:
+                # The rent-to-own rent never drops below what it is at a price of $0
+                minimum_rent = calculate_rent_to_own(0.0, closing_costs_rate, property_tax_rate, appreciation_rate, insurance_cost, DEFAULT_INTEREST_RATE, include_closing_costs)[1]
+                col2.caption(f"${monthly_budget:,.0f}/month is below the lowest rent-to-own rent of ${minimum_rent:,.0f}/month.")
+
+        add_vertical_space(1)
+
+        st.subheader("Monthly Rent Breakdown")
+        st.write("Unlike typical rent, rent to own applies a portion of your rent towards the purchase of the home. The rest is used to pay for the loan, property taxes, insurance, and maintenance.")
+
+        add_vertical_space(1)
+
+        st.session_state.page_inputs = dict(
+            house_price=house_price,
+            closing_costs_rate=closing_costs_rate,
+            property_tax_rate=property_tax_rate,
+            insurance_cost=insurance_cost,
+            include_closing_costs=include_closing_costs,
+            appreciation_rate=appreciation_rate,
+            simulate_uncertainty=simulate_uncertainty,
+            appreciation_volatility=appreciation_volatility,
+            rent_increase_volatility=rent_increase_volatility,
+            simulation_paths=simulation_paths,
+            yearly_rent_increase=yearly_rent_increase,
+            price_to_rent_ratio=price_to_rent_ratio,
+            investment_return_rate=investment_return_rate,
+            marginal_tax_rate=marginal_tax_rate,
+            mortgage_rate=mortgage_rate,
+            pmi_rate=pmi_rate,
+            years_in_charts=years_in_charts,
+        )
+        run = run_pipeline()
+        rent_breakdown = run['rent_breakdown']
+        monthly_rent = rent_breakdown['monthly_rent']
+
+        st.subheader(f"Your monthly rent would be :blue[${monthly_rent:,.2f}].")
+        add_vertical_space(1)
+        with trace.span("plotly_chart", chart="rent_breakdown"):
+            st.plotly_chart(rent_breakdown['figure'], use_container_width=True)
+
+        add_vertical_space(2)
+        st.divider()
+        add_vertical_space(1)
+
+        # Equity calculation section
+        st.header("How much equity can you build in your home over time?")
+        st.write("In addition to a portion of your rent going towards the purchase of the home, you will also share in 50% of the appreciation of the home as it goes up in value.")
+
+        add_vertical_space(1)
+
+        if 'years' not in st.session_state:
+            st.session_state.years = DEFAULT_YEARS
+
+        years_section()
+        finish_section(trace, run)
+
+    # Compute the default page for the sessions to come, unless that's been done for the current
+    # rate. Streamlit only runs this file once a session connects, and by the end of the first page
+    # everything the warm-up uses has been imported, so it never races this thread importing plotly or pandas.
+    get_warm_start().ensure_warm()
+
+@st.fragment
+def years_section():
+    from streamlit_extras.add_vertical_space import add_vertical_space
+
+    with rerun_scope("years") as trace:
+        # User input for years of renting
+        years = st.slider("Select the number of years you plan to rent the home.", 
+                        min_value=1, max_value=MAX_YEARS, value=st.session_state.years, step=1, 
+                        key="top_slider", on_change=update_bottom_slider)
+
+        run = run_pipeline(years=years)
+        years_in_charts = run.values['years_in_charts']
+
+        # Calculate and display equity breakdown
+        equity_fig = run['all_years_equity_chart' if years_in_charts else 'equity_chart']
 
+        total_equity = run['equity_schedule']['total_equity']
+        st.subheader(f"You would build an estimated :blue[${total_equity:,.2f}] in equity.")
+        st.write("This is assuming a 3.5% annual appreciation, which will depend on the local market.")
 
+        add_vertical_space(1)
+        with trace.span("plotly_chart", chart="equity"):
+            st.plotly_chart(equity_fig, use_container_width=True)
+        add_vertical_space(3)
 
-    comparison_bar_chart = create_comparison_bar_chart(rent_to_own_spent, rent_to_own_saved, traditional_rent_spent, total_equity)
+        comparison_section(years)
 
-    add_vertical_space(2)
+        if years_in_charts:
+            comparison_bar_chart = run['all_years_comparison_bar_chart']
+        else:
+            comparison_bar_chart = run['comparison_charts']['bar_chart']
+
+        # This is the chart Adam suggested, but I think it's a bit tough to parse
+        # st.plotly_chart(run['comparison_charts']['line_chart'], use_container_width=True)
+
+        add_vertical_space(2)
+
+        st.subheader("Understanding the True Cost of Rent-to-Own vs Traditional Renting")
+        st.write("While rent-to-own may seem more expensive at first glance due to higher monthly payments, it's important to consider the long-term financial benefits:")
+
+        col1, col2 = st.columns(2)
+        with col1:
+            st.markdown("""
+            - **Forced Savings**: A portion of your monthly rent goes towards building equity in the home.
+            - **Appreciation**: You benefit from 50% of the home's increase in value over time.
+            """)
+        with col2:
+            st.markdown("""
+            - **Future Investment**: The equity you build can be used towards purchasing the home or as savings for future investments.
+            - **Flexibility**: You have the option to purchase the home at the end of the term, but you're not obligated to do so.
+            """)
+
+        # Mirrored slider at the bottom, unless the bar chart brings its own
+        if not years_in_charts:
+            st.slider("Adjust the number of years", 
+                      min_value=1, max_value=MAX_YEARS, value=st.session_state.years, step=1,
+                      key="bottom_slider", on_change=update_top_slider)
+
+        with trace.span("plotly_chart", chart="comparison_bar"):
+            st.plotly_chart(comparison_bar_chart, use_container_width=True)
+
+        st.caption("This chart shows the total amount spent on housing over the selected period, compared to the total amount saved (in the form of equity for rent-to-own). While traditional renting may have lower monthly costs, it doesn't build any equity or savings over time.")
 
-    st.subheader("Understanding the True Cost of Rent-to-Own vs Traditional Renting")
-    st.write("While rent-to-own may seem more expensive at first glance due to higher monthly payments, it's important to consider the long-term financial benefits:")
+        finish_section(trace, run)
 
-    col1, col2 = st.columns(2)
-    with col1:
-        st.markdown("""
-        - **Forced Savings**: A portion of your monthly rent goes towards building equity in the home.
-        - **Appreciation**: You benefit from 50% of the home's increase in value over time.
-        """)
-    with col2:
-        st.markdown("""
-        - **Future Investment**: The equity you build can be used towards purchasing the home or as savings for future investments.
-        - **Flexibility**: You have the option to purchase the home at the end of the term, but you're not obligated to do so.
-        """)
+@st.fragment
+def comparison_section(years):
+    from streamlit_extras.row import row
 
-    # Mirrored slider at the bottom
-    bottom_years = st.slider("Adjust the number of years", 
-                            min_value=1, max_value=7, value=st.session_state.years, step=1,
-                            key="bottom_slider", on_change=update_top_slider)
+    page_inputs = st.session_state.page_inputs
+    house_price = page_inputs['house_price']
+
+    with rerun_scope("comparison") as trace:
+        row1 = row([10, 1], vertical_align="center")
+
+        # Comparison of different scenarios
+        row1.markdown(f"#### In :blue[{years}] years, how does the true cost compare to renting?")
+
+        # Add toggles for including down payment opportunity cost and tax deductions
+        with row1.popover(":gear:"):
+            include_opportunity_cost = st.toggle(
+                "Include down payment opportunity cost",
+                value=True,
+                help="If enabled, calculates the potential earnings lost by using money for a down payment instead of investing it."
+            )
+            include_tax_deductions = st.toggle(
+                "Include tax deductions",
+                value=True,
+                help="If enabled, includes the tax savings from mortgage interest deductions in the calculations."
+            )
+            down_payment = st.number_input("Your down payment for a traditional mortgage ($)", min_value=0.0, max_value=house_price, value=0.0, step=1000.0, format="%.0f")
+
+        # Calculate down payment ratio
+        down_payment_ratio = down_payment / house_price
+
+        # Calculate comparison values, with the costs adjusted for the toggle settings
+        run = run_pipeline(years=years, down_payment=down_payment, include_opportunity_cost=include_opportunity_cost, include_tax_deductions=include_tax_deductions)
+        comparison_values = run['adjusted_comparison_values']
+        df = run['comparison_table']
+
+        win_probability = run['win_probability']
+
+        # Display total cost metrics for each scenario
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Rent to Own Cost", 
+                    f"${comparison_values['rent_to_own_cost']:,.0f}")
+            if win_probability:
+                st.caption(f"Cheapest in {win_probability['rent_to_own_cost']:.0%} of simulated markets")
+        with col2:
+            delta_traditional = comparison_values['rent_to_own_cost'] - comparison_values['traditional_cost']
+            st.metric("Traditional Mortgage Cost", 
+                    f"${comparison_values['traditional_cost']:,.0f}", 
+                    delta=f"{'-' if delta_traditional > 0 else ''}${abs(delta_traditional):,.0f}",
+                    delta_color="inverse")
+            if win_probability:
+                st.caption(f"Cheapest in {win_probability['traditional_cost']:.0%} of simulated markets")
+        with col3:
+            delta_renting = comparison_values['rent_to_own_cost'] - comparison_values['renting_cost']
+            st.metric("Traditional Renting Cost", 
+                    f"${comparison_values['renting_cost']:,.0f}", 
+                    delta=f"{'-' if delta_renting > 0 else ''}${abs(delta_renting):,.0f}",
+                    delta_color="inverse")
+            if win_probability:
+                st.caption(f"Cheapest in {win_probability['renting_cost']:.0%} of simulated markets")
+
+        # Define column configuration for better display
+        column_config = {
+            "Metric": st.column_config.TextColumn("Metric", width="medium"),
+            "Rent to Own": st.column_config.NumberColumn("Rent to Own", width="small"),
+            "Traditional Mortgage": st.column_config.NumberColumn("Mortgage", width="small"),
+            "Renting": st.column_config.NumberColumn("Renting", width="small")
+        }
+
+        # Display detailed comparison table in an expandable section
+        with st.expander("🔍 See the full comparison table"):
+            with trace.span("styler"):
+                styled = df.style.set_properties(**{'text-align': 'right'}, subset=df.columns[1:])
+            with trace.span("dataframe"):
+                st.dataframe(
+                    styled,
+                    column_config=column_config,
+                    hide_index=True,
+                    use_container_width=True
+                )
+            st.download_button(
+                "Download the month-by-month ledger (CSV)",
+                data=run['ledger_csv'],
+                file_name=f"rent-to-own-ledger-{years}-years.csv",
+                mime="text/csv",
+                help="Principal, interest, taxes, insurance, appreciation and running totals for every month, for all three options."
+            )
+
+            # Add glossary of terms
+            st.markdown("""
+            ##### Glossary of Terms
+            - **Initial purchase price**: The original cost of the home.
+            - **Down payment**: The initial upfront payment made when purchasing a home.
+            - **Interest rate**: The annual cost of borrowing the money, expressed as a percentage.
+            - **Appreciation share**: The percentage of the home's increase in value that you benefit from.
+            - **Monthly payment**: The amount paid each month for housing costs.
+            - **Total equity**: The total value of your ownership stake in the property.
+            - **Total spent**: The total amount of money paid over the selected time period.
+            - **Down payment opportunity cost**: The potential earnings lost by using money for a down payment instead of investing it.
+            - **Tax savings (mortgage interest)**: The amount saved on taxes due to the mortgage interest deduction.
+            - **Total true cost**: The net cost after considering all expenses, equity gained, and opportunity costs.
+            """)
+
+        # Add caption explaining assumptions
+        st.caption(f"This looks at all the money you'll be spending on a house minus your gained equity and appreciation. We're assuming a mortgage rate of {comparison_values['mortgage_rate']:.2%}, an average appreciation rate of {page_inputs['appreciation_rate']:.1%}, a {page_inputs['property_tax_rate']:.2%} annual property tax rate, a {down_payment_ratio:.1%} down payment with {page_inputs['pmi_rate']:.1%} PMI (if applicable), a price-to-rent ratio of {page_inputs['price_to_rent_ratio']}, a marginal tax rate of {page_inputs['marginal_tax_rate']:.1%}, and a yearly rent increase of {page_inputs['yearly_rent_increase']:.1%}.")
+
+        # When does each option overtake the other, over the full loan term
+        st.subheader("When does rent-to-own pay off?")
+        breakeven_summary = run['breakeven']
+        st.write(" ".join([
+            describe_breakeven(breakeven_summary, 'renting', "renting"),
+            describe_breakeven(breakeven_summary, 'traditional', "a traditional mortgage"),
+        ]))
+        if st.toggle("Show how this changes with the appreciation and mortgage rates", value=False):
+            breakeven_against = st.radio("Compare rent to own with", ["traditional", "renting"], format_func={'traditional': "Traditional Mortgage", 'renting': "Traditional Renting"}.get, horizontal=True)
+            run.update(breakeven_against=breakeven_against)
+            with trace.span("plotly_chart", chart="breakeven_heatmap"):
+                st.plotly_chart(run['breakeven_heatmap'], use_container_width=True)
+            st.caption(f"Each cell is the difference in true cost after {BREAKEVEN_YEARS} years with every other setting as above. Hover over a cell to see when the cheaper option changes.")
+
+        # How much each of the advanced settings moves the true costs
+        st.subheader("Which settings matter most?")
+        if st.toggle("Show how much each advanced setting changes the true cost", value=False):
+            col1, col2 = st.columns([1, 2])
+            sensitivity_shift = col1.number_input("Move each setting by (%)", min_value=1.0, max_value=50.0, value=DEFAULT_SHIFT*100, step=1.0, help="Each setting in the sidebar's Advanced Settings is moved this share of its value down and up, e.g. 10% moves a 6.5% mortgage rate to 5.85% and 7.15%.") / 100
+            sensitivity_cost = col2.radio("True cost of", COSTS, format_func={'rent_to_own_cost': "Rent to Own", 'traditional_cost': "Traditional Mortgage", 'renting_cost': "Traditional Renting"}.get, horizontal=True)
+            run.update(sensitivity_shift=sensitivity_shift, sensitivity_cost=sensitivity_cost)
+            with trace.span("plotly_chart", chart="tornado_chart"):
+                st.plotly_chart(run['tornado_chart'], use_container_width=True)
+            st.caption(f"Starting from a true cost of ${run['sensitivity'][sensitivity_cost]:,.0f} after {years} years, each bar is how much it changes when one setting moves {sensitivity_shift:.0%} of its value with every other setting as above.")
+
+        # Instead of trying years and down payments by hand, search all of them at once
+        st.subheader("How long should you stay, and how much should you put down?")
+        if st.toggle(f"Find the years (up to {LOAN_TERM_YEARS}) and down payment with the lowest true cost", value=False):
+            optimize_per_year = st.radio("Lowest true cost", [True, False], format_func={True: "Per year held", False: "In total"}.get, horizontal=True, help="True costs mostly grow with every year held, so the lowest total is usually the shortest stay. Per year held compares stays of different lengths.")
+            run.update(optimize_per_year=optimize_per_year)
+            optimum = run['optimum']
+            suffix = '_per_year' if optimize_per_year else ''
+            labels = {'rent_to_own': "Rent to Own", 'traditional': "Traditional Mortgage", 'renting': "Traditional Renting"}
+            st.dataframe(
+                [
+                    {
+                        "Option": labels[option],
+                        "Years": optimum[f'{option}_best{suffix}']['years'],
+                        "Down payment": f"${house_price * optimum[f'{option}_best{suffix}']['down_payment_ratio']:,.0f}" if option == 'traditional' else "",
+                        "True cost": f"${optimum[f'{option}_best{suffix}']['cost']:,.0f}",
+                        "Per year": f"${optimum[f'{option}_best{suffix}']['cost_per_year']:,.0f}",
+                    }
+                    for option in OPTIONS
+                ],
+                hide_index=True,
+                use_container_width=True
+            )
+            with trace.span("plotly_chart", chart="cost_surface_chart"):
+                st.plotly_chart(run['cost_surface_chart'], use_container_width=True)
+            st.caption(f"Every stay from 1 to {LOAN_TERM_YEARS} years and every down payment from 0% to 50% of the price, with every other setting as above. Only the traditional mortgage depends on the down payment. {labels[optimum['cheapest' + suffix]]} comes out cheapest.")
 
-    st.plotly_chart(comparison_bar_chart, use_container_width=True)
+        finish_section(trace, run)
 
-    st.caption("This chart shows the total amount spent on housing over the selected period, compared to the total amount saved (in the form of equity for rent-to-own). While traditional renting may have lower monthly costs, it doesn't build any equity or savings over time.")
+# Streamlit runs this file as __main__; importing it only defines the functions above
+if __name__ == "__main__":
+    render_page()
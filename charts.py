@@ -0,0 +1,529 @@
+import base64
+import functools
+import os
+
+import numpy as np
+
+# Every rerun sends each chart to the browser as JSON, so unless COMPACT_CHARTS=0 charts are sent
+# compactly: values are rounded to what the hover labels show and sent as binary typed arrays where
+# that's exact, the theme only carries the trace types a chart uses, the year gridlines are a
+# single shape, and the comparison lines are drawn with WebGL over long horizons.
+COMPACT_CHARTS = os.environ.get("COMPACT_CHARTS", "1") != "0"
+TYPED_ARRAY_MIN_SIZE = 16  # Shorter arrays are smaller as JSON lists
+WEBGL_AFTER_MONTHS = 180
+COLORSCALE_TYPES = {'heatmap', 'histogram2d', 'contour', 'contourcarpet'}  # The traces the theme's color scales are for
+
+def _graph_objects():
+    # plotly is only imported the first time a chart is drawn, so importing
+    # this module (or anything that imports it) stays cheap.
+    import plotly.graph_objects as go
+    return go
+
+# Each chart is built from a template: the layout, year gridlines, styling and any fixed
+# trace data are put together (and validated by plotly) once, and cached per number of years.
+# Drawing a chart then only swaps the new trace data into a copy of the template, skipping
+# plotly's validation, which used to cost more than the financial math itself.
+
+@functools.lru_cache(maxsize=1)
+def _figure_class():
+    go = _graph_objects()
+
+    class TemplateFigure(go.Figure):
+        # Keeps the dict it was built from. st.plotly_chart turns every figure into a dict with
+        # to_dict() on each call, a deep copy that costs more than building the figure; this hands
+        # out a shallow copy of the dict it already has instead. Figures built from templates are
+        # never changed afterwards, so the two always agree.
+
+        def __init__(self, figure):
+            super().__init__(figure, _validate=False)
+            self._figure = figure
+
+        def to_dict(self):
+            return {**self._figure, 'data': [dict(trace) for trace in self._figure['data']]}
+
+    return TemplateFigure
+
+def _compact_array(values, decimals):
+    # `values` rounded to `decimals`, as a float32 typed array if that holds every rounded value to
+    # within half of the last decimal, and as a list otherwise
+    values = np.round(np.asarray(values, dtype=float), decimals)
+    single = values.astype('<f4')
+    exact = (np.abs(single - values) < 0.5 * 10.0 ** -decimals) | np.isnan(values)
+    if values.size < TYPED_ARRAY_MIN_SIZE or not exact.all():
+        return values.tolist()
+    spec = {'dtype': 'f4', 'bdata': base64.b64encode(single.tobytes()).decode('ascii')}
+    if values.ndim > 1:
+        spec['shape'] = str(values.shape)[1:-1]
+    return spec
+
+def _template_dict(fig):
+    # The figure as a template dict. Compact templates only keep the theme's defaults for the
+    # trace types the figure has.
+    figure = fig.to_dict()
+    theme = figure['layout'].get('template')
+    if COMPACT_CHARTS and theme:
+        types = {trace.get('type', 'scatter') for trace in figure['data']}
+        theme['data'] = {name: value for name, value in theme.get('data', {}).items() if name in types}
+        if not types & COLORSCALE_TYPES:
+            theme['layout'] = {name: value for name, value in theme.get('layout', {}).items() if name not in ('colorscale', 'coloraxis')}
+    return figure
+
+def _months_axis(months):
+    # x values 1, 2, ..., months, as a start and step in compact charts
+    return dict(x0=1, dx=1) if COMPACT_CHARTS else dict(x=np.arange(1, months + 1))
+
+def _from_template(template, traces, quantize=None, **layout):
+    # A new figure from a template dict. `traces` holds the values to set on each of the template's
+    # traces in order; `layout` replaces top-level layout properties (e.g. annotations).
+    # `quantize` maps trace properties holding arrays (e.g. 'y') to the decimals they are
+    # rounded to in compact charts.
+    if COMPACT_CHARTS and quantize:
+        traces = [
+            {name: _compact_array(value, quantize[name]) if name in quantize and isinstance(value, np.ndarray) else value
+             for name, value in values.items()}
+            for values in traces
+        ]
+    data = [{**trace, **values} for trace, values in zip(template['data'], traces)]
+    return _figure_class()({'data': data, 'layout': {**template['layout'], **layout}})
+
+def _add_year_markers(fig, years):
+    # Dashed line and label for every year
+    line = dict(xref='x', yref='y domain', line=dict(dash='dash', color='gray'), opacity=0.7)
+    label = dict(y=1, yref='paper', showarrow=False, textangle=-90, yshift=28, font=dict(size=10))
+    texts = [f"{year} Year{'s' if year > 1 else ''}" for year in range(1, years + 1)]
+    if COMPACT_CHARTS:
+        # One path through every line, and the style of the labels set once in the theme
+        fig.update_layout(
+            shapes=[dict(type='path', path=''.join(f"M{year * 12},0L{year * 12},1" for year in range(1, years + 1)), **line)],
+            annotations=[dict(x=year * 12, text=text) for year, text in enumerate(texts, start=1)],
+            template_layout_annotationdefaults=label,
+        )
+    else:
+        fig.update_layout(
+            shapes=[dict(type='line', x0=year * 12, x1=year * 12, y0=0, y1=1, **line) for year in range(1, years + 1)],
+            annotations=[dict(x=year * 12, text=text, **label) for year, text in enumerate(texts, start=1)],
+        )
+
+@functools.lru_cache(maxsize=1)
+def _rent_breakdown_template():
+    go = _graph_objects()
+
+    # Define custom colors
+    custom_colors = ['#0068C9', '#83C5BE', '#EDF6F9', '#FFDDD2']
+
+    hover_text = [
+        "Monthly amount going towards paying off the loan principal.<br>If you decide to buy the house, this amount will be credited towards your purchase.",
+        "Monthly financing cost, calculated based on a 3.5% annual rate.<br>This represents the cost of the rent-to-own arrangement.",
+        "Monthly homeowner's insurance cost",
+        "Monthly property tax based on the home's value"
+    ]
+
+    fig = go.Figure(data=[go.Pie(
+        labels=["Principal", "Interest", "Insurance", "Property Tax"],
+        values=[0, 0, 0, 0],
+        hole=.5,
+        textinfo='label+value',
+        texttemplate='%{label}<br>$%{value:,.2f}',
+        hovertext=hover_text,
+        hoverinfo='text',
+        hoverlabel_align='left',
+        textfont=dict(size=14),
+        marker=dict(colors=custom_colors)
+    )])
+
+    # Add total monthly rent to the center of the pie chart
+    fig.add_annotation(
+        text="",
+        x=0.5,
+        y=0.5,
+        font_size=24,
+        showarrow=False,
+        font=dict(color="black")
+    )
+    fig.update_layout(
+        showlegend=False,
+        autosize=True,
+        margin=dict(l=0, r=0, t=0, b=0),
+        title_text=''
+    )
+
+    return _template_dict(fig)
+
+def create_rent_breakdown_chart(breakdown, monthly_rent):
+    template = _rent_breakdown_template()
+    center_label = {**template['layout']['annotations'][0], 'text': f"<b>${monthly_rent:,.2f}</b>/mo"}
+    return _from_template(
+        template,
+        [dict(labels=list(breakdown.keys()), values=list(breakdown.values()))],
+        annotations=[center_label]
+    )
+
+@functools.lru_cache(maxsize=32)
+def _equity_area_template(years, with_bands):
+    go = _graph_objects()
+    x = _months_axis(years * 12)
+
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(
+        **x,
+        mode='lines',
+        # line=dict(width=0.5, color='#0068C9'),
+        stackgroup='one',
+        name='Principal',
+        hovertemplate='$%{y:,.2f}'
+    ))
+    fig.add_trace(go.Scatter(
+        **x,
+        mode='lines',
+        # line=dict(width=0.5, color='#003B72'),
+        stackgroup='one',
+        name='Appreciation',
+        hovertemplate='$%{y:,.2f}'
+    ))
+    # Add new trace for total equity
+    fig.add_trace(go.Scatter(
+        **x,
+        mode='lines',
+        line=dict(width=2, color='#E29578'),
+        name='Total Equity',
+        hovertemplate='$%{y:,.2f}'
+    ))
+
+    # Add the simulated P10-P90 range and median of total equity
+    if with_bands:
+        fig.add_trace(go.Scatter(
+            **x,
+            mode='lines',
+            line=dict(width=0),
+            name='P10',
+            showlegend=False,
+            hovertemplate='P10: $%{y:,.0f}'
+        ))
+        fig.add_trace(go.Scatter(
+            **x,
+            mode='lines',
+            line=dict(width=0),
+            fill='tonexty',
+            fillcolor='rgba(226, 149, 120, 0.2)',
+            name='P10-P90 Range',
+            hovertemplate='P90: $%{y:,.0f}'
+        ))
+        fig.add_trace(go.Scatter(
+            **x,
+            mode='lines',
+            line=dict(width=1, color='#E29578', dash='dot'),
+            name='Median (Simulated)',
+            hovertemplate='P50: $%{y:,.0f}'
+        ))
+
+    # Add vertical lines for each year
+    _add_year_markers(fig, years)
+    fig.update_layout(
+        title='Equity Build-up Over Time',
+        xaxis_title='Months',
+        yaxis_title='Equity ($)',
+        legend=dict(x=0.01, y=0.99, bgcolor='rgba(255, 255, 255, 0.8)'),
+        hovermode='x unified'
+    )
+
+    return _template_dict(fig)
+
+def _equity_traces(principal_over_time, appreciation_over_time, equity_bands):
+    total_equity = np.add(principal_over_time, appreciation_over_time)
+    traces = [dict(y=principal_over_time), dict(y=appreciation_over_time), dict(y=total_equity)]
+    if equity_bands is not None:
+        low, median, high = (equity_bands[p] for p in sorted(equity_bands))
+        traces += [dict(y=low), dict(y=high), dict(y=median)]
+    return traces
+
+def create_equity_area_chart(principal_over_time, appreciation_over_time, years, equity_bands=None):
+    traces = _equity_traces(principal_over_time, appreciation_over_time, equity_bands)
+    return _from_template(_equity_area_template(years, equity_bands is not None), traces, quantize={'y': 2})
+
+# The *_by_year charts hold the schedule for every horizon up to the longest one, with a Plotly
+# slider to pick the number of years. A shorter schedule is a prefix of a longer one, so each
+# slider step only changes what's shown and switching years never goes back to the server.
+
+def _year_slider(steps, years, method):
+    # One step per year (`steps` holds each step's args), starting at `years`
+    return [dict(
+        active=years - 1,
+        currentvalue=dict(prefix='Years: '),
+        pad=dict(t=50),
+        steps=[dict(label=str(year), method=method, args=args) for year, args in enumerate(steps, start=1)],
+    )]
+
+def create_equity_area_chart_by_year(principal_over_time, appreciation_over_time, years, equity_bands=None):
+    # The schedules cover the longest horizon; each step zooms the axes to one horizon and
+    # puts the equity built by then in the title
+    template = _equity_area_template(len(principal_over_time) // 12, equity_bands is not None)
+    traces = _equity_traces(principal_over_time, appreciation_over_time, equity_bands)
+    total_equity = traces[2]['y']
+    lowest = np.minimum.accumulate(np.min([trace['y'] for trace in traces], axis=0))
+    highest = np.maximum.accumulate(np.max([trace['y'] for trace in traces], axis=0))
+
+    xaxis, yaxis, title = (template['layout'].get(name, {}) for name in ('xaxis', 'yaxis', 'title'))
+    views = []
+    for year in range(1, len(principal_over_time) // 12 + 1):
+        month = year * 12
+        bottom, top = float(min(lowest[month - 1], 0)), float(highest[month - 1])
+        views.append({
+            'xaxis.range': [1, month],
+            'yaxis.range': [bottom, top + (top - bottom) * 0.05],
+            'title.text': f"{title.get('text', '')}: ${total_equity[month - 1]:,.0f} after {year} Year{'s' if year > 1 else ''}",
+        })
+
+    view = views[years - 1]
+    return _from_template(
+        template,
+        traces,
+        quantize={'y': 2},
+        xaxis={**xaxis, 'range': view['xaxis.range']},
+        yaxis={**yaxis, 'range': view['yaxis.range']},
+        title={**title, 'text': view['title.text']},
+        sliders=_year_slider([[view] for view in views], years, 'relayout'),
+    )
+
+@functools.lru_cache(maxsize=32)
+def _comparison_line_template(years):
+    go = _graph_objects()
+    months = _months_axis(years * 12)
+    # WebGL keeps long lines smooth to hover. The equity chart stays SVG, as WebGL can't stack areas.
+    scatter = go.Scattergl if COMPACT_CHARTS and years * 12 > WEBGL_AFTER_MONTHS else go.Scatter
+
+    fig = go.Figure()
+
+    fig.add_trace(scatter(**months, mode='lines', name='Rent to Own - Spent', line=dict(color='#0068C9')))
+    fig.add_trace(scatter(**months, mode='lines', name='Rent to Own - Saved', line=dict(color='#83C5BE')))
+    fig.add_trace(scatter(**months, mode='lines', name='Traditional Rent - Spent', line=dict(color='#E29578')))
+    fig.add_trace(scatter(**months, y=np.zeros(years * 12, dtype=np.int8), mode='lines', name='Traditional Rent - Saved', line=dict(color='#FFDDD2')))
+
+    # Add vertical lines for each year
+    _add_year_markers(fig, years)
+    fig.update_layout(
+        title='Cumulative Spent and Saved Over Time',
+        xaxis_title='Months',
+        yaxis_title='Amount ($)',
+        legend=dict(x=0.01, y=0.99, bgcolor='rgba(255, 255, 255, 0.8)'),
+        hovermode='x unified'
+    )
+
+    return _template_dict(fig)
+
+def create_comparison_line_chart(rent_to_own_spent, rent_to_own_saved, traditional_rent_spent, years):
+    return _from_template(
+        _comparison_line_template(years),
+        [dict(y=rent_to_own_spent), dict(y=rent_to_own_saved), dict(y=traditional_rent_spent), {}],
+        quantize={'y': 2}
+    )
+
+@functools.lru_cache(maxsize=1)
+def _comparison_bar_template():
+    go = _graph_objects()
+
+    categories = ['Rent to Own', 'Traditional Renting']
+    fig = go.Figure(data=[
+        go.Bar(name='True Cost', x=categories, marker_color='#0068C9', textposition='inside'),
+        go.Bar(name='Total Equity', x=categories, marker_color='#83C5BE', textposition='inside')
+    ])
+
+    fig.update_layout(
+        title='True Cost vs Total Equity Comparison',
+        xaxis_title='Housing Option',
+        yaxis_title='Amount ($)',
+        barmode='stack',
+        legend=dict(
+            x=1.02,
+            y=1,
+            xanchor='left',
+            yanchor='top',
+            bgcolor='rgba(255, 255, 255, 0.8)'
+        ),
+        hovermode='x unified',
+        margin=dict(r=150, t=100, b=100)
+    )
+
+    # Update text position and font
+    fig.update_traces(textfont_size=12, textangle=0, cliponaxis=False, textfont_color='white')
+
+    # Total amount annotation on top of each bar, filled in per chart
+    for category in categories:
+        fig.add_annotation(
+            x=category,
+            showarrow=False,
+            yshift=10,
+            font=dict(size=14, color="black"),
+        )
+
+    return _template_dict(fig)
+
+def _comparison_bars(template, rent_to_own_spent, traditional_rent_spent, total_equity):
+    # Trace values and annotations for the totals spent by the end of the horizon
+    true_costs = [rent_to_own_spent - total_equity, traditional_rent_spent]
+    total_equity_values = [total_equity, 0]  # Traditional renting has 0 equity
+
+    # Add total amount annotation on top of each bar
+    annotations = []
+    for i, annotation in enumerate(template['layout']['annotations']):
+        total_amount = true_costs[i] + total_equity_values[i]
+        annotations.append({**annotation, 'y': total_amount, 'text': f'Total Spent: ${total_amount:,.0f}'})
+
+    traces = [
+        dict(y=true_costs, text=[f'True Cost:<br>${cost:,.0f}' for cost in true_costs]),
+        dict(y=total_equity_values, text=[f'Total Equity:<br>${equity:,.0f}' for equity in total_equity_values]),
+    ]
+    return traces, annotations
+
+def create_comparison_bar_chart(rent_to_own_spent, rent_to_own_saved, traditional_rent_spent, total_equity):
+    template = _comparison_bar_template()
+    traces, annotations = _comparison_bars(template, rent_to_own_spent[-1], traditional_rent_spent[-1], total_equity)
+    return _from_template(template, traces, annotations=annotations)
+
+def create_comparison_bar_chart_by_year(rent_to_own_spent, traditional_rent_spent, total_equity_over_time, years):
+    # The cumulative values and equity cover the longest horizon; each step swaps in the totals
+    # at the end of one horizon
+    template = _comparison_bar_template()
+    steps = []
+    for year in range(1, len(rent_to_own_spent) // 12 + 1):
+        month = year * 12
+        traces, annotations = _comparison_bars(template, rent_to_own_spent[month - 1], traditional_rent_spent[month - 1], total_equity_over_time[month - 1])
+        steps.append([{'y': [trace['y'] for trace in traces], 'text': [trace['text'] for trace in traces]}, {'annotations': annotations}])
+
+    month = years * 12
+    traces, annotations = _comparison_bars(template, rent_to_own_spent[month - 1], traditional_rent_spent[month - 1], total_equity_over_time[month - 1])
+    return _from_template(template, traces, annotations=annotations, sliders=_year_slider(steps, years, 'update'))
+
+# Axis titles for the inputs a break-even grid can sweep or a tornado chart moves. Inputs titled
+# in % are fractions and get scaled.
+_GRID_AXIS_TITLES = {
+    'appreciation_rate': 'Annual Appreciation Rate (%)',
+    'mortgage_rate': 'Mortgage Rate (%)',
+    'yearly_rent_increase': 'Yearly Rent Increase (%)',
+    'investment_return_rate': 'Investment Return Rate (%)',
+    'property_tax_rate': 'Property Tax Rate (%)',
+    'closing_costs_rate': 'Closing Costs & Inspections (%)',
+    'marginal_tax_rate': 'Marginal Tax Rate (%)',
+    'pmi_rate': 'PMI Rate (%)',
+    'insurance_cost': 'Monthly Home Insurance ($)',
+    'down_payment_ratio': 'Down Payment (%)',
+    'price_to_rent_ratio': 'Price-to-Rent Ratio',
+    'house_price': 'Home Price ($)',
+    'years': 'Years Held',
+}
+
+def _grid_axis(name, values):
+    values = np.asarray(values, dtype=float)
+    return values * 100 if _GRID_AXIS_TITLES.get(name, '').endswith('(%)') else values
+
+@functools.lru_cache(maxsize=16)
+def _breakeven_heatmap_template(x_name, y_name, other, years):
+    go = _graph_objects()
+    other_label = {'traditional': 'a Traditional Mortgage', 'renting': 'Traditional Renting'}[other]
+    x_title = _GRID_AXIS_TITLES.get(x_name, x_name)
+    y_title = _GRID_AXIS_TITLES.get(y_name, y_name)
+
+    fig = go.Figure(go.Heatmap(
+        colorscale='RdBu_r',
+        zmid=0,
+        colorbar=dict(title=dict(text='Rent to Own<br>costs more ($)')),
+        hovertemplate=f'{x_title}: %{{x:,.2f}}<br>{y_title}: %{{y:,.2f}}<br>Rent to own costs $%{{z:,.0f}} more<br>Cheaper option changes: %{{text}}<extra></extra>'
+    ))
+    fig.update_layout(
+        title=f'True Cost of Rent to Own vs {other_label} after {years} Years',
+        xaxis_title=x_title,
+        yaxis_title=y_title,
+        margin=dict(t=60)
+    )
+
+    return _template_dict(fig)
+
+def create_breakeven_heatmap(grid, other='traditional'):
+    # `grid` comes from breakeven.breakeven_grid; `other` is 'traditional' or 'renting'.
+    # Blue cells are where rent-to-own ends up cheaper, red where it costs more.
+    breakeven_months = np.asarray(grid[f'{other}_breakeven'])
+    text = [["never" if np.isnan(month) else f"month {month:.0f}" for month in row] for row in breakeven_months]
+    return _from_template(
+        _breakeven_heatmap_template(grid['x_name'], grid['y_name'], other, grid['years']),
+        [dict(x=_grid_axis(grid['x_name'], grid['x']), y=_grid_axis(grid['y_name'], grid['y']), z=grid[f'{other}_delta'], text=text)],
+        quantize={'z': 0}
+    )
+
+@functools.lru_cache(maxsize=8)
+def _tornado_template(cost, years):
+    go = _graph_objects()
+    cost_label = {'rent_to_own_cost': 'Rent to Own', 'traditional_cost': 'a Traditional Mortgage', 'renting_cost': 'Traditional Renting'}[cost]
+
+    hovertemplate = '%{y}<br>%{fullData.name}: %{x:$,.0f}<extra></extra>'
+    fig = go.Figure([
+        go.Bar(orientation='h', marker_color='#83C5BE', hovertemplate=hovertemplate),
+        go.Bar(orientation='h', marker_color='#0068C9', hovertemplate=hovertemplate),
+    ])
+    fig.update_layout(
+        title=f'What Moves the True Cost of {cost_label} after {years} Years',
+        xaxis_title='Change in true cost ($)',
+        # Side by side rather than overlaid, since both directions can move a cost the same way
+        barmode='group',
+        legend=dict(orientation='h', x=0, y=-0.2),
+        margin=dict(t=60, l=220)
+    )
+    fig.add_vline(x=0, line_color='gray')
+
+    return _template_dict(fig)
+
+def create_tornado_chart(result, years, cost='rent_to_own_cost'):
+    # `result` comes from sensitivity.sensitivity (or sensitivity.total for a portfolio); `cost` is
+    # one of sensitivity.COSTS. Each input is a row with the change in `cost` when it moves down
+    # and up, with the inputs that move it the most at the top.
+    low, high = np.asarray(result[f'{cost}_low']), np.asarray(result[f'{cost}_high'])
+    # Plotly draws the first category at the bottom
+    order = np.argsort(np.maximum(np.abs(low), np.abs(high)), kind='stable')
+    labels = [_GRID_AXIS_TITLES.get(result['inputs'][i], result['inputs'][i]) for i in order]
+    shift = f"{result['shift']:.0%}"
+    return _from_template(
+        _tornado_template(cost, years),
+        [dict(x=low[order], y=labels, name=f'Setting {shift} lower'), dict(x=high[order], y=labels, name=f'Setting {shift} higher')],
+        quantize={'x': 0}
+    )
+
+@functools.lru_cache(maxsize=4)
+def _cost_surface_template(per_year):
+    go = _graph_objects()
+    cost_label = 'True cost per year' if per_year else 'True cost'
+
+    fig = go.Figure([
+        go.Heatmap(
+            colorscale='Blues',
+            colorbar=dict(title=dict(text=f'{cost_label} ($)')),
+            hovertemplate=f"Down payment: %{{x:.0f}}%<br>Years held: %{{y}}<br>{cost_label}: %{{z:$,.0f}}<extra></extra>"
+        ),
+        go.Scatter(
+            mode='markers',
+            marker=dict(symbol='star', size=16, color='#FF4B4B', line=dict(color='white', width=1)),
+            name='Lowest',
+            hovertemplate=f"Lowest {cost_label.lower()}: %{{customdata:$,.0f}}<extra></extra>"
+        ),
+    ])
+    fig.update_layout(
+        title=f"{cost_label} of a Traditional Mortgage",
+        xaxis_title=_GRID_AXIS_TITLES['down_payment_ratio'],
+        yaxis_title=_GRID_AXIS_TITLES['years'],
+        showlegend=False,
+        margin=dict(t=60)
+    )
+
+    return _template_dict(fig)
+
+def create_cost_surface_chart(result, per_year=False):
+    # The traditional mortgage's true cost (or true cost per year held) for every holding period
+    # and down payment in `result`, from optimizer.optimize, with a star on the lowest
+    surface = np.asarray(result['traditional_cost'])
+    years = np.asarray(result['years'])
+    best = result['traditional_best_per_year' if per_year else 'traditional_best']
+    return _from_template(
+        _cost_surface_template(per_year),
+        [
+            dict(x=_grid_axis('down_payment_ratio', result['down_payment_ratio']), y=years, z=surface / years[:, np.newaxis] if per_year else surface),
+            dict(x=[best['down_payment_ratio'] * 100], y=[best['years']], customdata=[best['cost_per_year'] if per_year else best['cost']]),
+        ],
+        quantize={'z': 0}
+    )
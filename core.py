@@ -0,0 +1,313 @@
+import numpy as np
+import numpy_financial as npf
+
+# Define constants at the top of the file
+DEFAULT_INTEREST_RATE = 0.0225
+DOWN_PAYMENT_RATIO = 0.0
+INSURANCE_FIXED = 150
+MANAGEMENT_FEE_RATE = 0.08
+LOAN_TERM_YEARS = 30
+DEFAULT_YEARS = 4
+MAX_YEARS = 7  # Longest horizon the years sliders offer
+
+# Defaults for the inputs in the sidebar
+DEFAULT_HOUSE_PRICE = 400000.0
+DEFAULT_MORTGAGE_RATE = 0.065  # Used when the current rate can't be fetched
+DEFAULT_APPRECIATION_RATE = 0.035
+DEFAULT_CLOSING_COSTS_RATE = 0.01
+DEFAULT_PROPERTY_TAX_RATE = 0.01122
+DEFAULT_YEARLY_RENT_INCREASE = 0.04
+DEFAULT_INVESTMENT_RETURN_RATE = 0.05
+DEFAULT_PRICE_TO_RENT_RATIO = 19
+DEFAULT_MARGINAL_TAX_RATE = 0.16
+DEFAULT_PMI_RATE = 0.015
+
+def _scalar(value):
+    # Plain floats for scalar inputs, arrays for array inputs
+    return float(value) if np.ndim(value) == 0 else value
+
+def _balance(monthly_rate, payment, loan_amount, months):
+    # Loan balance left after `months` level payments
+    growth = (1 + monthly_rate) ** months
+    with np.errstate(divide='ignore', invalid='ignore'):
+        paid = np.where(monthly_rate == 0, payment * months, payment * (growth - 1) / monthly_rate)
+    return loan_amount * growth - paid
+
+def cumulative_principal(interest_rate, loan_term_years, loan_amount, start_month, end_month):
+    # Principal repaid on a fully amortizing loan from start_month through end_month (1-based,
+    # inclusive), like cumprinc. Closed-form, so any window costs the same; inputs can be arrays.
+    monthly_rate = np.asarray(interest_rate, dtype=float) / 12
+    payment = -npf.pmt(monthly_rate, np.asarray(loan_term_years) * 12, loan_amount)
+    return _balance(monthly_rate, payment, loan_amount, np.asarray(start_month) - 1) - _balance(monthly_rate, payment, loan_amount, end_month)
+
+def cumulative_interest(interest_rate, loan_term_years, loan_amount, start_month, end_month):
+    # Interest paid over the same window, like cumipmt: the payments minus the principal they repaid
+    monthly_rate = np.asarray(interest_rate, dtype=float) / 12
+    payment = -npf.pmt(monthly_rate, np.asarray(loan_term_years) * 12, loan_amount)
+    months = np.asarray(end_month) - np.asarray(start_month) + 1
+    return payment * months - cumulative_principal(interest_rate, loan_term_years, loan_amount, start_month, end_month)
+
+def cumulative_rent(initial_rental_payment, yearly_rent_increase, months):
+    # Rent paid over the first `months` months when it goes up once a year: a geometric series
+    # over the full years plus the remaining months at the last year's rent.
+    full_years, extra_months = np.divmod(np.asarray(months), 12)
+    growth = (1 + np.asarray(yearly_rent_increase, dtype=float)) ** full_years
+    with np.errstate(divide='ignore', invalid='ignore'):
+        full_years_factor = np.where(yearly_rent_increase == 0, full_years, (growth - 1) / yearly_rent_increase)
+    return initial_rental_payment * (12 * full_years_factor + extra_months * growth)
+
+def calculate_rent_to_own(house_price, closing_costs_rate, property_tax_rate, appreciation_rate, insurance_cost, interest_rate, include_closing_costs=True):
+    # First, calculate total purchase price (i.e., loan amount).
+    # If 'include_closing_costs' is True, add those to the purchase price.
+    # (Multiplying by the flag keeps this working for arrays of flags in batch mode.)
+    effective_closing_costs_rate = closing_costs_rate * include_closing_costs
+    closing_costs = house_price * effective_closing_costs_rate
+    total_purchase_price = house_price + closing_costs
+
+    # 1) Take 2.25% of the total purchase price for the interest (annual). Convert to monthly.
+    monthly_interest = (total_purchase_price * DEFAULT_INTEREST_RATE) / 12
+
+    # 2) Add insurance cost (monthly).
+    monthly_insurance = insurance_cost
+
+    # 3) Add property tax (monthly).
+    monthly_property_tax = (house_price * property_tax_rate) / 12
+
+    # 4) We want principal to be 44% of the total monthly payment.
+    #    Let x = monthly_payment. Then principal is 0.44 * x, and the rest is interest + insurance + property tax.
+    #    So x = (monthly_interest + monthly_insurance + monthly_property_tax) + 0.44 * x
+    #    => x - 0.44x = monthly_interest + monthly_insurance + monthly_property_tax
+    #    => 0.56x = monthly_interest + monthly_insurance + monthly_property_tax
+    #    => x = (monthly_interest + monthly_insurance + monthly_property_tax) / 0.56
+    monthly_payment = (
+        monthly_interest + monthly_insurance + monthly_property_tax
+    ) / 0.56
+    monthly_principal = 0.44 * monthly_payment
+
+    # Prepare a breakdown for clarity.
+    breakdown = {
+        "Principal": monthly_principal,
+        "Interest": monthly_interest,
+        "Insurance": monthly_insurance,
+        "Property Tax": monthly_property_tax,
+    }
+
+    # We'll still return interest_rate, LOAN_TERM_YEARS for compatibility in the code that calls this function,
+    # but note that we are overriding the interest calculation with a fixed 2.25% here.
+    return house_price, monthly_payment, breakdown, interest_rate, LOAN_TERM_YEARS
+
+def calculate_monthly_breakdown(loan_amount, interest_rate, loan_term_years, month, is_rent_to_own=False):
+    if is_rent_to_own:
+        # Use the same logic as the rent-to-own calculation, but per month:
+        # 1) Calculate monthly interest using DEFAULT_INTEREST_RATE.
+        monthly_interest = (loan_amount * DEFAULT_INTEREST_RATE) / 12
+        
+        # 2) Ensure principal is 44% of the total monthly payment:
+        #    Let monthly_payment = x.
+        #    monthly_interest occupies 56% of x (since principal is 44%).
+        #    x = monthly_interest / 0.56
+        monthly_payment = monthly_interest / 0.56
+        monthly_principal = 0.44 * monthly_payment
+
+        return monthly_principal, monthly_interest
+
+    else:
+        # Traditional mortgage calculation (unchanged)
+        monthly_rate = interest_rate / 12
+        num_payments = loan_term_years * 12
+        monthly_payment = -npf.pmt(monthly_rate, num_payments, loan_amount)
+
+        # Calculate remaining balance after (month - 1) payments
+        remaining_balance = npf.fv(monthly_rate, month - 1, monthly_payment, -loan_amount)
+
+        # Interest is balance × monthly_rate
+        interest = remaining_balance * monthly_rate
+        # Anything left after interest becomes principal
+        principal = monthly_payment - interest
+
+        return principal, interest
+
+def calculate_estimated_equity(house_price, appreciation_rate, years):
+    future_value = house_price * (1 + appreciation_rate) ** years
+    return future_value - house_price
+
+def calculate_schedule(house_price, loan_amount, appreciation_rate, years, initial_rental_payment=0.0, yearly_rent_increase=0.0, mortgage_rate=None, mortgage_loan=None):
+    # Build the whole monthly schedule as arrays in one pass instead of looping month by month.
+    # Scalar inputs give 1-D arrays over months; array inputs broadcast against a trailing month axis.
+    # When `years` differs per row the schedule runs to the longest horizon.
+    months = np.arange(1, int(np.max(years)) * 12 + 1)
+    house_price = np.asarray(house_price, dtype=float)[..., np.newaxis]
+    loan_amount = np.asarray(loan_amount, dtype=float)[..., np.newaxis]
+    appreciation_rate = np.asarray(appreciation_rate, dtype=float)[..., np.newaxis]
+    initial_rental_payment = np.asarray(initial_rental_payment, dtype=float)[..., np.newaxis]
+    yearly_rent_increase = np.asarray(yearly_rent_increase, dtype=float)[..., np.newaxis]
+    shape = np.broadcast_shapes(house_price.shape, loan_amount.shape, appreciation_rate.shape, initial_rental_payment.shape, yearly_rent_increase.shape, months.shape)
+
+    # Rent-to-own principal and interest are the same every month (see calculate_monthly_breakdown).
+    monthly_interest = (loan_amount * DEFAULT_INTEREST_RATE) / 12
+    monthly_principal = 0.44 * (monthly_interest / 0.56)
+    principal = np.broadcast_to(monthly_principal, shape)
+    interest = np.broadcast_to(monthly_interest, shape)
+
+    # Appreciation is compounded on fractional years, the renter gets 50% of it.
+    appreciation = house_price * ((1 + appreciation_rate) ** (months / 12) - 1)
+
+    # Traditional rent goes up once a year.
+    rent = initial_rental_payment * (1 + yearly_rent_increase) ** ((months - 1) // 12)
+
+    schedule = {
+        'month': months,
+        'principal': principal,
+        'interest': interest,
+        'cumulative_principal': monthly_principal * months,
+        'cumulative_interest': monthly_interest * months,
+        'appreciation': appreciation,
+        'appreciation_share': appreciation * 0.5,
+        'rent': rent,
+        'cumulative_rent': np.cumsum(np.broadcast_to(rent, shape), axis=-1),
+    }
+    schedule['equity'] = schedule['cumulative_principal'] + schedule['appreciation_share']
+
+    if mortgage_rate is not None:
+        # Traditional amortization, with every month's remaining balance computed at once.
+        mortgage_loan = loan_amount if mortgage_loan is None else np.asarray(mortgage_loan, dtype=float)[..., np.newaxis]
+        monthly_rate = np.asarray(mortgage_rate, dtype=float)[..., np.newaxis] / 12
+        mortgage_payment = -npf.pmt(monthly_rate, LOAN_TERM_YEARS * 12, mortgage_loan)
+        remaining_balance = npf.fv(monthly_rate, months - 1, mortgage_payment, -mortgage_loan)
+        schedule['mortgage_interest'] = remaining_balance * monthly_rate
+        schedule['mortgage_principal'] = mortgage_payment - schedule['mortgage_interest']
+        schedule['mortgage_balance'] = remaining_balance - schedule['mortgage_principal']
+
+    return schedule
+
+def calculate_equity_breakdown(house_price, loan_amount, interest_rate, loan_term_years, appreciation_rate, years):
+    # Closed-form totals at the horizon; rent-to-own principal is the same every month
+    monthly_principal, _ = calculate_monthly_breakdown(loan_amount, interest_rate, loan_term_years, 1, is_rent_to_own=True)
+    total_principal = _scalar(monthly_principal * np.asarray(years) * 12)
+    renter_share_appreciation = _scalar(calculate_estimated_equity(house_price, appreciation_rate, years) * 0.5)
+
+    return total_principal, renter_share_appreciation
+
+def calculate_equity_over_time(house_price, loan_amount, interest_rate, loan_term_years, appreciation_rate, years):
+    schedule = calculate_schedule(house_price, loan_amount, appreciation_rate, years)
+    return schedule['cumulative_principal'], schedule['appreciation_share']
+
+def calculate_cumulative_values(house_price, monthly_rent, years, appreciation_rate, initial_rental_payment, yearly_rent_increase):
+    schedule = calculate_schedule(house_price, house_price, appreciation_rate, years, initial_rental_payment, yearly_rent_increase)
+
+    rent_to_own_spent = monthly_rent * schedule['month']
+    rent_to_own_saved = schedule['principal'] + schedule['appreciation_share']
+    traditional_rent_spent = schedule['cumulative_rent']
+
+    return rent_to_own_spent, rent_to_own_saved, traditional_rent_spent
+
+def calculate_comparison_values(house_price, property_tax_rate, appreciation_rate, years, monthly_rent, total_equity, down_payment_ratio, price_to_rent_ratio, investment_return_rate, marginal_tax_rate, mortgage_rate, pmi_rate, insurance_cost, yearly_rent_increase):
+    traditional_loan = house_price * (1 - down_payment_ratio)
+    mortgage_payment = npf.pmt(mortgage_rate/12, LOAN_TERM_YEARS*12, -traditional_loan)
+    monthly_insurance = insurance_cost
+    monthly_property_tax = (house_price * property_tax_rate) / 12
+    monthly_pmi = np.where(down_payment_ratio < 0.2, (traditional_loan * pmi_rate) / 12, 0)
+    traditional_payment = mortgage_payment + monthly_insurance + monthly_property_tax + monthly_pmi
+
+    initial_rental_payment = house_price / (price_to_rent_ratio * 12)
+    rental_equity = 0
+
+    # Totals over the horizon are closed-form, so a 30-year comparison costs the same as a 1-year one
+    horizon = np.asarray(years) * 12
+    traditional_principal = cumulative_principal(mortgage_rate, LOAN_TERM_YEARS, traditional_loan, 1, horizon)
+    traditional_appreciation = calculate_estimated_equity(house_price, appreciation_rate, years)
+    traditional_equity = traditional_principal + traditional_appreciation + house_price * down_payment_ratio
+
+    # Calculate total rent paid with yearly increases
+    total_rent = cumulative_rent(initial_rental_payment, yearly_rent_increase, horizon)
+
+    down_payment = house_price * down_payment_ratio
+
+    rent_to_own_spent = monthly_rent * years * 12
+    traditional_spent = traditional_payment * years * 12 + down_payment
+    renting_spent = total_rent
+
+    traditional_opportunity_cost = down_payment * ((1 + investment_return_rate) ** years - 1)
+    rent_to_own_opportunity_cost = 0
+    renting_opportunity_cost = 0
+
+    rent_to_own_cost = rent_to_own_spent - total_equity + rent_to_own_opportunity_cost
+    traditional_cost = traditional_spent - traditional_equity + traditional_opportunity_cost
+    renting_cost = renting_spent - rental_equity + renting_opportunity_cost
+
+    # Calculate total interest paid for traditional mortgage
+    total_interest_paid = cumulative_interest(mortgage_rate, LOAN_TERM_YEARS, traditional_loan, 1, horizon)
+    
+    # Calculate tax savings from mortgage interest deduction
+    tax_savings = total_interest_paid * marginal_tax_rate
+    
+    # Adjust the traditional cost to include tax savings
+    traditional_cost -= tax_savings
+
+    comparison_values = {
+        'mortgage_rate': mortgage_rate,
+        'traditional_payment': traditional_payment,
+        'traditional_equity': traditional_equity,
+        'rental_payment': initial_rental_payment,
+        'down_payment': down_payment,
+        'rent_to_own_spent': rent_to_own_spent,
+        'traditional_spent': traditional_spent,
+        'renting_spent': renting_spent,
+        'rent_to_own_cost': rent_to_own_cost,
+        'traditional_cost': traditional_cost,
+        'renting_cost': renting_cost,
+        'price_to_rent_ratio': price_to_rent_ratio,
+        'tax_savings': tax_savings,
+        'monthly_pmi': monthly_pmi,
+        'initial_rental_payment': initial_rental_payment,
+        'yearly_rent_increase': yearly_rent_increase,
+    }
+    return {key: _scalar(value) for key, value in comparison_values.items()}
+
+def calculate_cost_schedule(house_price, loan_amount, property_tax_rate, appreciation_rate, years, monthly_rent, down_payment_ratio, price_to_rent_ratio, investment_return_rate, marginal_tax_rate, mortgage_rate, pmi_rate, insurance_cost, yearly_rent_increase, include_opportunity_cost=True, include_tax_deductions=True):
+    # The true cost of each option had you stopped after each month, as running totals over the schedule.
+    # At month years * 12 this is what calculate_comparison_values and adjust_comparison_values give
+    # for those years, with the rent-to-own equity built on `loan_amount` like the equity chart.
+    # Scenario inputs can be arrays; the results then have a trailing month axis.
+    def per_month(value):
+        return np.asarray(value, dtype=float)[..., np.newaxis]
+
+    traditional_loan = house_price * (1 - down_payment_ratio)
+    mortgage_payment = npf.pmt(mortgage_rate/12, LOAN_TERM_YEARS*12, -traditional_loan)
+    monthly_pmi = np.where(down_payment_ratio < 0.2, (traditional_loan * pmi_rate) / 12, 0)
+    traditional_payment = mortgage_payment + insurance_cost + (house_price * property_tax_rate) / 12 + monthly_pmi
+    initial_rental_payment = house_price / (price_to_rent_ratio * 12)
+    down_payment = per_month(house_price * down_payment_ratio)
+
+    rent_to_own = calculate_schedule(house_price, loan_amount, appreciation_rate, years, initial_rental_payment, yearly_rent_increase)
+    months = rent_to_own['month']
+    traditional_principal = cumulative_principal(per_month(mortgage_rate), LOAN_TERM_YEARS, per_month(traditional_loan), 1, months)
+    traditional_interest = cumulative_interest(per_month(mortgage_rate), LOAN_TERM_YEARS, per_month(traditional_loan), 1, months)
+
+    costs = {
+        'rent_to_own_spent': per_month(monthly_rent) * months,
+        'traditional_spent': per_month(traditional_payment) * months + down_payment,
+        'renting_spent': rent_to_own['cumulative_rent'],
+        'traditional_equity': traditional_principal + rent_to_own['appreciation'] + down_payment,
+        'tax_savings': traditional_interest * per_month(marginal_tax_rate),
+    }
+    traditional_opportunity_cost = down_payment * ((1 + per_month(investment_return_rate)) ** (months / 12) - 1)
+    costs['rent_to_own_cost'] = costs['rent_to_own_spent'] - rent_to_own['equity']
+    costs['traditional_cost'] = costs['traditional_spent'] - costs['traditional_equity'] + traditional_opportunity_cost - costs['tax_savings']
+    costs['renting_cost'] = costs['renting_spent']
+
+    costs = adjust_comparison_values(costs, per_month(include_opportunity_cost), per_month(include_tax_deductions))
+    costs['month'] = months
+    return costs
+
+def adjust_comparison_values(comparison_values, include_opportunity_cost=True, include_tax_deductions=True):
+    # Recalculate costs based on toggle settings.
+    # The toggles are applied arithmetically so they can also be arrays of flags in batch mode.
+    comparison_values = dict(comparison_values)
+    exclude_opportunity_cost = np.logical_not(include_opportunity_cost)
+    exclude_tax_deductions = np.logical_not(include_tax_deductions)
+
+    comparison_values['traditional_cost'] = comparison_values['traditional_cost'] - exclude_opportunity_cost * (comparison_values['traditional_cost'] - comparison_values['traditional_spent'] + comparison_values['traditional_equity'])
+    comparison_values['traditional_cost'] = comparison_values['traditional_cost'] + exclude_tax_deductions * comparison_values['tax_savings']
+
+    return {key: _scalar(value) for key, value in comparison_values.items()}
@@ -0,0 +1,191 @@
+import argparse
+import io
+
+import numpy as np
+
+from core import (
+    DEFAULT_INTEREST_RATE, DEFAULT_HOUSE_PRICE,
+    calculate_rent_to_own, calculate_schedule, calculate_cost_schedule,
+)
+from batch import DEFAULTS, _column, add_input_arguments, read_table
+
+# The month-by-month ledger behind the charts, one row per scenario and month. Scenarios are
+# turned into rows a chunk at a time and each chunk is written out before the next one is built,
+# so memory stays flat however many scenarios and years are exported.
+ROWS_PER_CHUNK = 100000  # A few hundred 30-year scenarios
+
+# Payment components of rent-to-own are the ones in the rent breakdown chart; its equity is built
+# on the loan amount like the equity chart. Running totals (spent, equity, cost) are as of the end
+# of each month, the same as the cost comparison for that many months.
+LEDGER_COLUMNS = [
+    'scenario', 'month',
+    'rent_to_own_payment', 'rent_to_own_principal', 'rent_to_own_interest', 'rent_to_own_property_tax',
+    'rent_to_own_insurance', 'rent_to_own_appreciation_share', 'rent_to_own_spent', 'rent_to_own_equity',
+    'rent_to_own_cost',
+    'traditional_payment', 'traditional_principal', 'traditional_interest', 'traditional_property_tax',
+    'traditional_insurance', 'traditional_pmi', 'traditional_balance', 'traditional_appreciation',
+    'traditional_spent', 'traditional_equity', 'traditional_cost',
+    'renting_rent', 'renting_spent', 'renting_cost',
+]
+INTEGER_COLUMNS = ('scenario', 'month')
+
+def ledger_arrays(house_price, **overrides):
+    # The ledger for a batch of scenarios as (scenarios, months) arrays, plus the month numbers.
+    # Takes the same inputs as batch.score_arrays.
+    params = {**DEFAULTS, **overrides}
+    house_price = np.asarray(house_price, dtype=float)
+    years = np.asarray(params['years']).astype(int)
+    down_payment_ratio = np.asarray(params['down_payment_ratio'], dtype=float)
+
+    _, monthly_rent, breakdown, _, _ = calculate_rent_to_own(
+        house_price,
+        params['closing_costs_rate'],
+        params['property_tax_rate'],
+        params['appreciation_rate'],
+        params['insurance_cost'],
+        DEFAULT_INTEREST_RATE,
+        np.asarray(params['include_closing_costs'], dtype=bool)
+    )
+    loan_amount = house_price * (1 + np.asarray(params['closing_costs_rate']))
+    traditional_loan = house_price * (1 - down_payment_ratio)
+    initial_rental_payment = house_price / (np.asarray(params['price_to_rent_ratio']) * 12)
+
+    schedule = calculate_schedule(house_price, loan_amount, params['appreciation_rate'], years, initial_rental_payment, params['yearly_rent_increase'], mortgage_rate=params['mortgage_rate'], mortgage_loan=traditional_loan)
+    costs = calculate_cost_schedule(
+        house_price,
+        loan_amount,
+        params['property_tax_rate'],
+        params['appreciation_rate'],
+        years,
+        monthly_rent,
+        down_payment_ratio,
+        params['price_to_rent_ratio'],
+        params['investment_return_rate'],
+        params['marginal_tax_rate'],
+        params['mortgage_rate'],
+        params['pmi_rate'],
+        params['insurance_cost'],
+        params['yearly_rent_increase'],
+        params['include_opportunity_cost'],
+        params['include_tax_deductions']
+    )
+
+    def per_month(value):
+        return np.asarray(value, dtype=float)[..., np.newaxis]
+
+    property_tax = per_month(breakdown['Property Tax'])
+    insurance = per_month(breakdown['Insurance'])
+    pmi = per_month(np.where(down_payment_ratio < 0.2, (traditional_loan * np.asarray(params['pmi_rate'])) / 12, 0))
+    mortgage_payment = schedule['mortgage_principal'] + schedule['mortgage_interest']
+
+    return {
+        'month': schedule['month'],
+        'rent_to_own_payment': per_month(monthly_rent),
+        'rent_to_own_principal': per_month(breakdown['Principal']),
+        'rent_to_own_interest': per_month(breakdown['Interest']),
+        'rent_to_own_property_tax': property_tax,
+        'rent_to_own_insurance': insurance,
+        'rent_to_own_appreciation_share': schedule['appreciation_share'],
+        'rent_to_own_spent': costs['rent_to_own_spent'],
+        'rent_to_own_equity': schedule['equity'],
+        'rent_to_own_cost': costs['rent_to_own_cost'],
+        'traditional_payment': mortgage_payment + property_tax + insurance + pmi,
+        'traditional_principal': schedule['mortgage_principal'],
+        'traditional_interest': schedule['mortgage_interest'],
+        'traditional_property_tax': property_tax,
+        'traditional_insurance': insurance,
+        'traditional_pmi': pmi,
+        'traditional_balance': schedule['mortgage_balance'],
+        'traditional_appreciation': schedule['appreciation'],
+        'traditional_spent': costs['traditional_spent'],
+        'traditional_equity': costs['traditional_equity'],
+        'traditional_cost': costs['traditional_cost'],
+        'renting_rent': schedule['rent'],
+        'renting_spent': costs['renting_spent'],
+        'renting_cost': costs['renting_cost'],
+    }
+
+def _rows(ledger, years, first_scenario):
+    # Flatten (scenarios, months) arrays into 1-D columns, scenario by scenario, leaving out
+    # the months past each scenario's own horizon
+    months = ledger['month']
+    scenarios = np.arange(first_scenario, first_scenario + len(years))
+    shape = (len(years), len(months))
+    keep = months <= years[:, np.newaxis] * 12
+    columns = {
+        'scenario': np.broadcast_to(scenarios[:, np.newaxis], shape)[keep],
+        'month': np.broadcast_to(months, shape)[keep],
+    }
+    for name in LEDGER_COLUMNS[2:]:
+        columns[name] = np.broadcast_to(ledger[name], shape)[keep]
+    return columns
+
+def iter_ledger(house_price, rows_per_chunk=ROWS_PER_CHUNK, **overrides):
+    # Yields the ledger of every scenario as dicts of 1-D column arrays of about `rows_per_chunk`
+    # rows each. Every argument is a scalar or an array with one value per scenario.
+    params = {**DEFAULTS, **overrides}
+    house_price = np.atleast_1d(np.asarray(house_price, dtype=float))
+    count = house_price.size
+    years = np.broadcast_to(np.asarray(params['years']).astype(int), (count,))
+    step = max(1, rows_per_chunk // (int(years.max(initial=1)) * 12))
+
+    for start in range(0, count, step):
+        chunk = slice(start, start + step)
+        chunk_params = {name: value if np.ndim(value) == 0 else np.broadcast_to(value, (count,))[chunk] for name, value in params.items()}
+        yield _rows(ledger_arrays(house_price[chunk], **chunk_params), years[chunk], start)
+
+def write_csv(chunks, file):
+    # Write ledger chunks to an open text file; returns the number of rows written
+    formats = ['%d' if name in INTEGER_COLUMNS else '%.2f' for name in LEDGER_COLUMNS]
+    file.write(','.join(LEDGER_COLUMNS) + '\n')
+    rows = 0
+    for columns in chunks:
+        np.savetxt(file, np.column_stack([columns[name] for name in LEDGER_COLUMNS]), fmt=formats, delimiter=',')
+        rows += len(columns['month'])
+    return rows
+
+def write_parquet(chunks, path):
+    # One row group per chunk; needs pyarrow
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(name, pa.int64() if name in INTEGER_COLUMNS else pa.float64()) for name in LEDGER_COLUMNS])
+    rows = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        for columns in chunks:
+            writer.write_table(pa.table({name: columns[name] for name in LEDGER_COLUMNS}, schema=schema))
+            rows += len(columns['month'])
+    return rows
+
+def write_ledger(chunks, path):
+    if str(path).endswith('.parquet'):
+        return write_parquet(chunks, path)
+    with open(path, 'w', newline='') as f:
+        return write_csv(chunks, f)
+
+def ledger_csv(house_price, **overrides):
+    # The ledger of a single scenario as CSV bytes, for the download button in the app
+    buffer = io.StringIO()
+    write_csv(iter_ledger(house_price, **overrides), buffer)
+    return buffer.getvalue().encode()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write the month-by-month ledger of one or many rent-to-own scenarios.")
+    parser.add_argument("output", help="CSV or Parquet file to write the ledger to")
+    parser.add_argument("--input", help="CSV or Parquet file with a house_price column and optional per-row overrides, one scenario per row")
+    parser.add_argument("--house-price", type=float, default=DEFAULT_HOUSE_PRICE, help="House price of the single scenario exported without --input")
+    parser.add_argument("--rows-per-chunk", type=int, default=ROWS_PER_CHUNK, help="Ledger rows built and written together at a time")
+    add_input_arguments(parser, help_text="Default {name} for scenarios that don't set it (default: {default})")
+    args = vars(parser.parse_args(argv))
+
+    output_path, input_path, house_price, rows_per_chunk = args.pop('output'), args.pop('input'), args.pop('house_price'), args.pop('rows_per_chunk')
+    if input_path:
+        # The scenarios themselves are small; only the ledger is streamed
+        frame = read_table(input_path)
+        house_price = frame['house_price'].to_numpy(dtype=float)
+        args = {name: _column(frame, name, default) for name, default in args.items()}
+    rows = write_ledger(iter_ledger(house_price, rows_per_chunk=rows_per_chunk, **args), output_path)
+    print(f"Wrote {rows:,} ledger rows for {np.size(house_price):,} scenarios into {output_path}")
+
+if __name__ == "__main__":
+    main()
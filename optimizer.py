@@ -0,0 +1,93 @@
+import argparse
+
+import numpy as np
+
+from core import DEFAULT_HOUSE_PRICE, LOAN_TERM_YEARS
+from batch import add_input_arguments, score_arrays
+
+# The holding period and down payment that make each option cheapest for a scenario. Every
+# combination of the two is scored in one batch.score_arrays call, whose totals over the
+# horizon are closed-form, so the whole surface takes about a millisecond.
+HOLDING_YEARS = tuple(range(1, LOAN_TERM_YEARS + 1))
+DOWN_PAYMENT_RATIOS = tuple(np.round(np.linspace(0.0, 0.5, 51), 2))  # 0% to 50% in steps of 1%
+OPTIONS = ('rent_to_own', 'traditional', 'renting')
+# Searched over, so they can't be set as inputs
+SEARCH_INPUTS = ('years', 'down_payment_ratio')
+
+def _best(surface, objective, years, ratios):
+    i, j = np.unravel_index(np.argmin(objective), surface.shape)
+    return {
+        'years': int(years[i]),
+        'down_payment_ratio': float(ratios[j]),
+        'cost': float(surface[i, j]),
+        'cost_per_year': float(surface[i, j] / years[i]),
+    }
+
+def optimize(house_price=DEFAULT_HOUSE_PRICE, years=HOLDING_YEARS, down_payment_ratios=DOWN_PAYMENT_RATIOS, **inputs):
+    # The true cost of each option for every combination of `years` and `down_payment_ratios`,
+    # with everything else given as for batch.score_arrays, and the combinations with the
+    # lowest true cost and the lowest true cost per year held for each option. True costs
+    # mostly grow with the years held, so the lowest total is usually the shortest stay. Only
+    # the traditional mortgage depends on the down payment; rent-to-own and renting get the
+    # first (smallest) ratio.
+    #
+    # Returns the years and ratios searched, (len(years), len(ratios)) arrays of every
+    # `{option}_cost`, and `{option}_best` and `{option}_best_per_year` dicts with the years,
+    # down payment ratio, true cost and true cost per year of each option's best choice.
+    # `cheapest` and `cheapest_per_year` are the options whose best is lowest.
+    for name in SEARCH_INPUTS:
+        if name in inputs:
+            raise ValueError(f"'{name}' is searched over and can't be set for an optimization")
+    years = np.asarray(years, dtype=int)
+    ratios = np.asarray(down_payment_ratios, dtype=float)
+    years_grid, ratio_grid = np.meshgrid(years, ratios, indexing='ij')
+
+    scores = score_arrays(
+        np.full(years_grid.size, float(house_price)),
+        **inputs,
+        years=years_grid.ravel(),
+        down_payment_ratio=ratio_grid.ravel()
+    )
+
+    result = {'years': years, 'down_payment_ratio': ratios}
+    for option in OPTIONS:
+        surface = scores[f'{option}_cost'].reshape(years_grid.shape)
+        result[f'{option}_cost'] = surface
+        result[f'{option}_best'] = _best(surface, surface, years, ratios)
+        result[f'{option}_best_per_year'] = _best(surface, surface / years[:, np.newaxis], years, ratios)
+    result['cheapest'] = min(OPTIONS, key=lambda option: result[f'{option}_best']['cost'])
+    result['cheapest_per_year'] = min(OPTIONS, key=lambda option: result[f'{option}_best_per_year']['cost_per_year'])
+    return result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find the holding period and down payment with the lowest true cost for rent-to-own, a mortgage and renting.")
+    parser.add_argument("--house-price", type=float, default=DEFAULT_HOUSE_PRICE)
+    parser.add_argument("--per-year", action="store_true", help="Minimize the true cost per year held instead of the total")
+    parser.add_argument("--output", help="Also write the cost of every option for every holding period and down payment to this CSV or Parquet file")
+    add_input_arguments(parser, exclude=SEARCH_INPUTS)
+    args = vars(parser.parse_args(argv))
+
+    house_price, per_year, output_path = args.pop('house_price'), args.pop('per_year'), args.pop('output')
+    result = optimize(house_price, **args)
+    suffix = '_per_year' if per_year else ''
+
+    print(f"{'option':<12} {'years':>5} {'down payment':>13} {'true cost':>12} {'per year':>10}")
+    for option in OPTIONS:
+        best = result[f'{option}_best{suffix}']
+        print(f"{option:<12} {best['years']:>5} {best['down_payment_ratio']:>13.0%} {best['cost']:>12,.0f} {best['cost_per_year']:>10,.0f}")
+    print(f"Cheapest: {result['cheapest' + suffix]}")
+
+    if output_path:
+        import pandas as pd
+        from batch import write_table
+
+        years_grid, ratio_grid = np.meshgrid(result['years'], result['down_payment_ratio'], indexing='ij')
+        columns = {'years': years_grid.ravel(), 'down_payment_ratio': ratio_grid.ravel()}
+        for option in OPTIONS:
+            columns[f'{option}_cost'] = result[f'{option}_cost'].ravel()
+        frame = pd.DataFrame(columns)
+        write_table(frame, output_path)
+        print(f"Wrote {len(frame):,} combinations into {output_path}")
+
+if __name__ == "__main__":
+    main()
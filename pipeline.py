@@ -0,0 +1,77 @@
+import time
+from collections import namedtuple
+
+Stage = namedtuple("Stage", ["func", "inputs", "after"])
+
+class Pipeline:
+    # A graph of named stages. Each stage declares the page inputs it reads and the stages it
+    # runs after; it is called with those inputs and upstream results as keyword arguments.
+    #
+    # Results are memoized on the declared inputs (and, transitively, on those of upstream
+    # stages), so a rerun only recomputes the stages downstream of an input that changed.
+
+    def __init__(self):
+        self.stages = {}
+
+    def stage(self, name, inputs=(), after=()):
+        def register(func):
+            for upstream in after:
+                if upstream not in self.stages:
+                    raise ValueError(f"Stage '{name}' runs after unknown stage '{upstream}'")
+            self.stages[name] = Stage(func, tuple(inputs), tuple(after))
+            return func
+        return register
+
+    def run(self, memo, **values):
+        # `memo` is a dict that outlives the run, e.g. one kept in st.session_state
+        return PipelineRun(self, memo, values)
+
+class PipelineRun:
+    # One pass over the pipeline. Stages are resolved lazily when they are first looked up,
+    # so inputs that only exist further down the page can be added with update() before the
+    # stages that need them are requested.
+
+    def __init__(self, pipeline, memo, values):
+        self.pipeline = pipeline
+        self.memo = memo
+        self.values = dict(values)
+        self.keys = {}
+        self.results = {}
+        self.recomputed = []
+        self.reused = []
+        # (perf_counter start, seconds) spent on each stage itself, not counting upstream stages
+        self.timings = {}
+
+    def update(self, **values):
+        self.values.update(values)
+
+    def _key(self, name, stage):
+        try:
+            inputs = tuple(self.values[input_name] for input_name in stage.inputs)
+        except KeyError as e:
+            raise KeyError(f"Stage '{name}' needs input {e} which hasn't been set for this run") from None
+        return inputs, tuple(self.keys[upstream] for upstream in stage.after)
+
+    def __getitem__(self, name):
+        if name in self.results:
+            return self.results[name]
+
+        stage = self.pipeline.stages[name]
+        upstream_results = {upstream: self[upstream] for upstream in stage.after}
+        key = self._key(name, stage)
+
+        start = time.perf_counter()
+        cached = self.memo.get(name)
+        if cached is not None and cached[0] == key:
+            result = cached[1]
+            self.reused.append(name)
+        else:
+            inputs = dict(zip(stage.inputs, key[0]))
+            result = stage.func(**inputs, **upstream_results)
+            self.memo[name] = (key, result)
+            self.recomputed.append(name)
+        self.timings[name] = (start, time.perf_counter() - start)
+
+        self.keys[name] = key
+        self.results[name] = result
+        return result
@@ -0,0 +1,145 @@
+import json
+import os
+import threading
+import time
+
+from core import DEFAULT_MORTGAGE_RATE
+
+FRED_URL = "https://api.stlouisfed.org/fred/series/observations"
+FRED_API_KEY = os.environ.get("FRED_API_KEY")  # Without one the rate is never fetched
+REQUEST_TIMEOUT = 3  # seconds
+REFRESH_AFTER = 3600  # Refresh the rate in the background once it's an hour old
+RETRY_AFTER = 300  # After a failed refresh, wait this long before trying again
+CACHE_PATH = os.environ.get("RATE_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "mortgage_rate.json"))
+SHARED_KEY = "mortgage_rate"
+SHARED_TTL = 30 * 24 * 3600  # The last good rate is worth keeping long after it's due for a refresh
+
+_session = None
+
+def _get_session():
+    # One pooled session per process so refreshes reuse the same connection
+    global _session
+    if _session is None:
+        import requests
+        _session = requests.Session()
+    return _session
+
+def fetch_fred_rate(series_id="MORTGAGE30US", timeout=REQUEST_TIMEOUT):
+    if not FRED_API_KEY:
+        # RateProvider keeps serving the cached rate (or the default)
+        raise RuntimeError("Set FRED_API_KEY to fetch the mortgage rate from FRED")
+    params = {
+        'series_id': series_id,
+        'api_key': FRED_API_KEY,
+        'file_type': 'json',
+        'limit': 1,
+        'sort_order': 'desc',
+    }
+    response = _get_session().get(FRED_URL, params=params, timeout=timeout)
+    response.raise_for_status()
+    data = response.json()
+    return float(data['observations'][0]['value']) / 100
+
+def configured_default_rate():
+    # Set MORTGAGE_RATE_DEFAULT (e.g. 0.065) to change the rate used before anything has been fetched
+    return float(os.environ.get("MORTGAGE_RATE_DEFAULT", DEFAULT_MORTGAGE_RATE))
+
+class RateProvider:
+    # Serves the last good mortgage rate straight away and refreshes it in the background.
+    #
+    # The last good value is kept on disk so it survives restarts. `source` is any callable that
+    # returns the current rate as a fraction; it defaults to FRED and can be swapped out in tests.
+    # With a shared `store` (a cache_backend.CacheBackend), the rate is fetched once for every
+    # process using the store: a refresh takes a fresh enough rate from the store if another
+    # process has fetched one, and stores the rates it fetches itself.
+
+    def __init__(self, source=fetch_fred_rate, cache_path=CACHE_PATH, default=None, refresh_after=REFRESH_AFTER, store=None, retry_after=RETRY_AFTER):
+        self.source = source
+        self.cache_path = cache_path
+        self.default = configured_default_rate() if default is None else default
+        self.refresh_after = refresh_after
+        self.retry_after = min(retry_after, refresh_after)
+        self.store = store
+        self._lock = threading.Lock()
+        self._refreshing = None
+        self._attempted_at = 0.0
+        self._rate, self._fetched_at = max(self._load(), self._load_shared(), key=lambda cached: cached[1])
+
+    def _load(self):
+        if not self.cache_path:
+            return None, 0.0
+        try:
+            with open(self.cache_path) as f:
+                cached = json.load(f)
+            return float(cached['rate']), float(cached['fetched_at'])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None, 0.0
+
+    def _load_shared(self):
+        if self.store is None:
+            return None, 0.0
+        try:
+            cached = json.loads(self.store.get(SHARED_KEY))
+            return float(cached['rate']), float(cached['fetched_at'])
+        except (ValueError, KeyError, TypeError):
+            return None, 0.0
+
+    def _save(self, rate, fetched_at):
+        if not self.cache_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            # Write to a temporary file first so readers never see a half-written cache
+            tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({'rate': rate, 'fetched_at': fetched_at}, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError:
+            pass
+
+    @property
+    def is_stale(self):
+        return self._rate is None or time.time() - self._fetched_at > self.refresh_after
+
+    @property
+    def refresh_due(self):
+        # Stale, and not while backing off from a recent attempt (e.g. while FRED is down, so
+        # that every rerun of every session doesn't start a request of its own)
+        return self.is_stale and time.time() - self._attempted_at > self.retry_after
+
+    def current(self):
+        # The last known rate (or the default), without ever refreshing it
+        return self.default if self._rate is None else self._rate
+
+    def get(self):
+        # Never blocks on the network: returns the cached rate (or the default) and
+        # starts a background refresh if the cached value is missing or old.
+        if self.refresh_due:
+            self.refresh_in_background()
+        return self.current()
+
+    def refresh(self):
+        # Fetch synchronously. Returns True if a new rate was stored.
+        self._attempted_at = time.time()
+        rate, fetched_at = self._load_shared()
+        if rate is None or time.time() - fetched_at > self.refresh_after:
+            try:
+                rate = float(self.source())
+            except Exception:
+                # No network or a bad response: keep serving what we have
+                return False
+            fetched_at = time.time()
+            if self.store is not None:
+                self.store.set(SHARED_KEY, json.dumps({'rate': rate, 'fetched_at': fetched_at}).encode(), SHARED_TTL)
+        with self._lock:
+            self._rate, self._fetched_at = rate, fetched_at
+        self._save(rate, fetched_at)
+        return True
+
+    def refresh_in_background(self):
+        with self._lock:
+            if self._refreshing is not None and self._refreshing.is_alive():
+                return self._refreshing
+            self._refreshing = threading.Thread(target=self.refresh, name="mortgage-rate-refresh", daemon=True)
+            self._refreshing.start()
+            return self._refreshing
@@ -0,0 +1,72 @@
+import numpy as np
+
+from core import DEFAULT_HOUSE_PRICE
+from batch import DEFAULTS, score_arrays
+
+# The settings in the sidebar's Advanced Settings, each of which a sensitivity analysis moves
+# down and up while keeping the others where they are
+SENSITIVITY_INPUTS = (
+    'mortgage_rate', 'appreciation_rate', 'closing_costs_rate', 'property_tax_rate', 'yearly_rent_increase',
+    'investment_return_rate', 'price_to_rent_ratio', 'marginal_tax_rate', 'pmi_rate', 'insurance_cost',
+)
+COSTS = ('rent_to_own_cost', 'traditional_cost', 'renting_cost')
+DEFAULT_SHIFT = 0.10  # Each input is moved this share of its value down and up, e.g. a 6.5% rate to 5.85% and 7.15%
+
+def _scenarios(value, factors):
+    # `value` (a scalar or one per property) times each of `factors`, on a trailing scenario axis
+    return np.asarray(value, dtype=float)[..., np.newaxis] * factors
+
+def sensitivity(house_price=DEFAULT_HOUSE_PRICE, shift=DEFAULT_SHIFT, inputs=SENSITIVITY_INPUTS, **params):
+    # How much each true cost changes when each of `inputs` is moved `shift` (a share of its
+    # value) down and then up, with everything else given as for batch.score_arrays. The base
+    # scenario and both shifts of every input are scored together in one score_arrays call,
+    # for one property or for an array of them.
+    #
+    # Returns the inputs and shift, plus for each of COSTS the base cost and `{cost}_low` and
+    # `{cost}_high` arrays with the change for each input (on a trailing axis after the
+    # properties', if there are several).
+    if not 0 < shift < 1:
+        raise ValueError(f"The shift must be a share of each input between 0 and 1, got {shift}")
+    params = {**DEFAULTS, **params}
+    unknown = [name for name in inputs if name not in params]
+    if unknown:
+        raise ValueError(f"Can't shift unknown input(s): {', '.join(unknown)}; expected any of: {', '.join(params)}")
+    count = 1 + 2 * len(inputs)
+
+    # Scenario 0 is the base, 2i + 1 and 2i + 2 have input i moved down and up
+    columns = {'house_price': _scenarios(house_price, np.ones(count))}
+    for name, value in params.items():
+        if name in inputs:
+            factors = np.ones(count)
+            i = inputs.index(name)
+            factors[2 * i + 1], factors[2 * i + 2] = 1 - shift, 1 + shift
+            columns[name] = _scenarios(value, factors)
+        else:
+            columns[name] = np.asarray(value)[..., np.newaxis]
+    shape = np.broadcast_shapes(*(values.shape for values in columns.values()))
+    scores = score_arrays(**{name: np.broadcast_to(values, shape).ravel() for name, values in columns.items()})
+
+    result = {'inputs': tuple(inputs), 'shift': shift}
+    for cost in COSTS:
+        values = scores[cost].reshape(shape)
+        base = values[..., :1]
+        result[cost] = base[..., 0] if base.ndim > 1 else float(base[0])
+        result[f'{cost}_low'] = values[..., 1::2] - base
+        result[f'{cost}_high'] = values[..., 2::2] - base
+    return result
+
+def total(result):
+    # The changes of a portfolio's sensitivity() summed over its properties, in the same form as
+    # the result for a single property (e.g. for charts.create_tornado_chart)
+    summed = {'inputs': result['inputs'], 'shift': result['shift']}
+    for cost in COSTS:
+        summed[cost] = float(np.sum(result[cost]))
+        for side in ('low', 'high'):
+            changes = np.asarray(result[f'{cost}_{side}'])
+            summed[f'{cost}_{side}'] = changes.reshape(-1, len(result['inputs'])).sum(axis=0)
+    return summed
+
+def ranked(result, cost='rent_to_own_cost'):
+    # The inputs from the one that moves `cost` the most to the one that moves it the least
+    swings = np.maximum(np.abs(result[f'{cost}_low']), np.abs(result[f'{cost}_high']))
+    return [result['inputs'][i] for i in np.argsort(-swings, kind='stable')]
@@ -0,0 +1,87 @@
+import numpy as np
+
+DEFAULT_PATHS = 10000
+DEFAULT_APPRECIATION_VOLATILITY = 0.05  # Standard deviation of the yearly appreciation rate
+DEFAULT_RENT_INCREASE_VOLATILITY = 0.0
+PERCENTILES = (10, 50, 90)
+
+def _simulate_chunk(seed, paths, years, appreciation_rate, appreciation_volatility, yearly_rent_increase, rent_increase_volatility):
+    rng = np.random.default_rng(seed)
+
+    # One appreciation rate per path and year, compounded monthly within the year the same way
+    # calculate_schedule does, so a volatility of 0 reproduces the fixed-rate schedule exactly.
+    yearly_appreciation = rng.normal(appreciation_rate, appreciation_volatility, size=(paths, years))
+    yearly_appreciation = np.maximum(yearly_appreciation, -0.99)
+    monthly_log_growth = np.repeat(np.log1p(yearly_appreciation) / 12, 12, axis=1)
+    growth = np.exp(np.cumsum(monthly_log_growth, axis=1))
+
+    if not rent_increase_volatility:
+        return growth, None
+
+    # Rent goes up once a year, so month m pays the product of the increases of the years before it
+    yearly_rent_increase = rng.normal(yearly_rent_increase, rent_increase_volatility, size=(paths, years))
+    yearly_rent_increase = np.maximum(yearly_rent_increase, -0.99)
+    rent_factor = np.cumprod(1 + yearly_rent_increase, axis=1)
+    rent_factor = np.concatenate([np.ones((paths, 1)), rent_factor[:, :-1]], axis=1)
+    return growth, np.repeat(rent_factor, 12, axis=1)
+
+def simulate_paths(appreciation_rate, years, appreciation_volatility=DEFAULT_APPRECIATION_VOLATILITY, yearly_rent_increase=0.0, rent_increase_volatility=DEFAULT_RENT_INCREASE_VOLATILITY, paths=DEFAULT_PATHS, seed=None, workers=1):
+    # Draw `paths` random market paths over `years`.
+    #
+    # Returns a dict with:
+    #   'growth': (paths, months) home value relative to the purchase price at the end of each month
+    #   'rent_growth': (paths, months) rent relative to the initial rent, or None without rent volatility
+    #
+    # With workers > 1 the paths are split across a process pool. Each chunk gets its own
+    # child seed, so a given seed and worker count always give the same paths.
+    args = (years, appreciation_rate, appreciation_volatility, yearly_rent_increase, rent_increase_volatility)
+    if workers <= 1:
+        growth, rent_growth = _simulate_chunk(seed, paths, *args)
+        return {'growth': growth, 'rent_growth': rent_growth}
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    chunk_paths = [len(chunk) for chunk in np.array_split(np.arange(paths), workers)]
+    seeds = np.random.SeedSequence(seed).spawn(workers)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        chunks = list(executor.map(_simulate_chunk, seeds, chunk_paths, *[[arg] * workers for arg in args]))
+
+    growth = np.concatenate([growth for growth, _ in chunks])
+    rent_growth = None if chunks[0][1] is None else np.concatenate([rent_growth for _, rent_growth in chunks])
+    return {'growth': growth, 'rent_growth': rent_growth}
+
+def simulate_equity(house_price, principal_over_time, simulation):
+    # Rent-to-own equity for every path: the (fixed) principal plus 50% of the simulated appreciation
+    return np.asarray(principal_over_time) + house_price * (simulation['growth'] - 1) * 0.5
+
+def percentile_bands(values, percentiles=PERCENTILES):
+    # {10: array, 50: array, 90: array} across paths for every month
+    return dict(zip(percentiles, np.percentile(values, percentiles, axis=0)))
+
+def simulate_costs(comparison_values, house_price, appreciation_rate, years, simulation):
+    # True cost of the three options on every path.
+    #
+    # Everything but the appreciation (and the rent, with rent volatility) is the same on every path,
+    # so each cost is the fixed-rate cost from calculate_comparison_values shifted by how much more
+    # or less the home appreciated on that path. Equity lowers the true cost one for one.
+    expected_appreciation = house_price * ((1 + appreciation_rate) ** years - 1)
+    appreciation = house_price * (simulation['growth'][:, years * 12 - 1] - 1)
+    extra_appreciation = appreciation - expected_appreciation
+
+    if simulation['rent_growth'] is None:
+        renting_cost = np.full(len(appreciation), comparison_values['renting_cost'])
+    else:
+        total_rent = comparison_values['initial_rental_payment'] * simulation['rent_growth'][:, :years * 12].sum(axis=1)
+        renting_cost = comparison_values['renting_cost'] - comparison_values['renting_spent'] + total_rent
+
+    return {
+        'rent_to_own_cost': comparison_values['rent_to_own_cost'] - extra_appreciation * 0.5,
+        'traditional_cost': comparison_values['traditional_cost'] - extra_appreciation,
+        'renting_cost': renting_cost,
+    }
+
+def win_probabilities(costs):
+    # Share of paths on which each option has the lowest true cost
+    names = list(costs)
+    cheapest = np.argmin(np.stack([costs[name] for name in names]), axis=0)
+    return {name: float(np.mean(cheapest == i)) for i, name in enumerate(names)}
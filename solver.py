@@ -0,0 +1,85 @@
+import numpy as np
+
+from core import DEFAULT_HOUSE_PRICE, _scalar
+from batch import DEFAULTS, OUTPUT_COLUMNS, score_arrays
+
+# Anything score_arrays returns can be solved for, e.g. a monthly budget ('monthly_rent'),
+# the equity to build ('rent_to_own_equity') or a true cost ('rent_to_own_cost').
+TARGETS = tuple(name for name in OUTPUT_COLUMNS if name != 'renting_equity')
+MAX_HOUSE_PRICE = 1e9
+TOLERANCE = 0.01  # dollars of house price
+MAX_ITERATIONS = 100
+
+def _solve_linear(evaluate, target_value, shape):
+    # With a fixed down payment ratio every output is an affine function of the house price
+    # (see core.py), so two evaluations give it exactly. A third one guards against that ever changing.
+    prices = np.full(shape, DEFAULT_HOUSE_PRICE)
+    intercept = evaluate(np.zeros(shape))
+    slope = (evaluate(prices) - intercept) / DEFAULT_HOUSE_PRICE
+    check = evaluate(2 * prices)
+    if not np.allclose(check, intercept + slope * 2 * prices, rtol=1e-9, atol=1e-6):
+        return None
+    with np.errstate(divide='ignore', invalid='ignore'):
+        house_price = (target_value - intercept) / slope
+    return np.where(np.isfinite(house_price) & (house_price >= 0), house_price, np.nan)
+
+def _solve_bracketed(evaluate, target_value, low, shape):
+    # Bisection on every row at once. The bracket starts at `low` and is doubled until it
+    # contains the target; rows that can't reach the target below MAX_HOUSE_PRICE get NaN.
+    low = np.array(np.broadcast_to(low, shape), dtype=float)
+    high = np.maximum(2 * low, DEFAULT_HOUSE_PRICE)
+    value_low, value_high = evaluate(low), evaluate(high)
+    # Flip decreasing rows so that "too low" always means "value below the target"
+    direction = np.where(value_high >= value_low, 1.0, -1.0)
+    gap_low = direction * (value_low - target_value)
+    gap_high = direction * (value_high - target_value)
+    while True:
+        expand = (gap_high < 0) & (high < MAX_HOUSE_PRICE)
+        if not expand.any():
+            break
+        high = np.where(expand, np.minimum(2 * high, MAX_HOUSE_PRICE), high)
+        gap_high = direction * (evaluate(high) - target_value)
+    solvable = (gap_low <= 0) & (gap_high >= 0)
+
+    for _ in range(MAX_ITERATIONS):
+        if np.all(high - low <= TOLERANCE):
+            break
+        middle = (low + high) / 2
+        too_low = direction * (evaluate(middle) - target_value) < 0
+        low = np.where(too_low, middle, low)
+        high = np.where(too_low, high, middle)
+
+    return np.where(solvable, high, np.nan)
+
+def solve_house_price(target_value, target='monthly_rent', down_payment=None, **inputs):
+    # The house price at which `target` (one of TARGETS) equals `target_value`, e.g. the most a
+    # home can cost for the rent to be $2,500/month. Every argument can be an array, so thousands
+    # of budgets are solved in one call.
+    #
+    # By default the down payment is a share of the price (`down_payment_ratio`) and the answer
+    # is closed-form. Passing `down_payment` in dollars instead makes the ratio depend on the price
+    # (and with it PMI), so the price is found with a bracketed solve.
+    #
+    # Returns a dict with 'house_price', 'down_payment' and 'down_payment_ratio'; NaN where no
+    # price reaches the target.
+    if target not in TARGETS:
+        raise ValueError(f"Can't solve for '{target}', expected one of: {', '.join(TARGETS)}")
+    params = {**DEFAULTS, **inputs}
+    target_value = np.asarray(target_value, dtype=float)
+    shape = np.broadcast_shapes(target_value.shape, np.shape(down_payment), *(np.shape(value) for value in params.values()))
+
+    if down_payment is None:
+        house_price = _solve_linear(lambda price: score_arrays(price, **params)[target], target_value, shape)
+        if house_price is None:
+            house_price = _solve_bracketed(lambda price: score_arrays(price, **params)[target], target_value, 0.0, shape)
+        down_payment_ratio = np.broadcast_to(params['down_payment_ratio'], shape)
+        down_payment = house_price * down_payment_ratio
+    else:
+        # The down payment can't be more than the price
+        down_payment = np.broadcast_to(np.asarray(down_payment, dtype=float), shape)
+        evaluate = lambda price: score_arrays(price, **{**params, 'down_payment_ratio': down_payment / price})[target]
+        house_price = _solve_bracketed(evaluate, target_value, np.maximum(down_payment, 1.0), shape)
+        down_payment_ratio = down_payment / house_price
+
+    result = {'house_price': house_price, 'down_payment': down_payment, 'down_payment_ratio': down_payment_ratio}
+    return {key: _scalar(value) for key, value in result.items()}
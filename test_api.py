@@ -0,0 +1,91 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+import api
+from batch import score_arrays
+from rates import RateProvider
+
+@pytest.fixture(scope="module")
+def server():
+    # Offline on a free port, with a rate provider that never touches the disk or the network
+    rate_provider = RateProvider(source=lambda: 0.065, cache_path=None, default=0.065)
+    server = api.CalculatorServer(("127.0.0.1", 0), rate_provider, offline=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def request(server, path, body=None, content_type="application/json"):
+    # The status and the parsed JSON body (or lines, for /batch)
+    url = f"http://127.0.0.1:{server.server_address[1]}{path}"
+    data = body.encode() if isinstance(body, str) else body
+    req = urllib.request.Request(url, data=data, headers={"Content-Type": content_type}, method="POST" if data is not None else "GET")
+    try:
+        with urllib.request.urlopen(req, timeout=10) as response:
+            status, text = response.status, response.read().decode()
+    except urllib.error.HTTPError as e:
+        status, text = e.code, e.read().decode()
+    if path.startswith("/batch"):
+        return status, [json.loads(line) for line in text.splitlines()]
+    return status, json.loads(text)
+
+def test_compare(server):
+    status, body = request(server, "/compare?house_price=400000&years=7")
+    scores = score_arrays(400000.0, years=7)
+    assert status == 200
+    assert body['rent_to_own_cost'] == pytest.approx(float(scores['rent_to_own_cost']))
+    assert body['traditional_cost'] == pytest.approx(float(scores['traditional_cost']))
+
+@pytest.mark.parametrize("query", [
+    "house_price=-5",
+    "house_price=0",
+    "house_price=abc",
+    "house_price=nan",
+    "years=0",
+    "years=2.5",
+    "years=31",
+    "mortgage_rate=-0.01",
+    "down_payment_ratio=1.5",
+    "include_closing_costs=maybe",
+    "colour=blue",
+])
+def test_bad_input_is_a_400(server, query):
+    status, body = request(server, f"/compare?{query}")
+    assert status == 400
+    assert body['error']
+
+@pytest.mark.parametrize("body", ["[1, 2]", "{not json", '{"house_price": "x"}'])
+def test_bad_body_is_a_400(server, body):
+    assert request(server, "/compare", body)[0] == 400
+
+def test_bad_batch_row_is_a_400(server):
+    status, body = request(server, "/batch", json.dumps({'rows': [{'house_price': 300000}, {'house_price': -1}]}))
+    assert status == 400
+    assert body[0]['error'].startswith("Row 1")
+
+def test_batch(server):
+    rows = [{'id': 'a', 'house_price': 300000}, {'id': 'b', 'house_price': 500000, 'years': 7}]
+    status, lines = request(server, "/batch", "\n".join(json.dumps(row) for row in rows), "application/x-ndjson")
+    assert status == 200
+    assert [line['id'] for line in lines] == ['a', 'b']
+
+def test_unknown_path_is_a_404(server):
+    assert request(server, "/nowhere")[0] == 404
+
+def test_failed_computation_is_a_500(server, monkeypatch):
+    def broken(inputs):
+        raise ZeroDivisionError("division by zero")
+
+    monkeypatch.setitem(api.ENDPOINTS, '/compare', broken)
+    errors = server.errors
+    status, body = request(server, "/compare?house_price=123457")
+    assert status == 500
+    assert "division by zero" in body['error']
+    assert server.errors == errors + 1
+    # The server keeps answering
+    assert request(server, "/rent?house_price=123457")[0] == 200
@@ -0,0 +1,43 @@
+import argparse
+
+import numpy as np
+import pytest
+
+from batch import DEFAULTS, OUTPUT_COLUMNS, add_input_arguments, score_arrays
+
+def test_default_scores():
+    # The totals on the page with every input at its default and a 6.5% mortgage
+    scores = score_arrays(400000.0)
+    assert round(float(scores['monthly_rent']), 2) == 2288.39
+    assert [round(float(scores[name])) for name in ('rent_to_own_cost', 'traditional_cost', 'renting_cost')] == [51770, 75483, 89399]
+    scores = score_arrays(400000.0, years=7)
+    assert [round(float(scores[name])) for name in ('rent_to_own_cost', 'traditional_cost', 'renting_cost')] == [87774, 123298, 166280]
+
+def test_rows_score_like_single_properties():
+    house_price = np.array([150000.0, 400000.0, 950000.0])
+    overrides = {
+        'years': np.array([1, 4, 30]),
+        'down_payment_ratio': np.array([0.0, 0.1, 0.25]),
+        'mortgage_rate': np.array([0.05, 0.065, 0.08]),
+        'include_closing_costs': np.array([True, False, True]),
+        'include_tax_deductions': np.array([False, True, True]),
+    }
+    scores = score_arrays(house_price, **overrides)
+    for i in range(len(house_price)):
+        single = score_arrays(house_price[i], **{name: values[i] for name, values in overrides.items()})
+        for name in OUTPUT_COLUMNS:
+            assert scores[name][i] == pytest.approx(float(single[name]), rel=1e-12), name
+
+def test_deltas_are_rent_to_own_minus_the_other_option():
+    scores = score_arrays(400000.0)
+    assert scores['traditional_delta'] == pytest.approx(scores['rent_to_own_cost'] - scores['traditional_cost'])
+    assert scores['renting_delta'] == pytest.approx(scores['rent_to_own_cost'] - scores['renting_cost'])
+
+def test_input_arguments():
+    parser = argparse.ArgumentParser()
+    add_input_arguments(parser, exclude=('down_payment_ratio',))
+    args = vars(parser.parse_args(['--years', '7', '--insurance-cost', '162.5', '--include-closing-costs', '0']))
+    assert set(args) == set(DEFAULTS) - {'down_payment_ratio'}
+    assert args['years'] == 7 and args['insurance_cost'] == 162.5 and args['include_closing_costs'] == 0
+    with pytest.raises(SystemExit):
+        parser.parse_args(['--years', '2.5'])
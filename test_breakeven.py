@@ -0,0 +1,48 @@
+import math
+
+import numpy as np
+import pytest
+
+from breakeven import _summarize, breakeven, breakeven_grid
+
+def costs(rent_to_own, other):
+    return {
+        'rent_to_own_cost': np.array(rent_to_own, dtype=float),
+        'renting_cost': np.array(other, dtype=float),
+        'traditional_cost': np.array(other, dtype=float),
+    }
+
+def test_delta_at_the_breakeven_month():
+    # Rent-to-own starts cheaper, the other option overtakes it in month 3 and it's cheaper again by the end
+    summary = _summarize(costs([10, 20, 40, 50], [15, 25, 30, 60]))
+    assert summary['traditional_breakeven'] == 3
+    assert summary['traditional_breakeven_delta'] == 10
+    assert summary['traditional_delta'] == -10
+
+def test_no_breakeven():
+    summary = _summarize(costs([10, 20, 30], [15, 25, 35]))
+    assert math.isnan(summary['renting_breakeven']) and math.isnan(summary['renting_breakeven_delta'])
+    assert summary['renting_delta'] == -5
+
+def test_grid_matches_single_scenarios():
+    x, y = [0.0, 0.05], [0.03, 0.06, 0.09]
+    grid = breakeven_grid('appreciation_rate', x, 'mortgage_rate', y, chunk_size=4)
+    assert grid['traditional_breakeven'].shape == (3, 2)
+    for i, mortgage_rate in enumerate(y):
+        for j, appreciation_rate in enumerate(x):
+            single = breakeven(400000.0, appreciation_rate=appreciation_rate, mortgage_rate=mortgage_rate)
+            for key, value in single.items():
+                assert grid[key][i, j] == pytest.approx(value, nan_ok=True), key
+
+@pytest.mark.parametrize("x, y", [([], [0.05]), ([0.05], []), ([], [])])
+def test_grid_needs_both_axes(x, y):
+    with pytest.raises(ValueError):
+        breakeven_grid('appreciation_rate', x, 'mortgage_rate', y)
+
+def test_description_follows_the_breakeven_month():
+    from calculator import describe_breakeven
+
+    summary = _summarize(costs([10] * 12 + [40] * 12, [15] * 12 + [30] * 11 + [60]))
+    assert describe_breakeven(summary, 'traditional', "a traditional mortgage") == "A traditional mortgage becomes cheaper than rent to own after 1 year and 1 month."
+    summary = _summarize(costs([20, 10], [15, 15]))
+    assert describe_breakeven(summary, 'renting', "renting") == "Rent to own becomes cheaper than renting after 2 months."
@@ -0,0 +1,127 @@
+import numpy as np
+import numpy_financial as npf
+import pytest
+
+from core import (
+    DEFAULT_INTEREST_RATE, LOAN_TERM_YEARS,
+    calculate_monthly_breakdown, calculate_estimated_equity, calculate_equity_breakdown,
+    calculate_comparison_values, cumulative_principal, cumulative_interest, cumulative_rent,
+)
+
+# The month-by-month loops the calculator used before its totals were made closed-form, kept
+# here as the reference the closed forms are checked against. The one intended difference: the
+# traditional mortgage's principal and interest now come from its own amortization schedule
+# instead of the rent-to-own split, which moved the default traditional cost from $77,454 to $75,483.
+SCENARIOS = [
+    # house_price, appreciation_rate, years, down_payment_ratio, mortgage_rate, yearly_rent_increase
+    (400000.0, 0.035, 4, 0.0, 0.065, 0.04),
+    (250000.0, 0.02, 1, 0.1, 0.07, 0.0),
+    (800000.0, 0.05, 7, 0.25, 0.055, 0.03),
+    (120000.0, 0.0, 30, 0.2, 0.0, 0.06),
+]
+
+def loop_equity_breakdown(house_price, loan_amount, interest_rate, loan_term_years, appreciation_rate, years):
+    total_principal = 0
+    for month in range(1, years * 12 + 1):
+        principal, _ = calculate_monthly_breakdown(loan_amount, interest_rate, loan_term_years, month, is_rent_to_own=True)
+        total_principal += principal
+    return total_principal, calculate_estimated_equity(house_price, appreciation_rate, years) * 0.5
+
+def loop_comparison_values(house_price, property_tax_rate, appreciation_rate, years, monthly_rent, total_equity, down_payment_ratio, price_to_rent_ratio, investment_return_rate, marginal_tax_rate, mortgage_rate, pmi_rate, insurance_cost, yearly_rent_increase, is_rent_to_own=False):
+    # `is_rent_to_own=True` splits the traditional payments the old way
+    traditional_loan = house_price * (1 - down_payment_ratio)
+    mortgage_payment = npf.pmt(mortgage_rate / 12, LOAN_TERM_YEARS * 12, -traditional_loan)
+    monthly_pmi = (traditional_loan * pmi_rate) / 12 if down_payment_ratio < 0.2 else 0
+    traditional_payment = mortgage_payment + insurance_cost + (house_price * property_tax_rate) / 12 + monthly_pmi
+    breakdown = [calculate_monthly_breakdown(traditional_loan, mortgage_rate, LOAN_TERM_YEARS, month, is_rent_to_own) for month in range(1, years * 12 + 1)]
+    traditional_principal = sum(principal for principal, _ in breakdown)
+    total_interest_paid = sum(interest for _, interest in breakdown)
+    down_payment = house_price * down_payment_ratio
+    traditional_equity = traditional_principal + calculate_estimated_equity(house_price, appreciation_rate, years) + down_payment
+
+    initial_rental_payment = house_price / (price_to_rent_ratio * 12)
+    total_rent = 0
+    for year in range(years):
+        total_rent += initial_rental_payment * 12 * (1 + yearly_rent_increase) ** year
+
+    traditional_spent = traditional_payment * years * 12 + down_payment
+    traditional_opportunity_cost = down_payment * ((1 + investment_return_rate) ** years - 1)
+    tax_savings = total_interest_paid * marginal_tax_rate
+    return {
+        'traditional_payment': traditional_payment,
+        'traditional_equity': traditional_equity,
+        'rental_payment': initial_rental_payment,
+        'down_payment': down_payment,
+        'rent_to_own_spent': monthly_rent * years * 12,
+        'traditional_spent': traditional_spent,
+        'renting_spent': total_rent,
+        'rent_to_own_cost': monthly_rent * years * 12 - total_equity,
+        'traditional_cost': traditional_spent - traditional_equity + traditional_opportunity_cost - tax_savings,
+        'renting_cost': total_rent,
+        'tax_savings': tax_savings,
+        'monthly_pmi': monthly_pmi,
+    }
+
+def comparison_args(house_price, appreciation_rate, years, down_payment_ratio, mortgage_rate, yearly_rent_increase):
+    # Every argument of calculate_comparison_values, with the sidebar's defaults for the rest
+    return dict(
+        house_price=house_price, property_tax_rate=0.01122, appreciation_rate=appreciation_rate, years=years,
+        monthly_rent=house_price / 150, total_equity=house_price / 20, down_payment_ratio=down_payment_ratio,
+        price_to_rent_ratio=19, investment_return_rate=0.05, marginal_tax_rate=0.16, mortgage_rate=mortgage_rate,
+        pmi_rate=0.015, insurance_cost=150, yearly_rent_increase=yearly_rent_increase,
+    )
+
+@pytest.mark.parametrize("house_price, appreciation_rate, years, down_payment_ratio, mortgage_rate, yearly_rent_increase", SCENARIOS)
+def test_equity_breakdown_matches_loop(house_price, appreciation_rate, years, down_payment_ratio, mortgage_rate, yearly_rent_increase):
+    loan_amount = house_price * 1.01
+    expected = loop_equity_breakdown(house_price, loan_amount, DEFAULT_INTEREST_RATE, LOAN_TERM_YEARS, appreciation_rate, years)
+    actual = calculate_equity_breakdown(house_price, loan_amount, DEFAULT_INTEREST_RATE, LOAN_TERM_YEARS, appreciation_rate, years)
+    assert actual == pytest.approx(expected, rel=1e-12)
+
+@pytest.mark.parametrize("scenario", SCENARIOS)
+@pytest.mark.filterwarnings("ignore:invalid value:RuntimeWarning")  # npf.fv at a 0% rate in the loop
+def test_comparison_values_match_loop(scenario):
+    args = comparison_args(*scenario)
+    expected = loop_comparison_values(**args)
+    actual = calculate_comparison_values(**args)
+    for name, value in expected.items():
+        assert actual[name] == pytest.approx(value, rel=1e-9, abs=1e-6), name
+
+def test_comparison_values_take_arrays():
+    # One call for many scenarios gives what one call per scenario does
+    columns = [np.array(values) for values in zip(*SCENARIOS)]
+    batch = calculate_comparison_values(**comparison_args(*columns))
+    for i, scenario in enumerate(SCENARIOS):
+        single = calculate_comparison_values(**comparison_args(*scenario))
+        for name in ('traditional_cost', 'renting_cost', 'rent_to_own_cost', 'tax_savings', 'monthly_pmi'):
+            assert batch[name][i] == pytest.approx(single[name], rel=1e-12), name
+
+def test_default_traditional_cost():
+    # $77,454 with the rent-to-own split the mortgage used to get, $75,483 with its own schedule
+    args = comparison_args(400000.0, 0.035, 4, 0.0, 0.065, 0.04)
+    args.update(monthly_rent=3057.86, total_equity=0.0)
+    old = loop_comparison_values(**args, is_rent_to_own=True)['traditional_cost']
+    assert round(old) == 77454
+    assert round(calculate_comparison_values(**args)['traditional_cost']) == 75483
+
+@pytest.mark.parametrize("rate", [0.065, 0.0225, 0.11])
+@pytest.mark.parametrize("start, end", [(1, 1), (1, 48), (13, 84), (1, 360), (250, 360)])
+def test_cumulative_principal_and_interest_match_numpy_financial(rate, start, end):
+    loan = 320000.0
+    periods = np.arange(start, end + 1)
+    principal = -npf.ppmt(rate / 12, periods, LOAN_TERM_YEARS * 12, loan).sum()
+    interest = -npf.ipmt(rate / 12, periods, LOAN_TERM_YEARS * 12, loan).sum()
+    assert cumulative_principal(rate, LOAN_TERM_YEARS, loan, start, end) == pytest.approx(principal, rel=1e-9)
+    assert cumulative_interest(rate, LOAN_TERM_YEARS, loan, start, end) == pytest.approx(interest, rel=1e-9)
+
+def test_cumulative_principal_repays_the_loan():
+    assert cumulative_principal(0.065, LOAN_TERM_YEARS, 320000.0, 1, 360) == pytest.approx(320000.0)
+    # An interest-free loan is repaid in equal parts
+    assert cumulative_principal(0.0, LOAN_TERM_YEARS, 360000.0, 1, 12) == pytest.approx(12000.0)
+    assert cumulative_interest(0.0, LOAN_TERM_YEARS, 360000.0, 1, 12) == pytest.approx(0.0)
+
+@pytest.mark.parametrize("increase", [0.0, 0.04])
+@pytest.mark.parametrize("months", [0, 1, 12, 30, 84])
+def test_cumulative_rent_matches_loop(increase, months):
+    expected = sum(2000.0 * (1 + increase) ** (month // 12) for month in range(months))
+    assert cumulative_rent(2000.0, increase, months) == pytest.approx(expected, rel=1e-12)
@@ -0,0 +1,43 @@
+import io
+
+import numpy as np
+import pytest
+
+from batch import score_arrays
+from export import LEDGER_COLUMNS, iter_ledger, ledger_csv, write_csv
+
+def collect(chunks):
+    chunks = list(chunks)
+    return {name: np.concatenate([columns[name] for columns in chunks]) for name in LEDGER_COLUMNS}, len(chunks)
+
+@pytest.mark.parametrize("years", [1, 4, 7, 30])
+def test_one_row_per_month(years):
+    ledger, _ = collect(iter_ledger(400000.0, years=years))
+    assert len(ledger['month']) == years * 12
+    assert list(ledger['month']) == list(range(1, years * 12 + 1))
+    assert set(ledger['scenario']) == {0}
+
+def test_each_scenario_stops_at_its_own_horizon():
+    years = np.array([1, 30, 4, 7, 2])
+    ledger, count = collect(iter_ledger(np.full(5, 400000.0), rows_per_chunk=720, years=years))
+    assert count > 1
+    assert list(np.bincount(ledger['scenario'])) == list(years * 12)
+    for scenario, horizon in enumerate(years):
+        assert ledger['month'][ledger['scenario'] == scenario].max() == horizon * 12
+
+def test_final_month_matches_the_scores():
+    years = np.array([1, 4, 7])
+    prices = np.array([200000.0, 400000.0, 650000.0])
+    ledger, _ = collect(iter_ledger(prices, years=years, down_payment_ratio=0.1))
+    scores = score_arrays(prices, years=years, down_payment_ratio=0.1)
+    last = np.flatnonzero(np.diff(ledger['scenario'], append=len(years)))
+    for name in ('rent_to_own_cost', 'traditional_cost', 'renting_cost'):
+        assert ledger[name][last] == pytest.approx(scores[name], rel=1e-9), name
+
+def test_csv_row_count():
+    buffer = io.StringIO()
+    rows = write_csv(iter_ledger(np.array([300000.0, 500000.0]), years=np.array([3, 5])), buffer)
+    lines = buffer.getvalue().splitlines()
+    assert rows == 96 and len(lines) == 97
+    assert lines[0] == ','.join(LEDGER_COLUMNS)
+    assert ledger_csv(400000.0, years=2).count(b'\n') == 25
@@ -0,0 +1,31 @@
+import json
+
+import pytest
+
+import rates
+from rates import RateProvider, fetch_fred_rate
+
+def test_no_key_no_fetch(monkeypatch):
+    monkeypatch.setattr(rates, "FRED_API_KEY", None)
+    monkeypatch.setattr(rates, "_get_session", lambda: pytest.fail("FRED was called without a key"))
+    with pytest.raises(RuntimeError):
+        fetch_fred_rate()
+
+    provider = RateProvider(cache_path=None, default=0.055)
+    assert provider.refresh() is False
+    assert provider.current() == 0.055
+    # Not retried on every rerun
+    assert provider.is_stale and not provider.refresh_due
+
+def test_saved_rate_is_served_without_a_key(monkeypatch, tmp_path):
+    monkeypatch.setattr(rates, "FRED_API_KEY", None)
+    cache_path = tmp_path / "mortgage_rate.json"
+    cache_path.write_text(json.dumps({'rate': 0.0675, 'fetched_at': 0.0}))
+    provider = RateProvider(cache_path=str(cache_path), default=0.055)
+    assert provider.refresh() is False
+    assert provider.current() == 0.0675
+
+def test_refresh_saves_the_rate(tmp_path):
+    cache_path = tmp_path / "mortgage_rate.json"
+    assert RateProvider(source=lambda: 0.061, cache_path=str(cache_path)).refresh() is True
+    assert RateProvider(source=lambda: 1 / 0, cache_path=str(cache_path)).current() == 0.061
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from batch import DEFAULTS, score_arrays
+from sensitivity import COSTS, SENSITIVITY_INPUTS, ranked, sensitivity, total
+
+def test_shifts_match_scoring_each_scenario():
+    result = sensitivity(400000.0, shift=0.1, years=7)
+    base = score_arrays(400000.0, years=7)
+    for i, name in enumerate(SENSITIVITY_INPUTS):
+        for side, factor in (('low', 0.9), ('high', 1.1)):
+            shifted = score_arrays(400000.0, years=7, **{name: DEFAULTS[name] * factor})
+            for cost in COSTS:
+                assert result[f'{cost}_{side}'][i] == pytest.approx(float(shifted[cost] - base[cost]), abs=1e-6), (name, side, cost)
+
+def test_portfolio_total():
+    prices = np.array([250000.0, 400000.0])
+    summed = total(sensitivity(prices))
+    singles = [sensitivity(price) for price in prices]
+    assert summed['traditional_cost'] == pytest.approx(sum(single['traditional_cost'] for single in singles))
+    assert summed['traditional_cost_high'] == pytest.approx(sum(single['traditional_cost_high'] for single in singles))
+    assert ranked(summed)[0] in SENSITIVITY_INPUTS
+
+@pytest.mark.parametrize("inputs", [('mortgage_rate', 'mortgage_rte'), ('house_price',)])
+def test_unknown_inputs(inputs):
+    with pytest.raises(ValueError, match="unknown input"):
+        sensitivity(inputs=inputs)
+
+def test_shift_must_be_a_share():
+    with pytest.raises(ValueError):
+        sensitivity(shift=1.5)
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from batch import score_arrays
+from solver import TARGETS, TOLERANCE, solve_house_price
+
+@pytest.mark.parametrize("target", ['monthly_rent', 'traditional_payment', 'rent_to_own_equity', 'rent_to_own_cost', 'renting_cost'])
+def test_round_trip(target):
+    prices = np.array([150000.0, 400000.0, 1250000.0])
+    inputs = {'years': np.array([1, 4, 7]), 'mortgage_rate': 0.065, 'down_payment_ratio': 0.1}
+    targets = score_arrays(prices, **inputs)[target]
+    result = solve_house_price(targets, target, **inputs)
+    assert result['house_price'] == pytest.approx(prices, rel=1e-9)
+    assert result['down_payment'] == pytest.approx(prices * 0.1, rel=1e-9)
+
+def test_round_trip_with_a_down_payment_in_dollars():
+    # PMI stops at a 20% down payment, so the price is found by bisection
+    prices = np.array([200000.0, 400000.0, 600000.0])
+    down_payment = 80000.0
+    ratios = down_payment / prices
+    targets = score_arrays(prices, down_payment_ratio=ratios)['traditional_payment']
+    result = solve_house_price(targets, 'traditional_payment', down_payment=down_payment)
+    assert result['house_price'] == pytest.approx(prices, abs=2 * TOLERANCE)
+    assert result['down_payment_ratio'] == pytest.approx(ratios, rel=1e-6)
+    assert score_arrays(result['house_price'], down_payment_ratio=result['down_payment_ratio'])['traditional_payment'] == pytest.approx(targets, abs=0.01)
+
+def test_scalar_budget():
+    result = solve_house_price(2500.0)
+    assert isinstance(result['house_price'], float)
+    assert float(score_arrays(result['house_price'])['monthly_rent']) == pytest.approx(2500.0)
+
+def test_unreachable_target_is_nan():
+    # No price has a negative rent
+    assert np.isnan(solve_house_price(-100.0)['house_price'])
+
+def test_unknown_target():
+    assert 'renting_equity' not in TARGETS
+    with pytest.raises(ValueError):
+        solve_house_price(1000.0, 'renting_equity')
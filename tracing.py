@@ -0,0 +1,111 @@
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+from cache import cache_stats
+
+# Tracing is off unless RTO_TRACE is set (to anything but "0"/"false"). Each rerun is then
+# written as one JSON line to RTO_TRACE_PATH, or to stderr if that isn't set.
+# A rerun is either the whole page ("page") or one of its fragments ("years", "comparison").
+# RTO_TRACE_PANEL=1 also shows the spans of each rerun in a collapsible panel on the page.
+def _flag(name):
+    return os.environ.get(name, "").strip().lower() not in ("", "0", "false", "no")
+
+TRACE_ENABLED = _flag("RTO_TRACE")
+TRACE_PATH = os.environ.get("RTO_TRACE_PATH")
+TRACE_PANEL = _flag("RTO_TRACE_PANEL")
+
+_write_lock = threading.Lock()
+
+def _write(record, path=None):
+    line = json.dumps(record, separators=(",", ":"), default=str) + "\n"
+    with _write_lock:
+        if path:
+            with open(path, "a") as f:
+                f.write(line)
+        else:
+            sys.stderr.write(line)
+
+def _cache_counters():
+    return {name: (stats['hits'], stats['misses']) for name, stats in cache_stats().items()}
+
+class Trace:
+    # The spans of one rerun. Each span records its name, start offset and duration in
+    # milliseconds and any extra attributes (e.g. `cached=True` when a result was reused).
+
+    def __init__(self, session=None, rerun=None, path=None, section=None):
+        self.session = session
+        self.rerun = rerun
+        self.section = section
+        self.path = path if path is not None else TRACE_PATH
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self._caches = _cache_counters()
+        self.spans = []
+        self.stages = {'reused': 0, 'recomputed': 0}
+
+    def _offset_ms(self, t):
+        return round((t - self._start) * 1000, 3)
+
+    @contextmanager
+    def span(self, name, **attrs):
+        start = time.perf_counter()
+        try:
+            yield attrs
+        finally:
+            end = time.perf_counter()
+            self.spans.append({'name': name, 'start_ms': self._offset_ms(start), 'ms': round((end - start) * 1000, 3), **attrs})
+
+    def add_pipeline(self, run):
+        # One span per pipeline stage resolved in this rerun, flagged with whether it was reused
+        for name, (start, duration) in run.timings.items():
+            self.spans.append({'name': f"stage:{name}", 'start_ms': self._offset_ms(start), 'ms': round(duration * 1000, 3), 'cached': name in run.reused})
+        self.stages['reused'] += len(run.reused)
+        self.stages['recomputed'] += len(run.recomputed)
+
+    def record(self):
+        # `stages` counts this rerun's own pipeline stages. `process_caches` is the change in the
+        # hits and misses of the LRU caches in cache.py while it ran; those are shared by the
+        # whole process, so they include other sessions' reruns and background warm-up.
+        caches = {}
+        for name, (hits, misses) in _cache_counters().items():
+            before_hits, before_misses = self._caches.get(name, (0, 0))
+            if hits != before_hits or misses != before_misses:
+                caches[name] = {'hits': hits - before_hits, 'misses': misses - before_misses}
+        return {
+            'timestamp': self.started_at,
+            'session': self.session,
+            'rerun': self.rerun,
+            'section': self.section,
+            'total_ms': self._offset_ms(time.perf_counter()),
+            'spans': sorted(self.spans, key=lambda span: span['start_ms']),
+            'stages': dict(self.stages),
+            'process_caches': caches,
+        }
+
+    def finish(self):
+        record = self.record()
+        _write(record, self.path)
+        return record
+
+class _NullTrace:
+    # Stand-in used when tracing is off, so instrumented code costs next to nothing
+
+    spans = ()
+
+    def span(self, name, **attrs):
+        return nullcontext(attrs)
+
+    def add_pipeline(self, run):
+        pass
+
+    def finish(self):
+        return None
+
+NULL_TRACE = _NullTrace()
+
+def start_trace(session=None, rerun=None, section=None):
+    return Trace(session, rerun, section=section) if TRACE_ENABLED else NULL_TRACE
@@ -0,0 +1,63 @@
+import threading
+
+from rates import REQUEST_TIMEOUT
+
+# Most visitors never change an input, so every new session would compute the same default page.
+# A WarmStart computes it once per process on a background thread, right after fetching the
+# current mortgage rate, and new sessions start from its results instead of from nothing.
+
+def warm_pipeline(pipeline, values, stages):
+    # A pipeline memo with `stages` resolved for `values`
+    memo = {}
+    run = pipeline.run(memo, **values)
+    for name in stages:
+        run[name]
+    return memo
+
+class WarmStart:
+    # `compute(mortgage_rate)` returns the memo of the default page at that rate. ensure_warm()
+    # runs it once the rate has been prefetched, and again whenever the rate has changed since.
+
+    def __init__(self, rate_provider, compute):
+        self.rate_provider = rate_provider
+        self.compute = compute
+        self._lock = threading.Lock()
+        self._memo = None
+        self._rate = None
+        self._warming = None
+
+    def _warm(self):
+        if self.rate_provider.refresh_due:
+            # Shares the refresh with any session asking for the rate meanwhile
+            self.rate_provider.refresh_in_background().join(REQUEST_TIMEOUT * 2)
+        rate = self.rate_provider.current()
+        try:
+            memo = self.compute(rate)
+        except Exception:
+            # Sessions then simply compute the page themselves
+            return
+        with self._lock:
+            self._memo, self._rate = memo, rate
+
+    def warm_in_background(self):
+        with self._lock:
+            if self._warming is not None and self._warming.is_alive():
+                return self._warming
+            self._warming = threading.Thread(target=self._warm, name="warm-start", daemon=True)
+            self._warming.start()
+            return self._warming
+
+    @property
+    def is_warm(self):
+        return self._memo is not None and self._rate == self.rate_provider.current()
+
+    def ensure_warm(self):
+        if not self.is_warm:
+            self.warm_in_background()
+
+    def seed(self):
+        # A memo for a new session to start from, empty until the warm-up is done. Stages whose
+        # inputs differ from the defaults (including a newer rate) simply don't match and are
+        # computed as usual.
+        with self._lock:
+            return dict(self._memo or {})